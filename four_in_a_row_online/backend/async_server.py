@@ -0,0 +1,233 @@
+"""Asyncio mode of the server, serving the same REST routes and lobby events as `server.py` from an ASGI app with an
+asynchronous socketio server, so idle connections cost a coroutine instead of a thread. It shares the lobbies and all
+other state with `RequestHandler`. Lobby operations take the locks of the lobbies, which bot moves take from worker
+threads, so they run in the default executor and never block the event loop. Run with
+`python -m four_in_a_row_online.backend.async_server`, which needs uvicorn, or serve `AsyncServer().app` with any ASGI
+server."""
+import asyncio
+import json as JSON
+from urllib.parse import parse_qs
+from flask import json as flask_json
+import socketio
+from slugify import slugify
+from werkzeug import exceptions
+from four_in_a_row_online.backend.cluster import ClusterNode
+from four_in_a_row_online.backend.lobby_registry import LobbyRegistry
+from four_in_a_row_online.backend.room_senders import LoopSender
+from four_in_a_row_online.backend.server import RequestHandler
+from four_in_a_row_online.loggers.loggers import requests_logger
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+class AsyncServer:
+    """The ASGI app of the asyncio mode is `app`. Only one server should run per process, as it takes over sending the
+    messages of the lobbies of `RequestHandler`."""
+
+    def __init__(self):
+        self.sio = socketio.AsyncServer(async_mode='asgi', ping_timeout=2, ping_interval=1, json=flask_json)
+        self.app = socketio.ASGIApp(self.sio, other_asgi_app=self.handle_http, on_startup=self.start,
+                                    on_shutdown=self.stop)
+        self.loop = None
+        self._tasks = []
+        # slug of the lobby of each connection, by sid
+        self.lobby_by_connection = {}
+        namespace = RequestHandler.LOBBY_NAMESPACE
+        self.sio.on('join_lobby', self.handle_join_lobby, namespace=namespace)
+        self.sio.on('leave_lobby', self.handle_leave_lobby, namespace=namespace)
+        self.sio.on('disconnect', self.handle_disconnect, namespace=namespace)
+        for event in RequestHandler.lobby_events:
+            if event not in ('join_lobby', 'leave_lobby'):
+                self.sio.on(event, self.event_handler(event), namespace=namespace)
+        self.routes = [
+            ('GET', ('games',), self.list_games),
+            ('GET', ('games', None), self.retrieve_game),
+            ('GET', ('stats',), self.stats),
+            ('GET', ('lobbies', None, 'hint'), self.hint),
+            ('POST', ('lobbies',), self.create_lobby),
+        ]
+
+    async def start(self):
+        """Takes over sending the messages of the lobbies and starts the background tasks."""
+        self.loop = asyncio.get_running_loop()
+        # the executor of the bot moves is kept, bots place their tokens from its worker threads in any async mode and
+        # the messages about it are sent by the sender
+        RequestHandler.use_sender(LoopSender(self.sio, self.loop, RequestHandler.LOBBY_NAMESPACE))
+        self._tasks = [asyncio.create_task(self.manage_lobbies()), asyncio.create_task(self.log_stats()),
+                       asyncio.create_task(self.flush_outbox())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def manage_lobbies(self):
+        while True:
+            await asyncio.sleep(RequestHandler.lobby_expiry.tick)
+            await asyncio.to_thread(RequestHandler.expire_lobbies)
+
+    async def flush_outbox(self):
+        while True:
+            await asyncio.sleep(RequestHandler.outbox.tick)
+            RequestHandler.outbox.flush()
+
+    async def log_stats(self):
+        while True:
+            await asyncio.sleep(RequestHandler.STATS_INTERVAL)
+            RequestHandler.log_stats()
+
+    @staticmethod
+    def on_lobby(lobby_slug, operation, *args):
+        """Runs an operation on a lobby like `RequestHandler.on_lobby`, in the context of the Flask app the handlers of
+        the lobbies expect, and turns their responses into json."""
+        with RequestHandler.app.app_context():
+            response = RequestHandler.on_lobby(lobby_slug, operation, *args)
+        if isinstance(response, exceptions.HTTPException):
+            return {"Error": {"type": "bad_request", "message": response.description}}
+        if hasattr(response, "get_json"):
+            return response.get_json()
+        return response
+
+    async def lobby_event(self, lobby_slug, event, sid, json):
+        try:
+            return await asyncio.to_thread(self.on_lobby, lobby_slug, "event", event, sid, json)
+        except (LobbyRegistry.NotFound, ClusterNode.Unavailable) as e:
+            return RequestHandler.lobby_error(e)
+
+    def event_handler(self, event):
+        async def handle_event(sid, json=None):
+            lobby_slug = json.get("lobby_slug") if isinstance(json, dict) else None
+            return await self.lobby_event(lobby_slug, event, sid, json)
+        return handle_event
+
+    async def handle_join_lobby(self, sid, json=None):
+        # a connection is in one lobby at a time
+        await self.leave_lobby(sid)
+        lobby_slug = json.get("lobby_slug") if isinstance(json, dict) else None
+        try:
+            response = await asyncio.to_thread(self.on_lobby, lobby_slug, "event", "join_lobby", sid, json)
+        except (LobbyRegistry.NotFound, ClusterNode.Unavailable) as e:
+            return RequestHandler.lobby_error(e)
+        if response is not None:
+            # the join failed
+            return response
+        await self.sio.enter_room(sid, lobby_slug, namespace=RequestHandler.LOBBY_NAMESPACE)
+        self.lobby_by_connection[sid] = lobby_slug
+
+    async def leave_lobby(self, sid):
+        lobby_slug = self.lobby_by_connection.pop(sid, None)
+        if lobby_slug is None:
+            return
+        await self.lobby_event(lobby_slug, "leave_lobby", sid, None)
+        await self.sio.leave_room(sid, lobby_slug, namespace=RequestHandler.LOBBY_NAMESPACE)
+
+    async def handle_leave_lobby(self, sid, json=None):
+        await self.leave_lobby(sid)
+
+    async def handle_disconnect(self, sid, *args):
+        await self.leave_lobby(sid)
+
+    async def handle_http(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        segments = tuple(segment for segment in scope['path'].split('/') if segment)
+        for method, pattern, handler in self.routes:
+            if method == scope['method'] and len(pattern) == len(segments) and \
+                    all(part is None or part == segment for part, segment in zip(pattern, segments)):
+                arguments = [segment for part, segment in zip(pattern, segments) if part is None]
+                headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                           for name, value in scope['headers']}
+                status, response_headers, body = await handler(scope, headers, receive, *arguments)
+                break
+        else:
+            status, response_headers, body = self.error(exceptions.NotFound())
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (name.encode('latin-1'), value.encode('latin-1')) for name, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def json_response(data, status=200):
+        return status, [('content-type', 'application/json')], JSON.dumps(data).encode()
+
+    @staticmethod
+    def error(exception):
+        return exception.code, [('content-type', 'text/plain')], exception.description.encode()
+
+    @staticmethod
+    def snapshot_response(headers, etag, encoded):
+        """Answers with the encoded json, or with 304 Not Modified if the client has it already."""
+        response_headers = [('etag', f'"{etag}"')]
+        if_none_match = headers.get('if-none-match', '')
+        if if_none_match.strip() == '*' or f'"{etag}"' in (tag.strip().removeprefix('W/')
+                                                            for tag in if_none_match.split(',')):
+            return 304, response_headers, b''
+        return 200, response_headers + [('content-type', 'application/json')], encoded
+
+    @staticmethod
+    async def read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    async def list_games(self, scope, headers, receive):
+        requests_logger.debug("GET request to /games. Serving list of games…")
+        args = {name: values[-1] for name, values in parse_qs(scope['query_string'].decode()).items()}
+        try:
+            # pages are built under the lock of the listing, which other threads may hold
+            listing = await asyncio.to_thread(RequestHandler.listing, scope['query_string'], args)
+            return self.snapshot_response(headers, *listing)
+        except ValueError as e:
+            return self.error(exceptions.BadRequest(f"Invalid query parameter. {e.args}"))
+
+    async def retrieve_game(self, scope, headers, receive, slug):
+        slug = slugify(slug)
+        requests_logger.debug(f"GET request to /games/{{{slug}}}. Sending game info…")
+        try:
+            etag, encoded = await asyncio.to_thread(RequestHandler.on_lobby, slug, "snapshot")
+            return self.snapshot_response(headers, etag, encoded)
+        except LobbyRegistry.NotFound:
+            return self.error(exceptions.NotFound(f"Game with slug {slug} not found."))
+        except ClusterNode.Unavailable:
+            return self.error(exceptions.ServiceUnavailable(f"Game with slug {slug} is unavailable."))
+
+    async def stats(self, scope, headers, receive):
+        return self.json_response(RequestHandler.stats_json())
+
+    async def hint(self, scope, headers, receive, slug):
+        slug = slugify(slug)
+        requests_logger.debug(f"GET request to /lobbies/{{{slug}}}/hint. Sending hint…")
+        try:
+            # solving positions takes a while
+            hint = await asyncio.to_thread(RequestHandler.on_lobby, slug, "hint")
+        except LobbyRegistry.NotFound:
+            hint = None
+        except ClusterNode.Unavailable:
+            return self.error(exceptions.ServiceUnavailable(f"Lobby with slug {slug} is unavailable."))
+        if hint is None:
+            return self.error(exceptions.NotFound(f"No game running in lobby with slug {slug}."))
+        return self.json_response(hint)
+
+    async def create_lobby(self, scope, headers, receive):
+        try:
+            request_data = JSON.loads(await self.read_body(receive))
+            lobby = await asyncio.to_thread(RequestHandler.add_lobby, request_data)
+            return self.json_response(lobby.json())
+        except ValueError as e:
+            requests_logger.debug("POST request to /games failed. Invalid Data.")
+            return self.error(exceptions.BadRequest(f"Data invalid. {e.args}"))
+
+
+def main():
+    if uvicorn is None:
+        raise SystemExit("The asyncio mode needs uvicorn, install it with `pip install uvicorn`.")
+    conf = RequestHandler.configure()
+    uvicorn.run(AsyncServer().app, **{name: conf[name] for name in ('host',) if name in conf})
+
+
+if __name__ == '__main__':
+    main()
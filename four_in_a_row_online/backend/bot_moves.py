@@ -0,0 +1,99 @@
+"""Computation of bot moves outside of the handlers of the socket server. A search takes up to the time budget of the
+bot's strategy, which is longer than the ping timeout of the server, so the handlers only submit moves and the bots
+place their tokens once the moves are computed."""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from threading import Lock
+from four_in_a_row_online.game_logic.bots import GameCopy
+from four_in_a_row_online.loggers.loggers import games_logger
+
+
+class BotMoveExecutor:
+    """Computes bot moves with a bounded number of worker threads. At most `max_queued` moves are computed or waiting
+    at the same time. Once the executor is saturated, further moves are computed right away by the `fallback`
+    strategy, or rejected if there is none. The fallback runs in the thread submitting the move, so it has to be
+    cheap, e.g. a search of a single ply.
+
+    Finished moves are handed to a callback through `post`, which runs a function with its arguments, e.g. as a
+    background task of the server. Moves are submitted per lobby and can be cancelled per lobby, when its game ends.
+    Moves of a game that changed while they were computed are dropped."""
+
+    class Saturated(RuntimeError):
+        """Too many moves are being computed already."""
+
+    def __init__(self, max_workers=None, max_queued=64, fallback=None, post=None):
+        self.max_queued = max_queued
+        self.fallback = fallback
+        self._post = post if post is not None else (lambda function, *args: function(*args))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix='bot')
+        self._lock = Lock()
+        # futures of the moves being computed, by lobby
+        self._pending = {}
+        self.rejected = 0
+
+    @property
+    def queue_depth(self):
+        """Number of moves being computed or waiting for a worker."""
+        with self._lock:
+            return sum(len(futures) for futures in self._pending.values())
+
+    def submit(self, lobby_slug, game, bot, on_move):
+        """Computes the next move of the bot, which is passed to `on_move(game, bot, location)` unless the game changed
+        in the meantime. Returns the future of the move, or None if the fallback strategy computed it. Has to be called
+        while no other thread changes the game, e.g. holding the lock of its lobby, as the bot searches a copy of the
+        game taken right away."""
+        version = game.version
+        game_copy = GameCopy(game)
+        with self._lock:
+            saturated = sum(len(futures) for futures in self._pending.values()) >= self.max_queued
+            if not saturated:
+                future = self._executor.submit(bot.choose_move, game_copy)
+                self._pending.setdefault(lobby_slug, set()).add(future)
+            else:
+                self.rejected += 1
+
+        if saturated:
+            if self.fallback is None:
+                raise BotMoveExecutor.Saturated()
+            games_logger.debug(f"Bot executor saturated, {bot.name} in {lobby_slug} plays a fallback move.")
+            on_move(game, bot, self.fallback.choose_move(game_copy, bot))
+            return None
+
+        future.add_done_callback(lambda f: self._finish(lobby_slug, game, bot, version, on_move, f))
+        return future
+
+    def _finish(self, lobby_slug, game, bot, version, on_move, future):
+        with self._lock:
+            futures = self._pending.get(lobby_slug, ())
+            if future not in futures:
+                # the moves of the lobby have been cancelled
+                return
+            futures.remove(future)
+            if not futures:
+                del self._pending[lobby_slug]
+
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            games_logger.error(f"Computing the move of {bot.name} in {lobby_slug} failed: {future.exception()!r}")
+            return
+        if game.version != version:
+            games_logger.debug(f"Dropped the move of {bot.name} in {lobby_slug}, the game changed in the meantime.")
+            return
+        self._post(on_move, game, bot, future.result())
+
+    def cancel(self, lobby_slug):
+        """Drops all moves of the lobby. Moves that are still waiting for a worker won't be computed."""
+        with self._lock:
+            futures = self._pending.pop(lobby_slug, ())
+        for future in futures:
+            future.cancel()
+        return len(futures)
+
+    def shutdown(self):
+        with self._lock:
+            futures = [future for pending in self._pending.values() for future in pending]
+            self._pending.clear()
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
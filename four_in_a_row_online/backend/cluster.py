@@ -0,0 +1,356 @@
+"""Cluster mode, in which several server workers share the lobbies. Each lobby is owned by the worker a consistent hash
+ring assigns its slug to, and workers talk through a message bus: operations on lobbies owned by another worker are
+forwarded to it, messages to the room of a lobby are broadcast to every worker, as the connections in the room might be
+held by any of them, and lobbies are handed over to their new owner when workers join or leave."""
+import bisect
+import hashlib
+import itertools
+import json as JSON
+from threading import Event, Lock
+from four_in_a_row_online.backend.lobby_registry import LobbyRegistry
+from four_in_a_row_online.loggers.loggers import games_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes. Each node is placed on the ring `replicas` times, and a key belongs to
+    the node following its hash on the ring. Adding or removing a node only moves the keys between it and its
+    neighbours, about 1 / number of nodes of all keys."""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        # sorted hashes of the points on the ring, and the node of each point
+        self._hashes = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    @property
+    def nodes(self):
+        return set(self._nodes.values())
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes.values()
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self.hash(f'{node}#{replica}')
+            if point not in self._nodes:
+                bisect.insort(self._hashes, point)
+            self._nodes[point] = node
+
+    def remove(self, node):
+        for replica in range(self.replicas):
+            point = self.hash(f'{node}#{replica}')
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                del self._hashes[bisect.bisect_left(self._hashes, point)]
+
+    def owner(self, key):
+        """Returns the node the key belongs to, or None if the ring is empty."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect_right(self._hashes, self.hash(key)) % len(self._hashes)
+        return self._nodes[self._hashes[index]]
+
+
+class MessageBus:
+    """Delivers each message published on a channel to every callback subscribed to the channel. Subclasses connect
+    the workers of a cluster, e.g. through the pub/sub of a broker. Messages are dicts, which buses spanning several
+    processes have to serialize."""
+
+    def publish(self, channel, message):
+        raise NotImplementedError()
+
+    def subscribe(self, channel, callback):
+        raise NotImplementedError()
+
+    def unsubscribe(self, channel, callback):
+        raise NotImplementedError()
+
+
+class LoopbackBus(MessageBus):
+    """Bus within a single process, so a whole cluster can run on one machine, e.g. in tests. Messages are passed
+    without copying them, to each callback through `post`, which runs a function with its arguments and defaults to
+    calling it right away in the publishing thread."""
+
+    def __init__(self, post=None):
+        self._post = post if post is not None else (lambda function, *args: function(*args))
+        self._lock = Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            self._post(callback, message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(channel, None)
+
+
+class RedisBus(MessageBus):
+    """Bus through the pub/sub of a Redis server, connecting workers in any number of processes and machines. Messages
+    are encoded by the `dumps` of the given json module, so they may only hold data it can encode. They are received
+    by a thread listening to the server, which passes them to the callbacks in the order they were published. Needs
+    the redis package."""
+
+    def __init__(self, url='redis://localhost:6379/0', json=JSON):
+        if redis is None:
+            raise RuntimeError("The Redis bus needs redis, install it with `pip install redis`.")
+        self._json = json
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._lock = Lock()
+        self._subscribers = {}
+        self._listener = None
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, self._json.dumps(message))
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.setdefault(channel, [])
+            callbacks.append(callback)
+            if len(callbacks) == 1:
+                self._pubsub.subscribe(**{channel: self._receive})
+            if self._listener is None:
+                self._listener = self._pubsub.run_in_thread(sleep_time=.01, daemon=True)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks and self._subscribers.pop(channel, None) is not None:
+                self._pubsub.unsubscribe(channel)
+
+    def _receive(self, message):
+        channel = message['channel'].decode()
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        content = self._json.loads(message['data'])
+        for callback in callbacks:
+            callback(content)
+
+
+class ClusterNode:
+    """A worker of the cluster, owning the lobbies of its `lobbies` registry. Operations are functions taking a lobby
+    and further arguments, registered by name, and `call` runs them on the owner of the lobby, wherever it is.
+
+    Lobbies the node takes over are passed to `on_adopt`, lobbies it hands over to `on_release`, and broadcasts to
+    `on_broadcast(room, event, message)`. Lobbies are sent to other nodes as `dump_lobby(lobby)` and made again by
+    `load_lobby`, which by default pass the lobby itself, which only works on a `LoopbackBus`. Buses spanning several
+    processes need them to turn lobbies into plain data and back, and operations to take and return plain data.
+
+    Messages are handled in the order they arrive and handling one never waits for another, so buses may deliver them
+    from a single thread."""
+
+    MEMBERS_CHANNEL = 'cluster.members'
+    BROADCAST_CHANNEL = 'cluster.broadcast'
+    # times a call is forwarded again, if ownership moved while it was on its way
+    MAX_HOPS = 3
+
+    class Unavailable(RuntimeError):
+        """The owner of the lobby didn't answer in time."""
+
+    class RemoteError(RuntimeError):
+        """The operation failed on the owner of the lobby."""
+
+    def __init__(self, node_id, bus, lobbies=None, operations=None, on_adopt=None, on_release=None,
+                 on_broadcast=None, dump_lobby=None, load_lobby=None, timeout=5., replicas=64):
+        self.node_id = node_id
+        self.bus = bus
+        self.lobbies = lobbies if lobbies is not None else LobbyRegistry()
+        self.operations = dict(operations or {})
+        self.on_adopt = on_adopt or (lambda lobby: None)
+        self.on_release = on_release or (lambda lobby: None)
+        self.on_broadcast = on_broadcast or (lambda room, event, message: None)
+        self.dump_lobby = dump_lobby or (lambda lobby: lobby)
+        self.load_lobby = load_lobby or (lambda lobby: lobby)
+        self.timeout = timeout
+        self.ring = HashRing(replicas=replicas)
+        self._ring_lock = Lock()
+        self._request_ids = itertools.count()
+        # event and reply of the requests waiting for a reply, by request id
+        self._pending = {}
+        self._channel = self.channel(node_id)
+
+    @staticmethod
+    def channel(node_id):
+        return f'cluster.node.{node_id}'
+
+    def start(self):
+        self.bus.subscribe(self._channel, self._handle_message)
+        self.bus.subscribe(self.MEMBERS_CHANNEL, self._handle_membership)
+        self.bus.subscribe(self.BROADCAST_CHANNEL, self._handle_broadcast)
+        with self._ring_lock:
+            self.ring.add(self.node_id)
+        self.bus.publish(self.MEMBERS_CHANNEL, {'type': 'join', 'node': self.node_id})
+
+    def stop(self):
+        """Hands all lobbies over to the remaining nodes and leaves the cluster."""
+        with self._ring_lock:
+            self.ring.remove(self.node_id)
+        self.rebalance()
+        self.bus.publish(self.MEMBERS_CHANNEL, {'type': 'leave', 'node': self.node_id})
+        self.bus.unsubscribe(self._channel, self._handle_message)
+        self.bus.unsubscribe(self.MEMBERS_CHANNEL, self._handle_membership)
+        self.bus.unsubscribe(self.BROADCAST_CHANNEL, self._handle_broadcast)
+
+    def owner(self, lobby_slug):
+        with self._ring_lock:
+            return self.ring.owner(lobby_slug)
+
+    def owns(self, lobby_slug):
+        return self.owner(lobby_slug) == self.node_id
+
+    def add(self, lobby):
+        """Adds a new lobby to the cluster, on its owner. Raises LobbyRegistry.SlugTaken if there is a lobby with its
+        slug already."""
+        owner = self.owner(lobby.lobby_slug)
+        if owner == self.node_id or owner is None:
+            self._add(lobby)
+        else:
+            self._request(owner, {'type': 'add', 'lobby_slug': lobby.lobby_slug, 'lobby': self.dump_lobby(lobby)})
+
+    def _add(self, lobby):
+        self.lobbies.add(lobby)
+        self.on_adopt(lobby)
+
+    def call(self, lobby_slug, operation, *args):
+        """Runs the operation on the lobby, on the node owning it, and returns its result. Raises
+        LobbyRegistry.NotFound if there is no such lobby."""
+        owner = self.owner(lobby_slug)
+        if owner == self.node_id or owner is None:
+            return self._run(lobby_slug, operation, args)
+        return self._request(owner, {'type': 'call', 'lobby_slug': lobby_slug, 'operation': operation,
+                                     'args': args, 'hops': 1})
+
+    def _run(self, lobby_slug, operation, args):
+        lobby = self.lobbies.get(lobby_slug)
+        if lobby is None:
+            raise LobbyRegistry.NotFound(lobby_slug)
+        return self.operations[operation](lobby, *args)
+
+    def broadcast(self, room, event, message):
+        """Passes the message to `on_broadcast` of every node, including this one."""
+        self.bus.publish(self.BROADCAST_CHANNEL, {'room': room, 'event': event, 'message': message})
+
+    def rebalance(self):
+        """Hands the lobbies this node doesn't own anymore over to their owners."""
+        for lobby_slug, lobby in self.lobbies.items():
+            owner = self.owner(lobby_slug)
+            # the lobby may have been replaced meanwhile, e.g. by a handoff back to this node
+            if owner is None or owner == self.node_id or not self.lobbies.remove(lobby):
+                continue
+            self.on_release(lobby)
+            games_logger.debug(f"Handing lobby {lobby_slug} over from {self.node_id} to {owner}.")
+            self.bus.publish(self.channel(owner), {'type': 'handoff', 'lobby_slug': lobby_slug,
+                                                   'lobby': self.dump_lobby(lobby)})
+
+    def _request(self, node_id, message):
+        request_id = next(self._request_ids)
+        event = Event()
+        self._pending[request_id] = event, []
+        self.bus.publish(self.channel(node_id), {**message, 'request_id': request_id, 'reply_to': self.node_id})
+        if not event.wait(self.timeout):
+            self._pending.pop(request_id, None)
+            raise ClusterNode.Unavailable(node_id)
+        _, (reply,) = self._pending.pop(request_id)
+        error = reply.get('error')
+        if error == 'lobby_not_found':
+            raise LobbyRegistry.NotFound(message.get('lobby_slug'))
+        if error == 'slug_taken':
+            raise LobbyRegistry.SlugTaken(message['lobby_slug'])
+        if error is not None:
+            raise ClusterNode.RemoteError(error)
+        return reply['result']
+
+    def _reply(self, message, **reply):
+        self.bus.publish(self.channel(message['reply_to']),
+                         {'type': 'reply', 'request_id': message['request_id'], **reply})
+
+    def _handle_message(self, message):
+        message_type = message['type']
+        if message_type == 'reply':
+            pending = self._pending.get(message['request_id'])
+            if pending is not None:
+                event, replies = pending
+                replies.append(message)
+                event.set()
+        elif message_type == 'call':
+            owner = self.owner(message['lobby_slug'])
+            if owner not in (self.node_id, None) and message['hops'] < self.MAX_HOPS:
+                # ownership moved while the call was on its way, the owner answers the caller
+                self.bus.publish(self.channel(owner), {**message, 'hops': message['hops'] + 1})
+                return
+            try:
+                result = self._run(message['lobby_slug'], message['operation'], message['args'])
+            except LobbyRegistry.NotFound:
+                self._reply(message, error='lobby_not_found')
+            except Exception as e:
+                self._reply(message, error=repr(e))
+            else:
+                self._reply(message, result=result)
+        elif message_type == 'add':
+            try:
+                self._add(self.load_lobby(message['lobby']))
+            except LobbyRegistry.SlugTaken:
+                self._reply(message, error='slug_taken')
+            except Exception as e:
+                self._reply(message, error=repr(e))
+            else:
+                self._reply(message, result=None)
+        elif message_type == 'handoff':
+            try:
+                self._add(self.load_lobby(message['lobby']))
+            except LobbyRegistry.SlugTaken:
+                games_logger.warning(f"{self.node_id} was handed lobby {message['lobby_slug']}, "
+                                     f"which it has already.")
+            # the lobby is kept even if this node doesn't know all nodes of the ring of the sender yet, it is passed on
+            # once it learns about them, which would otherwise pass it back and forth
+        elif message_type == 'present':
+            self._add_node(message['node'])
+
+    def _handle_membership(self, message):
+        node_id = message['node']
+        if node_id == self.node_id:
+            return
+        if message['type'] == 'join':
+            self.bus.publish(self.channel(node_id), {'type': 'present', 'node': self.node_id})
+            self._add_node(node_id)
+        elif message['type'] == 'leave':
+            with self._ring_lock:
+                self.ring.remove(node_id)
+            self.rebalance()
+
+    def _add_node(self, node_id):
+        with self._ring_lock:
+            if node_id in self.ring:
+                return
+            self.ring.add(node_id)
+        self.rebalance()
+
+    def _handle_broadcast(self, message):
+        self.on_broadcast(message['room'], message['event'], message['message'])
@@ -0,0 +1,103 @@
+"""Index of the publicly listed lobbies, answering filtered and paginated listings without looking at every lobby."""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, bisect_right, insort
+import heapq
+from threading import Lock
+
+
+class LobbyIndex:
+    """Keeps the public lobbies in buckets by the attributes they can be filtered by: the size of the play field,
+    whether cards are enabled and the number of free seats. Each bucket holds its lobbies sorted from the newest to the
+    oldest, so a page is merged from the buckets matching the filters, starting at the position of the cursor in each
+    of them. A listing costs O(buckets · log(lobbies) + page size · log(buckets)), and there are only as many buckets
+    as there are different combinations of these attributes.
+
+    The index has to be updated whenever a lobby is created, changes its rules or players, or is removed."""
+
+    class InvalidCursor(ValueError):
+        """The cursor wasn't returned by a listing."""
+
+    def __init__(self):
+        self._lock = Lock()
+        # sorted lists of (-creation timestamp, slug) by bucket key
+        self._buckets = {}
+        # lobby, bucket key and entry by slug
+        self._lobbies = {}
+
+    @staticmethod
+    def bucket_key(lobby):
+        rules = lobby.next_rules
+        free_seats = max(lobby.max_number_of_players - len(lobby.players_by_session), 0)
+        return rules.play_field_width, rules.play_field_height, bool(rules.enable_cards), free_seats
+
+    def __len__(self):
+        return len(self._lobbies)
+
+    def update(self, lobby):
+        """Adds the lobby, moves it to the bucket it belongs to now or removes it if it isn't listed publicly."""
+        with self._lock:
+            self._remove(lobby.lobby_slug)
+            if lobby.list_publicly:
+                key = self.bucket_key(lobby)
+                entry = -lobby.creation_time.timestamp(), lobby.lobby_slug
+                insort(self._buckets.setdefault(key, []), entry)
+                self._lobbies[lobby.lobby_slug] = lobby, key, entry
+
+    def remove(self, lobby_slug):
+        with self._lock:
+            self._remove(lobby_slug)
+
+    def _remove(self, lobby_slug):
+        if lobby_slug not in self._lobbies:
+            return
+        _, key, entry = self._lobbies.pop(lobby_slug)
+        bucket = self._buckets[key]
+        del bucket[bisect_left(bucket, entry)]
+        if not bucket:
+            del self._buckets[key]
+
+    @staticmethod
+    def encode_cursor(entry):
+        negative_timestamp, slug = entry
+        return urlsafe_b64encode(f'{negative_timestamp!r}:{slug}'.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            negative_timestamp, slug = urlsafe_b64decode(cursor.encode()).decode().split(':', 1)
+            return float(negative_timestamp), slug
+        except ValueError:
+            raise LobbyIndex.InvalidCursor()
+
+    def page(self, limit=20, cursor=None, min_free_seats=None, width=None, height=None, cards_enabled=None,
+             created_after=None, created_before=None):
+        """Returns up to `limit` lobbies matching the filters, newest first, along with the cursor to pass to get the
+        next page, which is None on the last page. Creation times are given as timestamps."""
+        bounds = []
+        if cursor:
+            bounds.append(self.decode_cursor(cursor))
+        if created_before is not None:
+            # sorts after all lobbies created at the given time or later
+            bounds.append((-created_before, chr(0x10ffff)))
+        start = max(bounds) if bounds else None
+        with self._lock:
+            pages = []
+            for (bucket_width, bucket_height, bucket_cards, free_seats), bucket in self._buckets.items():
+                if width is not None and bucket_width != width or height is not None and bucket_height != height or \
+                        cards_enabled is not None and bucket_cards != cards_enabled or \
+                        min_free_seats is not None and free_seats < min_free_seats:
+                    continue
+                position = bisect_right(bucket, start) if start is not None else 0
+                # one more than a page tells whether there is a next page
+                pages.append(bucket[position:position + limit + 1])
+
+            entries = []
+            for entry in heapq.merge(*pages):
+                if created_after is not None and -entry[0] <= created_after:
+                    break
+                entries.append(entry)
+                if len(entries) == limit + 1:
+                    break
+            lobbies = [self._lobbies[slug][0] for _, slug in entries[:limit]]
+        next_cursor = self.encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+        return lobbies, next_cursor
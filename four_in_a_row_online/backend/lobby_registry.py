@@ -0,0 +1,74 @@
+"""Registry of the lobbies of the server, split into shards so lobbies can be created, looked up and removed from many
+threads at once."""
+from threading import Lock
+from zlib import crc32
+
+
+class LobbyRegistry:
+    """Lobbies by slug, kept in `shards` dicts. The shard of a lobby is picked by the CRC-32 of its slug, and each shard
+    has its own lock, so operations on lobbies of different shards don't wait for each other. Lookups don't take a
+    lock at all.
+
+    Iterating holds the lock of one shard at a time, while copying its lobbies, so it never blocks the whole registry
+    and sees every lobby that is in the registry during the whole iteration."""
+
+    class SlugTaken(ValueError):
+        """There is a lobby with the slug already."""
+
+    class NotFound(LookupError):
+        """There is no lobby with the slug."""
+
+    def __init__(self, shards=16):
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [Lock() for _ in range(shards)]
+
+    def _shard(self, lobby_slug):
+        return crc32(lobby_slug.encode()) % len(self._shards)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, lobby_slug):
+        return lobby_slug in self._shards[self._shard(lobby_slug)]
+
+    def get(self, lobby_slug, default=None):
+        if not isinstance(lobby_slug, str):
+            return default
+        return self._shards[self._shard(lobby_slug)].get(lobby_slug, default)
+
+    def add(self, lobby):
+        """Adds the lobby, or raises SlugTaken if there is another lobby with its slug."""
+        index = self._shard(lobby.lobby_slug)
+        with self._locks[index]:
+            if lobby.lobby_slug in self._shards[index]:
+                raise LobbyRegistry.SlugTaken(lobby.lobby_slug)
+            self._shards[index][lobby.lobby_slug] = lobby
+
+    def pop(self, lobby_slug, default=None):
+        index = self._shard(lobby_slug)
+        with self._locks[index]:
+            return self._shards[index].pop(lobby_slug, default)
+
+    def remove(self, lobby):
+        """Removes the lobby if it is still the one with its slug. Returns whether it was removed."""
+        index = self._shard(lobby.lobby_slug)
+        with self._locks[index]:
+            if self._shards[index].get(lobby.lobby_slug) is not lobby:
+                return False
+            del self._shards[index][lobby.lobby_slug]
+            return True
+
+    def items(self):
+        """Yields the slugs and lobbies, a shard at a time."""
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items = list(shard.items())
+            yield from items
+
+    def values(self):
+        for _, lobby in self.items():
+            yield lobby
+
+    def __iter__(self):
+        for lobby_slug, _ in self.items():
+            yield lobby_slug
@@ -0,0 +1,71 @@
+"""Coalescing of the messages sent to the connections of a lobby. Messages are queued per room and sent as a single
+frame per room and tick, so bursts of changes, like cards played in quick succession or many players joining at once,
+cost one packet per connection and tick instead of one per change."""
+from threading import Event, Lock
+
+
+class Outbox:
+    """Queues messages by room until the next `flush`, which passes the messages of each room to
+    `send(room, frame)` as a single frame, a list of [event, message] pairs in the order they were put. Messages of
+    the events in `snapshots` hold the whole state of something, so a newer one supersedes the queued one of the same
+    event, which is dropped. `run` flushes every `tick` seconds."""
+
+    def __init__(self, send, tick=.033, snapshots=()):
+        self.tick = tick
+        self.snapshots = frozenset(snapshots)
+        self._send = send
+        self._lock = Lock()
+        # queued messages by room, superseded ones are None
+        self._queues = {}
+        # position of the queued message of each snapshot event in the queue of its room, by room
+        self._snapshot_positions = {}
+        self._stopped = Event()
+        self.messages = 0
+        self.superseded = 0
+        self.frames = 0
+
+    def __len__(self):
+        """Number of rooms with queued messages."""
+        return len(self._queues)
+
+    def put(self, room, event, message):
+        with self._lock:
+            queue = self._queues.setdefault(room, [])
+            if event in self.snapshots:
+                positions = self._snapshot_positions.setdefault(room, {})
+                if event in positions:
+                    queue[positions[event]] = None
+                    self.superseded += 1
+                positions[event] = len(queue)
+            queue.append([event, message])
+            self.messages += 1
+
+    def flush(self):
+        """Sends the queued messages, one frame per room. Returns the number of frames sent."""
+        with self._lock:
+            queues, self._queues = self._queues, {}
+            self._snapshot_positions = {}
+        for room, queue in queues.items():
+            self._send(room, [entry for entry in queue if entry is not None])
+        with self._lock:
+            self.frames += len(queues)
+        return len(queues)
+
+    def discard(self, room):
+        """Drops the queued messages of the room."""
+        with self._lock:
+            self._queues.pop(room, None)
+            self._snapshot_positions.pop(room, None)
+
+    def run(self, sleep=None):
+        """Flushes every tick until stopped. Waits by `sleep` if given, e.g. the sleep of the async framework the server
+        runs on, and on a threading event otherwise."""
+        while not self._stopped.is_set():
+            if sleep is None:
+                self._stopped.wait(self.tick)
+            else:
+                sleep(self.tick)
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
@@ -1,5 +1,5 @@
 """Schemas for incoming json data on socketio connections"""
-from four_in_a_row_online.game_logic import game_actions
+from four_in_a_row_online.game_logic import bots, game_actions
 
 type_ = "type"
 boolean = "boolean"
@@ -43,7 +43,8 @@ token_style_schema = {
             "maxItems": 4,
             "items": {type_: integer}
         }
-    }
+    },
+    "required": ["color"]
 }
 
 player_schema = {
@@ -51,7 +52,8 @@ player_schema = {
     "properties": {
         "name": {type_: string},
         "token_style": token_style_schema
-    }
+    },
+    "required": ["name", "token_style"]
 }
 
 change_rules_schema = {
@@ -88,6 +90,26 @@ chat_message_schema = {
     }
 }
 
+start_game_schema = {
+    type_: "object",
+    "properties": {
+        "bots": {
+            type_: "array",
+            "items": {
+                type_: "object",
+                "properties": {
+                    "name": {type_: string},
+                    "strategy": {
+                        type_: string,
+                        "enum": list(bots.strategies)
+                    }
+                },
+                "required": ["name"]
+            }
+        }
+    }
+}
+
 game_action_schema = {
     type_: "object",
     "properties": {
@@ -101,5 +123,6 @@ game_action_schema = {
                 type_: "object"
             }
         }
-    }
+    },
+    "required": ["action"]
 }
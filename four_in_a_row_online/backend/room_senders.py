@@ -0,0 +1,49 @@
+"""Senders of the messages to the rooms of the lobbies, passed to `RequestHandler.use_sender`. Messages to the rooms are
+sent from any thread, e.g. the one receiving the messages of the cluster or the workers placing the tokens of bots, but
+the sockets of most async modes can only be used from the tasks of their server. A sender has a method
+`emit(room, event, message)` and a method `close_room(room)`, both of which can be called from any thread."""
+from collections import deque
+
+
+class QueuedSender:
+    """Sends the messages with a Flask-SocketIO server. Messages are queued until the next `flush`, which has to run on
+    a task of the server, see `RequestHandler.send_messages`."""
+
+    def __init__(self, socketio, namespace):
+        self.socketio = socketio
+        self.namespace = namespace
+        self._messages = deque()
+
+    def emit(self, room, event, message):
+        self._messages.append((room, event, message))
+
+    def close_room(self, room):
+        # queued like the messages, so the last messages to the room still reach it
+        self._messages.append((room, None, None))
+
+    def flush(self):
+        """Sends the queued messages and closes the queued rooms, in the order they were queued."""
+        while self._messages:
+            room, event, message = self._messages.popleft()
+            if event is None:
+                self.socketio.close_room(room, namespace=self.namespace)
+            else:
+                self.socketio.emit(event, message, room=room, namespace=self.namespace)
+
+
+class LoopSender:
+    """Sends the messages with an asynchronous python-socketio server, by scheduling them on its event loop."""
+
+    def __init__(self, sio, loop, namespace):
+        self.sio = sio
+        self.loop = loop
+        self.namespace = namespace
+
+    def _schedule(self, coroutine):
+        self.loop.call_soon_threadsafe(self.loop.create_task, coroutine)
+
+    def emit(self, room, event, message):
+        self._schedule(self.sio.emit(event, message, room=room, namespace=self.namespace))
+
+    def close_room(self, room):
+        self._schedule(self.sio.close_room(room, namespace=self.namespace))
@@ -1,21 +1,28 @@
 from flask import json as JSON
-from flask import Flask, request, jsonify, session
-from flask_socketio import SocketIO
+from flask import Flask, Response, request, jsonify, session
+from flask_socketio import SocketIO, join_room, leave_room
+import hashlib
 import os
 import pathlib
 from base64 import b64encode
 from werkzeug import exceptions
 from slugify import slugify
-from four_in_a_row_online.game_logic import data, logic
-import jsonschema
-from four_in_a_row_online.backend import schema
-from time import sleep
-from threading import Thread, Lock
+from four_in_a_row_online.game_logic import bots, data, game_actions, logic, solver
+from four_in_a_row_online.backend.bot_moves import BotMoveExecutor
+from four_in_a_row_online.backend.cluster import ClusterNode, LoopbackBus, RedisBus
+from four_in_a_row_online.backend.lobby_index import LobbyIndex
+from four_in_a_row_online.backend.lobby_registry import LobbyRegistry
+from four_in_a_row_online.backend.outbox import Outbox
+from four_in_a_row_online.backend.room_senders import QueuedSender
+from four_in_a_row_online.backend.timer_wheel import TimerWheel
+from four_in_a_row_online.backend.validation import error_json, validators
+from time import monotonic, sleep
+from threading import Lock, RLock
 from flask_session import Session
 import datetime
 from four_in_a_row_online.loggers.loggers import games_logger, requests_logger, stats_logger
 from ast import literal_eval
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 
 
 class Lobby:
@@ -29,280 +36,413 @@ class Lobby:
         self.list_publicly = list_publicly
         self.max_number_of_players = max_number_of_players
         self.creation_time = datetime.datetime.now()
-        self.name_space = '/' + self.lobby_slug
+        # connections in the room of the lobby, players and spectators
+        self.connections = set()
+        # held while handling messages and bot moves, which change the players and the game of the lobby
+        self.lock = RLock()
+        self.removed = False
 
         self.next_rules = data.Rules.default_init()
         self.next_card_deck = data.CardDeck.default_init()
-
-        @RequestHandler.socketio.on("connect", namespace=self.name_space)
-        def handle_player_join(json=None):
-            if "connection_id" not in session:
-                session["connection_id"] = b64encode(os.urandom(2 ** 5))
-            requests_logger.debug(
-                f"{session.get('connection_id', None)} connected to game {self.lobby_name} at /{self.lobby_slug}."
-            )
-
-            if json:
-                if jsonschema.validate(json, schema.player_schema):
-                    token_style_data = json["token_style"]
+        # colors of the players in the lobby
+        self.palette = data.Palette()
+        # incremented on every change of the lobby, see `snapshot`
+        self._version = 0
+        self._snapshot = None
+
+    def handle_player_join(self, connection_id, json=None):
+        requests_logger.debug(f"{connection_id} joined lobby {self.lobby_name}.")
+
+        if json:
+            errors = validators["join_lobby"](json)
+            if not errors:
+                token_style_data = json["token_style"]
+                try:
                     token_style = data.TokenStyle(color=tuple(token_style_data["color"]))
-                    player = data.Player(json['player_name'], token_style)
-                    if not self.current_game and len(self.players_by_session) < max_number_of_players:
-                        self.players_by_session[session["connection_id"]] = player
-
-
-                    ########
-                    def player_join(self, p):
-                        if self._game_state == logic.Game.State.started:
-                            if not self.rules.allow_reconnect:
-                                raise logic.Game.InvalidPlayer()
-                            else:
-                                if p not in self.participants:
-                                    if not any(p.name == x.name for x in self.initial_players):
-                                        self.participants.append(p)
+                except data.TokenStyle.TooTransparent:
+                    return JSON.dumps({"Error": {
+                        "type": "color_too_transparent",
+                        "message": "The alpha value of the color has to be at least 125.",
+                    }})
+                except data.TokenStyle.OutOfRange:
+                    return JSON.dumps({"Error": {
+                        "type": "color_out_of_range",
+                        "message": "The values of the color have to be between 0 and 255.",
+                    }})
+                player = data.Player(json["name"], token_style)
+                if not self.palette.is_distinguishable(token_style):
+                    return JSON.dumps({"Error": {
+                        "type": "color_taken",
+                        "message": "The color can't be distinguished from the color of another player.",
+                    }})
+                if not self.current_game and len(self.players_by_session) < self.max_number_of_players:
+                    self.players_by_session[connection_id] = player
+                    self.palette.add(token_style)
+                    self.touch()
+                    RequestHandler.lobby_expiry.cancel(self.lobby_slug)
+                    RequestHandler.count("players_joined")
+
+
+                ########
+                def player_join(self, p):
+                    if self._game_state == logic.Game.State.started:
+                        if not self.rules.allow_reconnect:
+                            raise logic.Game.InvalidPlayer()
                         else:
-                            if any([
-                                not data.TokenStyle.distinguishable(x.token_style, p.token_style)
-                                for x in self.participants
-                            ]) or any([p.name == x.name for x in self.participants]):
-                                raise logic.Game.InvalidPlayer()
+                            if p not in self.participants:
+                                if not any(p.name == x.name for x in self.initial_players):
+                                    self.participants.append(p)
+                    else:
+                        if any([
+                            not data.TokenStyle.distinguishable(x.token_style, p.token_style)
+                            for x in self.participants
+                        ]) or any([p.name == x.name for x in self.participants]):
+                            raise logic.Game.InvalidPlayer()
 
-                            if not len(self.participants) < self.rules.number_of_players:
-                                raise logic.Game.LobbyFull(len(self.participants))
+                        if not len(self.participants) < self.rules.number_of_players:
+                            raise logic.Game.LobbyFull(len(self.participants))
 
-                        self.participants.append(p)
+                    self.participants.append(p)
+            else:
+                return JSON.dumps(error_json(errors))
+        else:
+            return JSON.dumps({"Error": {
+                "type": "data_missing",
+                "message": "You need to provide json data."
+            }})
+
+    def handle_player_leave(self, connection_id):
+        player = self.players_by_session.get(connection_id, None)
+        requests_logger.debug(f"{connection_id} left lobby {self.lobby_name}.")
+        if player:
+            del self.players_by_session[connection_id]
+            self.palette.remove(player.token_style)
+            self.touch()
+            RequestHandler.count("players_left")
+            if not self.players_by_session:
+                RequestHandler.lobby_expiry.schedule(self.lobby_slug, RequestHandler.LOBBY_TIMEOUT)
+
+            ####################
+            def player_leave(self, p):
+                # NOTE: Backend will only make one copy per player for certain (except for reconnects)
+                if p in self.participants:
+                    print('before:', self.participants)
+                    self.participants.remove(p)
+                    print('after:', self.participants)
                 else:
-                    return JSON.dumps({"Error": {
-                        "type": "schema_error",
-                        "message": "The json data provided does not match the required schema."
-                    }})
+                    raise logic.Game.InvalidPlayer
+
+                if len(self.participants) == 0:
+                    self.quit_game()
+
+                elif p == self.host:
+                    self.host = self.participants[0]
+
+                if self.rules.finish_game_on_disconnect:
+                    self.finish_game()
+                    # self._game_state = GameState.lobby
+
+    def handle_chat_message(self, connection_id, json=None):
+        player = self.players_by_session.get(connection_id, None)
+        if json:
+            errors = validators["chat_message"](json)
+            if errors:
+                return JSON.dumps(error_json(errors))
+            if player and "message" in json:
+                self.emit("chat_message", {"player": player.name, "message": json["message"]})
+        else:
+            return JSON.dumps({"Error": {
+                "type": "data_missing",
+                "message": "You need to provide json data."
+            }})
+        requests_logger.debug(f"A player has tried to send a chat message to game {self.lobby_name}")
+
+    # TODO: endpoint for updating rules in the lobby
+    # store current rules in lobby
+    # on start game request check if game can be started and create game object if possible
+    # enable players to change their ready state
+
+    def vote_on_rules(self, connection_id, json=None):
+        player = self.players_by_session.get(connection_id, None)
+        if player:
+            requests_logger.debug(f'Player {player} is trying to vote on rules in {self.lobby_slug}')
+            if json:
+                errors = validators["vote_rules"](json)
+                if errors:
+                    return JSON.dumps(error_json(errors))
             else:
                 return JSON.dumps({"Error": {
                     "type": "data_missing",
-                    "message": "You need to provide json data."
+                    "message": "You need to provide json data.",
                 }})
+        else:
+            requests_logger.debug(f'A foreign connection has tried to vote on rules in {self.lobby_slug}')
+
+    def handle_start_game(self, connection_id, json=None):
+        """Starts a game of the players in the lobby with the rules and the card deck of the lobby. The json may list
+        `bots` to play along, each with a `name` and the name of its `strategy`."""
+        requests_logger.debug(f"A player has tried to start the game {self.lobby_name}")
+        player = self.players_by_session.get(connection_id, None)
+        if not player:
+            requests_logger.debug(f'A foreign connection has tried to start {self.lobby_slug}')
+            return JSON.dumps({"Error": {
+                "type": "insufficient_authorization",
+                "message": "You are not a player and hence not allowed to start the game.",
+            }})
+        requests_logger.debug(f'Player {player} is trying to start {self.lobby_slug}')
+        json = json or {}
+        errors = validators["start_game"](json)
+        if errors:
+            return JSON.dumps(error_json(errors))
+        if self.current_game and self.current_game.game_state == logic.Game.State.started:
+            return JSON.dumps({"Error": {
+                "type": "game_running",
+                "message": "There is a game running in the lobby already.",
+            }})
+
+        players = list(self.players_by_session.values())
+        # bots get colors distinguishable from the colors of the players
+        palette = data.Palette(p.token_style for p in players)
+        for bot_data in json.get("bots", []):
+            if any(p.name == bot_data["name"] for p in players):
+                return JSON.dumps({"Error": {
+                    "type": "name_taken",
+                    "message": f"There is a player named {bot_data['name']} already.",
+                }})
+            strategy = bots.strategies[bot_data.get("strategy", "alphabeta")]()
+            players.append(bots.Bot(bot_data["name"], palette.allocate(), strategy))
+        if len(players) < 2:
+            return JSON.dumps({"Error": {
+                "type": logic.Game.CannotBeStarted.Reason.not_enough_players.value,
+                "message": "A game needs at least two players.",
+            }})
+        if len(players) > self.max_number_of_players:
+            return JSON.dumps({"Error": {
+                "type": "lobby_full",
+                "message": f"A game in this lobby has at most {self.max_number_of_players} players.",
+            }})
+
+        game = logic.Game(self.lobby_name, data.Rules(**self.next_rules.json()),
+                          data.CardDeck(**self.next_card_deck.json()), players)
+        game.start_game()
+        self.games.append(game)
+        self.current_game = game
+        self.touch()
+        games_logger.debug(f"Started a game of {len(players)} players in {self.lobby_slug}.")
+        self.game_changed(game)
+
+    def handle_quit_game(self, connection_id, json=None):
+        requests_logger.debug(f"A player has tried to quit the game {self.lobby_name}")
+        player = self.players_by_session.get(connection_id, None)
+        if player:
+            requests_logger.debug(f'Player {player} is trying to quit {self.lobby_slug}')
+        else:
+            requests_logger.debug(f'A foreign connection has tried to quit {self.lobby_slug}')
 
-        @RequestHandler.socketio.on("disconnect", self.name_space)
-        def handle_player_leave():
-            player = self.players_by_session.get(session.get("connection_id", None), None)
-            requests_logger.debug(f"{session.get('connection_id', None)} disconnected from {self.lobby_name} "
-                                  f"at /{self.lobby_slug}")
-            if player:
-                del self.players_by_session[session["connection_id"]]
-
-                ####################
-                def player_leave(self, p):
-                    # NOTE: Backend will only make one copy per player for certain (except for reconnects)
-                    if p in self.participants:
-                        print('before:', self.participants)
-                        self.participants.remove(p)
-                        print('after:', self.participants)
-                    else:
-                        raise logic.Game.InvalidPlayer
-
-                    if len(self.participants) == 0:
-                        self.quit_game()
-
-                    elif p == self.host:
-                        self.host = self.participants[0]
-
-                    if self.rules.finish_game_on_disconnect:
-                        self.finish_game()
-                        # self._game_state = GameState.lobby
-
-        @RequestHandler.socketio.on("chat_message", namespace=self.name_space)
-        def handle_chat_message(json=None):
-            player = self.players_by_session.get(session.get("connection_id", None), None)
+    def handle_game_action(self, connection_id, json=None):
+        requests_logger.debug(f"A player has tried to make a game action in game {self.lobby_name}")
+        player = self.players_by_session.get(connection_id, None)
+        if player:
+            requests_logger.debug(f'Player {player} is trying to commit a game action in {self.lobby_slug}')
             if json:
-                if jsonschema.validate(json, schema.player_schema):
-                    pass
-                else:
-                    return JSON.dumps({"Error": {
-                        "type": "schema_error",
-                        "message": "The json data provided does not match the required schema."
-                    }})
+                errors = validators["game_action"](json)
+                if errors:
+                    return JSON.dumps(error_json(errors))
+                return self.play_action(player, json)
             else:
                 return JSON.dumps({"Error": {
                     "type": "data_missing",
-                    "message": "You need to provide json data."
+                    "message": "You need to provide json data.",
                 }})
-            requests_logger.debug(f"A player has tried to send a chat message to game {self.lobby_name}")
-
-        # TODO: endpoint for updating rules in the lobby
-        # store current rules in lobby
-        # on start game request check if game can be started and create game object if possible
-        # enable players to change their ready state
-
-        @RequestHandler.socketio.on("vote_rules")
-        def vote_on_rules(json=None):
-            player = self.players_by_session.get(session.get("connection_id", None), None)
-            if player:
-                requests_logger.debug(f'Player {player} is trying to vote on rules on {self.name_space}')
-                if json:
-                    if jsonschema.validate(json, schema.game_action_schema):
-                        pass
-                    else:
-                        return jsonify({"Error": {
-                            "type": "schema_error",
-                            "message": "The json data provided does not match the required schema.",
-                        }})
+        else:
+            requests_logger.debug(f'A foreign connection has tried to commit a game action in {self.lobby_slug}')
+            return JSON.dumps({"Error": {
+                "type": "insufficient_authorization",
+                "message": "you are not a player an hence not allowed to commit a game action.",
+            }})
+
+    def play_action(self, player, json):
+        """Lets the player do the validated game action."""
+        game = self.current_game
+        if not game or game.game_state != logic.Game.State.started:
+            return JSON.dumps({"Error": {
+                "type": "no_game_running",
+                "message": "There is no game running in the lobby.",
+            }})
+        arguments = {}
+        for argument in json.get("arguments", []):
+            arguments.update(argument)
+        if game_actions.ActionType(json["action"]) == game_actions.ActionType.place_token:
+            loc_x, loc_y = arguments.get("x"), arguments.get("y")
+            if not isinstance(loc_x, int) or not isinstance(loc_y, (int, type(None))) or \
+                    loc_y is None and not game.rules.enable_gravity:
+                return JSON.dumps({"Error": {
+                    "type": "invalid_arguments",
+                    "message": "Placing a token needs the coordinates x and y, or only x in games with gravity.",
+                }})
+            try:
+                if loc_y is None:
+                    game.drop_token(player, loc_x)
                 else:
-                    return jsonify({"Error": {
-                        "type": "data_missing",
-                        "message": "You need to provide json data.",
-                    }})
-            else:
-                requests_logger.debug(f'A foreign connection has tried to vote on rules on {self.name_space}')
-
-        @RequestHandler.socketio.on("start_game", namespace=self.name_space)
-        def handle_start_game(json=None):
-            requests_logger.debug(f"A player has tried to start the game {self.lobby_name}")
-            player = self.players_by_session.get(session.get("connection_id", None), None)
-            if player:
-                requests_logger.debug(f'Player {player} is trying to start {self.name_space}')
-
-                # no data is needed as the rules for a new game are stored in the lobby object
-                def start_game(self, host_decision=False):
-                    def game_can_be_started(_host_decision):
-                        """Decide if the game can be started. Otherwise raise an exception stating the reason for the failure
-                        to be handled by the backend."""
-                        if self.rules.start_game_if_all_ready:
-                            # Case 1: All Players are ready
-                            if all(p.is_ready for p in self.participants):
-                                # Case 1.1: Number of players variable
-                                if self.rules.variable_player_count:
-                                    # Case 1.1.1: Enough Players in Lobby → start game
-                                    if len(self.participants) > 1:
-                                        return True
-                                    # Case 1.1.2: Not enough players for a game → Game cannot be started
-                                    else:
-                                        raise logic.Game.CannotBeStarted(
-                                            logic.Game.CannotBeStarted.Reason.not_enough_players)
-
-                                # Case 1.2: Number of Players fixed
-                                else:
-                                    # Case 1.2.1: Lobby is full → start game
-                                    if len(self.participants) == self.rules.number_of_players:
-                                        return True
-                                    # Case 1.2.2: Not enough players → Game cannot be started
-                                    else:
-                                        # Case 1.2.2.1: Host decided for the game to start → start game
-                                        if _host_decision:
-                                            return True
-                                        # Case 1.2.2.2: No host decision → Game cannot be started
-                                        else:
-                                            raise logic.Game.CannotBeStarted(
-                                                logic.Game.CannotBeStarted.Reason.not_enough_players)
-
-                            # Case 2: Not all players are ready → Game cannot be started
-                            else:
-                                raise logic.Game.CannotBeStarted(
-                                    logic.Game.CannotBeStarted.Reason.not_all_players_ready)
+                    game.place_token(player, loc_x, loc_y)
+            except logic.Game.IllegalAction:
+                return JSON.dumps({"Error": {
+                    "type": "illegal_action",
+                    "message": "The token can't be placed there, or it isn't your turn.",
+                }})
+        self.game_changed(game)
 
-                        else:
-                            # Case 1: Lobby full → start game
-                            if len(self.participants) == self.rules.number_of_players:
-                                return True
-
-                            # Case 2: Lobby not full (Host initiated start)
-                            else:
-                                # Case 2.1: Enough players → start game
-                                if len(self.participants) > 1:
-                                    return True
-                                # Case 2.2: Not enough players → Game cannot be started
-                                else:
-                                    raise logic.Game.CannotBeStarted(
-                                        logic.Game.CannotBeStarted.Reason.not_enough_players)
-
-                    if game_can_be_started(host_decision):
-                        self._game_state = logic.Game.State.started
-                        self._current_turn = 0
-
-                        # if self.rules.shuffle_turn_order_on_start:
-                        #    random.shuffle(self.participants)
-                        # replaced by:
-                        # self.rules.apply(game=self)
-
-                        self.initial_players = self.participants[:]
-            else:
-                requests_logger.debug(f'A foreign connection has tried to start {self.name_space}')
-            quit()
-            ############################################################################
+    def game_changed(self, game):
+        """Tells the connections about a change of the game and lets the next bot move, if the game goes on."""
+        self.emit("game_state", game.json())
+        if game.game_state == logic.Game.State.started:
+            self.play_bot_turn()
+        else:
+            RequestHandler.bot_moves.cancel(self.lobby_slug)
 
-            if json:
-                try:
-                    jsonschema.validate(instance=json, schema=schema.create_game_schema)
-                    game_name = json.get("game_name")
-
-                    rules = data.Rules(**json.get("rules"))
-                    card_deck = data.CardDeck(**json.get("card_deck"))
-                    host_player_data = json.get("player")
-
-                    host_player = data.Player(
-                        host_player_data["name"],
-                        data.TokenStyle(**host_player_data["token_style"])
-                    )
-
-                    if game_name and rules and card_deck and host_player:
-                        new_game = logic.Game(game_name, host_player, rules, card_deck)
-                        with RequestHandler.game_sockets_lock:
-                            if new_game.slug in RequestHandler.game_sockets:
-                                raise ValueError()
-                            connection = GameSocket(game=new_game)
-                            RequestHandler.game_sockets.update({new_game.slug: connection})
-                        requests_logger.debug(f"POST request to /games successful. "
-                                              f"Created new Game \"{new_game.slug}\"")
-                        return JSON.dumps(new_game.json())
-                    else:
-                        raise ValueError()
-                except jsonschema.exceptions.SchemaError as e:
-                    requests_logger.debug("POST request to /games failed. Data incomplete.")
-                    return exceptions.BadRequest(f"Data incomplete, Key Error: {e.args}")
-                except ValueError as e:
-                    requests_logger.debug("POST request to /games failed. Invalid Data.")
-                    return exceptions.BadRequest(f"Data invalid. {e.args}")
-                except Exception as e:
-                    requests_logger.debug(f"Start game request by {session['connection_id']} to {self.name_space}"
-                                          f"failed with unhandled Error.")
-                    raise e
-            else:
-                return exceptions.BadRequest("You need to provide json data.")
-
-        @RequestHandler.socketio.on("quit_game", namespace=self.name_space)
-        def handle_quit_game(json=None):
-            requests_logger.debug(f"A player has tried to quit the game {self.lobby_name}")
-            player = self.players_by_session.get(session.get("connection_id", None), None)
-            if player:
-                requests_logger.debug(f'Player {player} is trying to quit {self.name_space}')
-            else:
-                requests_logger.debug(f'A foreign connection has tried to quit {self.name_space}')
-
-        @RequestHandler.socketio.on("game_action", namespace=self.name_space)
-        def handle_game_action(json=None):
-            requests_logger.debug(f"A player has tried to make a game action in game {self.lobby_name}")
-            player = self.players_by_session.get(session.get("connection_id", None), None)
-            if player:
-                requests_logger.debug(f'Player {player} is trying to commit a game action on {self.name_space}')
-                if json:
-                    if jsonschema.validate(json, schema.game_action_schema):
-                        pass
-                    else:
-                        return jsonify({"Error": {
-                            "type": "schema_error",
-                            "message": "The json data provided does not match the required schema.",
-                        }})
-                else:
-                    return jsonify({"Error": {
-                        "type": "data_missing",
-                        "message": "You need to provide json data.",
-                    }})
-            else:
-                requests_logger.debug(f'A foreign connection has tried to commit a game action on {self.name_space}')
-                return jsonify({"Error": {
-                    "type": "insufficient_authorization",
-                    "message": "you are not a player an hence not allowed to commit a game action.",
+    def join(self, connection_id, json=None):
+        """Lets the connection join the lobby. Returns the json of the error if it can't, otherwise None."""
+        response = self.handle_player_join(connection_id, json)
+        if response is None:
+            self.connections.add(connection_id)
+        return response
+
+    def leave(self, connection_id, json=None):
+        self.connections.discard(connection_id)
+        return self.handle_player_leave(connection_id)
+
+    def handle_event(self, event, connection_id, json=None):
+        """Handles a message sent to the lobby namespace. Raises LobbyRegistry.NotFound if the lobby was removed while
+        waiting for its lock."""
+        with self.lock:
+            if self.removed:
+                raise LobbyRegistry.NotFound(self.lobby_slug)
+            return RequestHandler.lobby_events[event](self, connection_id, json)
+
+    def hint(self):
+        """Returns the json of the best move of the player whose turn it is, or None if there is no game running."""
+        with self.lock:
+            game = self.current_game
+            if not game:
+                return None
+            try:
+                position = solver.Position.from_game(game)
+            except solver.Position.Unsupported:
+                position = None
+        # solving may take a while, other requests to the lobby shouldn't wait for it
+        result = solver.best_move_in(position, RequestHandler.position_table) if position else None
+        if result is None:
+            return {"hint": None}
+        location, score = result
+        return {"hint": {"location": location, "score": score}}
+
+    def emit(self, event, message):
+        """Sends a message to every connection in the lobby with the next frame of the outbox."""
+        RequestHandler.outbox.put(self.lobby_slug, event, message)
+
+    def play_bot_turn(self):
+        """Lets the bot whose turn it is compute its move in the background, if it is a bot's turn."""
+        game = self.current_game
+        if not game or game.game_state != logic.Game.State.started:
+            return
+        bot = game.participants[game.current_turn]
+        if isinstance(bot, bots.Bot):
+            try:
+                RequestHandler.bot_moves.submit(self.lobby_slug, game, bot, self.place_bot_token)
+            except BotMoveExecutor.Saturated:
+                games_logger.warning(f"Bot {bot.name} in {self.lobby_slug} can't move, all bot workers are busy.")
+                self.emit("error", {"Error": {
+                    "type": "bots_busy",
+                    "message": "The server is too busy to compute the move of the bot.",
                 }})
 
+    def place_bot_token(self, game, bot, location):
+        with self.lock:
+            self._place_bot_token(game, bot, location)
+
+    def _place_bot_token(self, game, bot, location):
+        if game is not self.current_game:
+            return
+        try:
+            game.place_token(bot, *location)
+        except logic.Game.IllegalAction:
+            games_logger.debug(f"Bot {bot.name} in {self.lobby_slug} tried to place an illegal token at {location}.")
+            return
+        self.game_changed(game)
+
+    def touch(self):
+        """Marks the lobby as changed and tells its connections. Changes of its game are tracked by the game."""
+        self._version += 1
+        RequestHandler.lobby_index.update(self)
+        RequestHandler.touch_lobbies()
+        self.emit("lobby_state", {**self.json(), "players": [
+            {"name": player.name, "color": player.token_style.color, "is_ready": player.is_ready}
+            for player in self.players_by_session.values()
+        ]})
+
+    def snapshot(self):
+        """Returns the json of the lobby and its current game encoded as bytes along with an ETag of it. The json of the
+        game is the one of its own snapshot, so the game is only encoded again once it changes, and the snapshot is kept
+        until the lobby or its game change."""
+        game = self.current_game
+        game_etag, game_encoded = game.snapshot() if game else ('', b'null')
+        version = self._version, game_etag
+        if self._snapshot is None or self._snapshot[0] != version:
+            encoded = JSON.dumps(self.json()).encode()
+            etag = hashlib.sha1(encoded + game_etag.encode()).hexdigest()
+            self._snapshot = version, etag, encoded[:-1] + b', "game": ' + game_encoded + b'}'
+        return self._snapshot[1:]
+
+    def state(self):
+        """Returns everything about the lobby as plain data, to hand it over to another worker, see `from_state`."""
+        game = self.current_game
+        return {
+            **self.json(),
+            "players": [[connection_id, Lobby.player_state(player)]
+                        for connection_id, player in self.players_by_session.items()],
+            "connections": list(self.connections),
+            "next_rules": self.next_rules.json(),
+            "next_card_deck": self.next_card_deck.json(),
+            "game": game.state() if game else None,
+            # players of the game might have left the lobby
+            "game_players": [Lobby.player_state(player) for player in game.participants] if game else [],
+        }
+
+    @staticmethod
+    def from_state(state):
+        """Creates a lobby from the `state` of a lobby."""
+        lobby = Lobby(state["lobby_name"], state["lobby_slug"], state["allow_rule_voting"], state["list_publicly"],
+                      state["max_number_of_players"])
+        lobby.creation_time = datetime.datetime.fromtimestamp(state["creation_time"])
+        lobby.next_rules = data.Rules(**state["next_rules"])
+        lobby.next_card_deck = data.CardDeck(**state["next_card_deck"])
+        for connection_id, player_state in state["players"]:
+            player = Lobby.player_from_state(player_state)
+            lobby.players_by_session[connection_id] = player
+            lobby.palette.add(player.token_style)
+        lobby.connections.update(state["connections"])
+        if state["game"]:
+            players = {player.name: player for player in map(Lobby.player_from_state, state["game_players"])}
+            players.update((player.name, player) for player in lobby.players_by_session.values())
+            lobby.current_game = logic.Game.from_state(state["game"], players)
+            lobby.games.append(lobby.current_game)
+        return lobby
+
+    @staticmethod
+    def player_state(player):
+        state = {"name": player.name, "color": list(player.token_style.color), "is_ready": player.is_ready}
+        if isinstance(player, bots.Bot):
+            state["strategy"] = next((name for name, strategy in bots.strategies.items()
+                                      if type(player.strategy) is strategy), "alphabeta")
+        return state
+
+    @staticmethod
+    def player_from_state(state):
+        token_style = data.TokenStyle(color=tuple(state["color"]))
+        if "strategy" in state:
+            return bots.Bot(state["name"], token_style, bots.strategies[state["strategy"]]())
+        return data.Player(state["name"], token_style, state["is_ready"])
+
     def json(self):
         return {
             "lobby_name": self.lobby_name,
@@ -310,6 +450,8 @@ class Lobby:
             "allow_rule_voting": self.allow_rule_voting,
             "list_publicly": self.list_publicly,
             "max_number_of_players": self.max_number_of_players,
+            "number_of_players": len(self.players_by_session),
+            "creation_time": self.creation_time.timestamp(),
         }
 
 
@@ -329,28 +471,324 @@ class RequestHandler:
         app.config['SECRET_KEY'] = secret_file.read()
     Session(app)
 
-    socketio = SocketIO(app, manage_sessions=False, ping_timeout=2, ping_interval=1)
-    lobbies = {}
-    lobbies_lock = Lock()
+    # messages are encoded like the responses of the app, which handles the dataclasses of the games
+    socketio = SocketIO(app, manage_sessions=False, ping_timeout=2, ping_interval=1, json=JSON)
+    # all lobbies share this namespace, each has a room named after its slug
+    LOBBY_NAMESPACE = '/lobby'
+    lobbies = LobbyRegistry()
+    # slug of the lobby of each connection, by connection id
+    lobby_by_connection = {}
+    # seconds after which a lobby without players is removed
+    LOBBY_TIMEOUT = 10
+    # seconds between two lines of the stats log
+    STATS_INTERVAL = 10
+    # lobbies without players, expiring after the timeout unless someone joins
+    lobby_expiry = TimerWheel(tick=1.)
+    # totals since the start of the server, see `count`
+    counters = Counter()
+    counters_lock = Lock()
+    # guards the encoded pages of the listing
+    listing_lock = Lock()
+    # incremented whenever a lobby is created, changed or removed, see `list_games`
+    lobbies_version = 0
+    # encoded pages of the listing by query string, valid as long as the version of the lobbies is the same
+    _listing_snapshots = {}
+    lobby_index = LobbyIndex()
+    # handlers of the events of the lobby namespace, taking the lobby, the connection id and the json of the message
+    lobby_events = {
+        "join_lobby": Lobby.join,
+        "leave_lobby": Lobby.leave,
+        "chat_message": Lobby.handle_chat_message,
+        "vote_rules": Lobby.vote_on_rules,
+        "start_game": Lobby.handle_start_game,
+        "quit_game": Lobby.handle_quit_game,
+        "game_action": Lobby.handle_game_action,
+    }
+    # what is done with lobbies, run by the worker owning the lobby, see `on_lobby`
+    lobby_operations = {
+        "event": Lobby.handle_event,
+        "snapshot": Lobby.snapshot,
+        "hint": Lobby.hint,
+    }
+    # seconds between two frames of messages to the lobbies
+    OUTBOX_TICK = .033
+    # sends the messages to the rooms of the lobbies to the connections of this worker, see `use_sender`
+    sender = QueuedSender(socketio, LOBBY_NAMESPACE)
+    # messages to the lobbies, sent through all workers of the cluster
+    outbox = Outbox(send=lambda room, frame: RequestHandler.cluster.broadcast(room, "frame", frame), tick=OUTBOX_TICK,
+                    snapshots=("game_state", "lobby_state"))
+    # the worker on its own is a cluster of a single node, until it joins a cluster, see `join_cluster`
+    cluster = ClusterNode('local', LoopbackBus(), lobbies=lobbies, operations=lobby_operations,
+                          on_adopt=lambda lobby: RequestHandler.adopt_lobby(lobby),
+                          on_release=lambda lobby: RequestHandler.release_lobby(lobby),
+                          on_broadcast=lambda room, event, message: RequestHandler.emit_to_room(room, event, message),
+                          dump_lobby=Lobby.state, load_lobby=Lobby.from_state)
+    cluster.start()
+    # solved positions, mapped read only so every server process shares its pages
+    try:
+        position_table = solver.open_table(CONFIG_DIR / pathlib.Path('positions.bin'))
+    except (OSError, solver.PositionTable.InvalidFile) as error:
+        games_logger.error(f"Can't open the table of solved positions, hints are only given for endgames: {error!r}")
+        position_table = None
+    # bot moves are computed outside of the handlers, so searches don't stall the heartbeats of other connections.
+    # Bots place their tokens from the worker threads, holding the lock of their lobby, and the messages about it go out
+    # with the next frame of the outbox. Background tasks of the server can't be started from these threads.
+    bot_moves = BotMoveExecutor(fallback=bots.AlphaBetaStrategy(time_budget=.01, max_depth=1))
+
+    @staticmethod
+    def connection_id():
+        if session.get("connection_id", None) is None:
+            session["connection_id"] = b64encode(os.urandom(2 ** 5)).decode()
+        return session["connection_id"]
 
     @staticmethod
     @socketio.on("connect")
     def handle_connect():
-        if session.get("connection_id", None) is None:
-            session["connection_id"] = b64encode(os.urandom(2 ** 5))
-        requests_logger.debug(f"{session['connection_id']} connected. The sid is: {request.sid}, request: {request}")
+        requests_logger.debug(f"{RequestHandler.connection_id()} connected. The sid is: {request.sid}, "
+                              f"request: {request}")
 
     @staticmethod
     @socketio.on("disconnect")
     def handle_disconnect():
         requests_logger.debug(f"{session.get('connection_id', 0)} has been disconnected.")
 
+    @staticmethod
+    def use_sender(sender):
+        """Makes the sender send the messages to the rooms of the lobbies, e.g. the one of a server of another async
+        mode, see `room_senders.py`. Has to be called before serving requests."""
+        RequestHandler.sender = sender
+
+    @staticmethod
+    def emit_to_room(room, event, message):
+        """Sends a message to the connections of this worker in the room. Called from any thread."""
+        RequestHandler.sender.emit(room, event, message)
+
+    @staticmethod
+    def send_messages(sleep=sleep):
+        """Sends the frames of the outbox and the messages queued by the sender every tick. Waits by `sleep`, which
+        should be the sleep of the async framework the server runs on."""
+        while True:
+            sleep(RequestHandler.outbox.tick)
+            RequestHandler.outbox.flush()
+            RequestHandler.sender.flush()
+
+    @staticmethod
+    def close_room(room):
+        RequestHandler.sender.close_room(room)
+
+    @staticmethod
+    def join_cluster(node_id, bus):
+        """Makes this worker a node of the cluster on the bus, owning the lobbies the hash ring of the cluster assigns
+        to it. Has to be called before serving requests."""
+        node = RequestHandler.cluster
+        node.stop()
+        RequestHandler.cluster = ClusterNode(node_id, bus, lobbies=RequestHandler.lobbies,
+                                             operations=RequestHandler.lobby_operations, on_adopt=node.on_adopt,
+                                             on_release=node.on_release, on_broadcast=node.on_broadcast,
+                                             dump_lobby=node.dump_lobby, load_lobby=node.load_lobby)
+        RequestHandler.cluster.start()
+
+    @staticmethod
+    def on_lobby(lobby_slug, operation, *args):
+        """Runs the operation on the lobby, on the worker owning it. Raises LobbyRegistry.NotFound if there is no such
+        lobby and ClusterNode.Unavailable if its worker doesn't answer."""
+        if not isinstance(lobby_slug, str):
+            raise LobbyRegistry.NotFound(lobby_slug)
+        return RequestHandler.cluster.call(lobby_slug, operation, *args)
+
+    @staticmethod
+    def lobby_error(error):
+        if isinstance(error, ClusterNode.Unavailable):
+            return JSON.dumps({"Error": {
+                "type": "lobby_unavailable",
+                "message": "The server hosting the lobby doesn't respond.",
+            }})
+        return JSON.dumps({"Error": {
+            "type": "lobby_not_found",
+            "message": "There is no lobby with the given slug.",
+        }})
+
+    @staticmethod
+    def dispatch(event, json):
+        """Passes a message sent to the lobby namespace to the lobby given by its `lobby_slug`."""
+        lobby_slug = json.get("lobby_slug") if isinstance(json, dict) else None
+        try:
+            return RequestHandler.on_lobby(lobby_slug, "event", event, RequestHandler.connection_id(), json)
+        except (LobbyRegistry.NotFound, ClusterNode.Unavailable) as e:
+            return RequestHandler.lobby_error(e)
+
+    @staticmethod
+    @socketio.on("join_lobby", namespace=LOBBY_NAMESPACE)
+    def handle_join_lobby(json=None):
+        connection_id = RequestHandler.connection_id()
+        # a connection is in one lobby at a time
+        RequestHandler.leave_lobby(connection_id)
+        lobby_slug = json.get("lobby_slug") if isinstance(json, dict) else None
+        try:
+            response = RequestHandler.on_lobby(lobby_slug, "event", "join_lobby", connection_id, json)
+        except (LobbyRegistry.NotFound, ClusterNode.Unavailable) as e:
+            return RequestHandler.lobby_error(e)
+        if response is not None:
+            # the join failed
+            return response
+        join_room(lobby_slug)
+        RequestHandler.lobby_by_connection[connection_id] = lobby_slug
+
+    @staticmethod
+    def leave_lobby(connection_id):
+        """Removes the connection from its lobby, if it is in one."""
+        lobby_slug = RequestHandler.lobby_by_connection.pop(connection_id, None)
+        if lobby_slug is None:
+            return
+        try:
+            RequestHandler.on_lobby(lobby_slug, "event", "leave_lobby", connection_id, None)
+        except (LobbyRegistry.NotFound, ClusterNode.Unavailable):
+            pass
+        leave_room(lobby_slug)
+
+    @staticmethod
+    @socketio.on("leave_lobby", namespace=LOBBY_NAMESPACE)
+    def handle_leave_lobby(json=None):
+        RequestHandler.leave_lobby(RequestHandler.connection_id())
+
+    @staticmethod
+    @socketio.on("disconnect", namespace=LOBBY_NAMESPACE)
+    def handle_lobby_disconnect():
+        RequestHandler.leave_lobby(RequestHandler.connection_id())
+
+    @staticmethod
+    @socketio.on("chat_message", namespace=LOBBY_NAMESPACE)
+    def handle_chat_message(json=None):
+        return RequestHandler.dispatch("chat_message", json)
+
+    @staticmethod
+    @socketio.on("vote_rules", namespace=LOBBY_NAMESPACE)
+    def handle_vote_rules(json=None):
+        return RequestHandler.dispatch("vote_rules", json)
+
+    @staticmethod
+    @socketio.on("start_game", namespace=LOBBY_NAMESPACE)
+    def handle_start_game(json=None):
+        return RequestHandler.dispatch("start_game", json)
+
+    @staticmethod
+    @socketio.on("quit_game", namespace=LOBBY_NAMESPACE)
+    def handle_quit_game(json=None):
+        return RequestHandler.dispatch("quit_game", json)
+
+    @staticmethod
+    @socketio.on("game_action", namespace=LOBBY_NAMESPACE)
+    def handle_game_action(json=None):
+        return RequestHandler.dispatch("game_action", json)
+
+    @staticmethod
+    def adopt_lobby(lobby):
+        """Takes care of a lobby that was created on or handed over to this worker."""
+        with lobby.lock:
+            lobby.removed = False
+            RequestHandler.lobby_index.update(lobby)
+            RequestHandler.touch_lobbies()
+            if not lobby.players_by_session:
+                # removed unless someone joins in time
+                RequestHandler.lobby_expiry.schedule(lobby.lobby_slug, RequestHandler.LOBBY_TIMEOUT)
+            lobby.play_bot_turn()
+
+    @staticmethod
+    def release_lobby(lobby):
+        """Stops taking care of a lobby that was removed or handed over to another worker."""
+        with lobby.lock:
+            lobby.removed = True
+            RequestHandler.lobby_index.remove(lobby.lobby_slug)
+            RequestHandler.lobby_expiry.cancel(lobby.lobby_slug)
+            RequestHandler.touch_lobbies()
+            RequestHandler.bot_moves.cancel(lobby.lobby_slug)
+
+    @staticmethod
+    def remove_lobby(lobby_slug):
+        """Removes the lobby along with its room, its pending bot moves and the connections in it."""
+        lobby = RequestHandler.lobbies.pop(lobby_slug)
+        RequestHandler.release_lobby(lobby)
+        RequestHandler.outbox.discard(lobby_slug)
+        RequestHandler.close_room(lobby_slug)
+        for connection_id in lobby.connections:
+            RequestHandler.lobby_by_connection.pop(connection_id, None)
+        lobby.connections.clear()
+
+    @staticmethod
+    def count(name, number=1):
+        with RequestHandler.counters_lock:
+            RequestHandler.counters[name] += number
+
+    @staticmethod
+    def touch_lobbies():
+        with RequestHandler.counters_lock:
+            RequestHandler.lobbies_version += 1
+
+    @staticmethod
+    def snapshot_response(etag, encoded):
+        """Answers with the encoded json, or with 304 Not Modified if the client has it already."""
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(encoded, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+
+    @staticmethod
+    def listing_filters(args):
+        """Returns the arguments of `LobbyIndex.page` given by the query parameters of a listing. Raises ValueError if
+        any of them is invalid."""
+        def optional(name, convert):
+            return convert(args[name]) if name in args else None
+
+        def boolean(value):
+            if value not in ("true", "false"):
+                raise ValueError(value)
+            return value == "true"
+
+        limit = int(args.get("limit", 20))
+        if not 0 < limit <= 100:
+            raise ValueError(limit)
+        return {
+            "limit": limit,
+            "cursor": args.get("cursor"),
+            "min_free_seats": optional("free_seats", int),
+            "width": optional("width", int),
+            "height": optional("height", int),
+            "cards_enabled": optional("cards", boolean),
+            "created_after": optional("created_after", float),
+            "created_before": optional("created_before", float),
+        }
+
     @staticmethod
     @app.route('/games', methods=["GET"])
     def list_games():
+        """Lists the public lobbies, newest first, a page at a time. The query parameters are `limit`, the `cursor`
+        returned with the previous page, and the filters `free_seats`, `width`, `height`, `cards` (true or false),
+        `created_after` and `created_before` (timestamps)."""
         requests_logger.debug("GET request to /games. Serving list of games…")
-        response = jsonify(list(RequestHandler.lobbies.values()))
-        return response
+        try:
+            return RequestHandler.snapshot_response(*RequestHandler.listing(request.query_string, request.args))
+        except ValueError as e:
+            return exceptions.BadRequest(f"Invalid query parameter. {e.args}")
+
+    @staticmethod
+    def listing(query_string, args):
+        """Returns the ETag and the encoded json of a page of the listing. Raises ValueError if any query parameter is
+        invalid."""
+        with RequestHandler.listing_lock:
+            snapshot = RequestHandler._listing_snapshots.get(query_string)
+            if snapshot is None or snapshot[0] != RequestHandler.lobbies_version:
+                lobbies, next_cursor = RequestHandler.lobby_index.page(**RequestHandler.listing_filters(args))
+                encoded = JSON.dumps({
+                    "lobbies": [lobby.json() for lobby in lobbies],
+                    "next_cursor": next_cursor,
+                }).encode()
+                snapshot = RequestHandler.lobbies_version, hashlib.sha1(encoded).hexdigest(), encoded
+                if len(RequestHandler._listing_snapshots) >= 1024:
+                    RequestHandler._listing_snapshots.clear()
+                RequestHandler._listing_snapshots[query_string] = snapshot
+        return snapshot[1:]
 
     @staticmethod
     @app.route('/games/<slug>', methods=["GET"])
@@ -359,64 +797,89 @@ class RequestHandler:
         requests_logger.debug(f"GET request to /games/{{{slug}}}. Sending game info…")
         if slug:
             try:
-                game = RequestHandler.lobbies.get(slug)
-                response = jsonify(game)
-            except KeyError:
+                response = RequestHandler.snapshot_response(*RequestHandler.on_lobby(slug, "snapshot"))
+            except LobbyRegistry.NotFound:
                 response = exceptions.NotFound(f"Game with slug {slug} not found.")
+            except ClusterNode.Unavailable:
+                response = exceptions.ServiceUnavailable(f"Game with slug {slug} is unavailable.")
         else:
             response = exceptions.BadRequest("Need to specify game slug")
         return response
 
     @staticmethod
-    def manage_lobbies():
+    @app.route('/stats', methods=["GET"])
+    def stats():
+        return jsonify(RequestHandler.stats_json())
+
+    @staticmethod
+    def stats_json():
+        return {
+            "lobbies": len(RequestHandler.lobbies),
+            "cluster_nodes": len(RequestHandler.cluster.ring),
+            "bot_queue_depth": RequestHandler.bot_moves.queue_depth,
+            "bot_moves_rejected": RequestHandler.bot_moves.rejected,
+            "lobbies_expiring": len(RequestHandler.lobby_expiry),
+            "messages_queued": RequestHandler.outbox.messages,
+            "messages_superseded": RequestHandler.outbox.superseded,
+            "frames_sent": RequestHandler.outbox.frames,
+            **RequestHandler.counters,
+        }
+
+    @staticmethod
+    @app.route('/lobbies/<slug>/hint', methods=["GET"])
+    def hint(slug=None):
+        slug = slugify(slug)
+        requests_logger.debug(f"GET request to /lobbies/{{{slug}}}/hint. Sending hint…")
+        try:
+            hint = RequestHandler.on_lobby(slug, "hint")
+        except LobbyRegistry.NotFound:
+            hint = None
+        except ClusterNode.Unavailable:
+            return exceptions.ServiceUnavailable(f"Lobby with slug {slug} is unavailable.")
+        if hint is None:
+            return exceptions.NotFound(f"No game running in lobby with slug {slug}.")
+        return jsonify(hint)
+
+    @staticmethod
+    def manage_lobbies(sleep=sleep):
+        """Removes the lobbies whose expiry timer ran out, i.e. which had no players for the timeout, and logs the
+        totals of the server now and then. Waits by `sleep`, which should be the sleep of the async framework the
+        server runs on."""
+        last_stats = monotonic()
         while True:
-            with RequestHandler.lobbies_lock:
-                players_sum = 0
-                for game_slug, sock in list(RequestHandler.lobbies.items()):
-                    seconds_since_start = (datetime.datetime.now() - sock.creation_time).seconds
-                    num_players = len(sock.players_by_session)
-                    players_sum += num_players
-                    if not num_players and seconds_since_start > 10:
-                        # no players are connected to the game
-                        del RequestHandler.lobbies[game_slug]
-                        games_logger.debug(
-                            f"Deleted: Game {game_slug} has no players connected to it,"
-                            f" so it got deleted. Was active for {seconds_since_start}s.")
+            sleep(RequestHandler.lobby_expiry.tick)
+            RequestHandler.expire_lobbies()
+            if monotonic() - last_stats >= RequestHandler.STATS_INTERVAL:
+                last_stats = monotonic()
+                RequestHandler.log_stats()
 
-                    else:
-                        games_logger.debug(
-                            f"Active: Game {game_slug} has {len(sock.players_by_session)} "
-                            f"players in it, {seconds_since_start}s since start.")
-                stats_logger.info(f"{len(RequestHandler.lobbies)} active games with {players_sum} active players.")
-            sleep(10)
+    @staticmethod
+    def expire_lobbies():
+        for lobby_slug in RequestHandler.lobby_expiry.advance():
+            lobby = RequestHandler.lobbies.get(lobby_slug)
+            if lobby:
+                with lobby.lock:
+                    # someone might have joined after the timer ran out
+                    if not lobby.removed and not lobby.players_by_session:
+                        RequestHandler.remove_lobby(lobby_slug)
+                        RequestHandler.count("lobbies_expired")
+
+    @staticmethod
+    def log_stats():
+        counters = RequestHandler.counters
+        stats_logger.info(f"{len(RequestHandler.lobbies)} active lobbies, "
+                          f"{len(RequestHandler.lobby_expiry)} without players, "
+                          f"{counters['lobbies_created']} created and {counters['lobbies_expired']} expired, "
+                          f"{counters['players_joined']} players joined and {counters['players_left']} left, "
+                          f"{RequestHandler.bot_moves.queue_depth} bot moves queued, "
+                          f"{RequestHandler.bot_moves.rejected} rejected.")
 
     @staticmethod
     @app.route('/lobbies', methods=["POST"])
     def create_lobby():
         request_data = request.json
         try:
-            jsonschema.validate(instance=request_data, schema=schema.create_lobby_schema)
-            lobby_name = request_data.get("lobby_name")
-            lobby_slug = "lobby-" + slugify(request_data.get("lobby_name"))
-            allow_rule_voting = request_data.get("allow_rule_voting")
-            list_publicly = request_data.get("list_publicly")
-            max_number_of_players = request_data.get("max_number_of_players")
-
-            if all(x is not None for x in
-                   [lobby_name, lobby_slug, allow_rule_voting, list_publicly, max_number_of_players]):
-                with RequestHandler.lobbies_lock:
-                    if lobby_slug in RequestHandler.lobbies:
-                        raise ValueError("Game slug has been used already")
-                    lobby = Lobby(lobby_name, lobby_slug, allow_rule_voting, list_publicly, max_number_of_players)
-                    RequestHandler.lobbies.update({lobby_slug: lobby})
-                requests_logger.debug(f"POST request to /games successful. "
-                                      f"Created new Game \"{lobby_slug}\"")
-                return jsonify(lobby.json())
-            else:
-                raise ValueError()
-        except jsonschema.exceptions.SchemaError as e:
-            requests_logger.debug("POST request to /games failed. Data incomplete.")
-            return exceptions.BadRequest(f"Data incomplete, Key Error: {e.args}")
+            return jsonify(RequestHandler.add_lobby(request_data).json())
         except ValueError as e:
             requests_logger.debug("POST request to /games failed. Invalid Data.")
             return exceptions.BadRequest(f"Data invalid. {e.args}")
@@ -424,6 +887,52 @@ class RequestHandler:
             requests_logger.debug("POST request to /games failed with unhandled Error.")
             raise e
 
+    @staticmethod
+    def add_lobby(request_data):
+        """Creates the lobby described by the json of a request. Raises ValueError if the data is invalid or the slug
+        is taken."""
+        errors = validators["create_lobby"](request_data)
+        if errors:
+            raise ValueError(errors)
+        lobby_name = request_data.get("lobby_name")
+        lobby_slug = "lobby-" + slugify(request_data.get("lobby_name"))
+        allow_rule_voting = request_data.get("allow_rule_voting")
+        list_publicly = request_data.get("list_publicly")
+        max_number_of_players = request_data.get("max_number_of_players")
+
+        if all(x is not None for x in
+               [lobby_name, lobby_slug, allow_rule_voting, list_publicly, max_number_of_players]):
+            lobby = Lobby(lobby_name, lobby_slug, allow_rule_voting, list_publicly, max_number_of_players)
+            try:
+                # added on the worker owning it
+                RequestHandler.cluster.add(lobby)
+            except LobbyRegistry.SlugTaken:
+                raise ValueError("Game slug has been used already")
+            RequestHandler.count("lobbies_created")
+            requests_logger.debug(f"POST request to /games successful. "
+                                  f"Created new Game \"{lobby_slug}\"")
+            return lobby
+        else:
+            raise ValueError()
+
+    @staticmethod
+    def configure():
+        """Applies the settings of the config file shared by both server modes, and returns all of them. Workers
+        sharing their lobbies are given a `cluster` of the `node_id` of the worker and the `redis_url` of the Redis
+        server connecting them."""
+        conf = {}
+        config_file_path = RequestHandler.CONFIG_DIR / pathlib.Path("fiaro.conf")
+        if os.path.exists(config_file_path):
+            with open(config_file_path) as config_file:
+                conf = literal_eval(config_file.read())
+        if 'outbox_tick' in conf:
+            RequestHandler.outbox.tick = conf["outbox_tick"]
+        if 'cluster' in conf:
+            cluster = conf["cluster"]
+            bus = RedisBus(cluster.get("redis_url", "redis://localhost:6379/0"), json=JSON)
+            RequestHandler.join_cluster(cluster["node_id"], bus)
+        return conf
+
     @staticmethod
     @app.route('/test')
     def test_root():
@@ -433,22 +942,16 @@ class RequestHandler:
     @staticmethod
     @app.route('/testgame')
     def test_game():
-        """Test socketio connections to the lobby-my-test-lobby namespace."""
+        """Test socketio connections to the lobby-my-test-lobby lobby."""
         return open("../tests/test.html").read()
 
 
 if __name__ == '__main__':
-    game_manager = Thread(target=RequestHandler.manage_lobbies)
-    # game_manager.start()
-    CONFIG_FILE_PATH = RequestHandler.CONFIG_DIR / pathlib.Path("fiaro.conf")
-    host = None
-    if os.path.exists(CONFIG_FILE_PATH):
-        with open(CONFIG_FILE_PATH) as config_file:
-            conf = literal_eval(config_file.read())
-            if 'host' in conf:
-                host = conf["host"]
-
-    if host:
+    conf = RequestHandler.configure()
+    RequestHandler.socketio.start_background_task(RequestHandler.manage_lobbies, RequestHandler.socketio.sleep)
+    RequestHandler.socketio.start_background_task(RequestHandler.send_messages, RequestHandler.socketio.sleep)
+
+    if 'host' in conf:
         RequestHandler.socketio.run(RequestHandler.app, host=conf["host"])
     else:
         RequestHandler.socketio.run(RequestHandler.app)
@@ -0,0 +1,70 @@
+"""Hashed timing wheel for timeouts that are scheduled and cancelled far more often than they expire, like the expiry
+of lobbies without players."""
+import math
+from threading import Lock
+import time
+
+
+class TimerWheel:
+    """Timers by key, each expiring at a tick of `tick` seconds. The wheel has a slot per tick, wrapping around after
+    `slots` ticks, and a timer is kept in the slot of the tick it expires at. Scheduling and cancelling a timer cost
+    O(1), and advancing the wheel looks at the timers of the slots of the ticks that passed only, which include the
+    timers expiring a multiple of `slots` ticks later.
+
+    The wheel doesn't run anything by itself, `advance` has to be called regularly and returns the keys of the timers
+    that expired."""
+
+    def __init__(self, tick=1., slots=64, clock=time.monotonic):
+        self.tick = tick
+        self._clock = clock
+        self._slots = [{} for _ in range(slots)]
+        # slot of each timer by key
+        self._timers = {}
+        self._lock = Lock()
+        self._current_tick = self._tick_at(clock())
+
+    def _tick_at(self, seconds):
+        return math.floor(seconds / self.tick)
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, delay):
+        """Lets the timer of the key expire after `delay` seconds, replacing its previous timer."""
+        with self._lock:
+            self._cancel(key)
+            # rounded up, so timers never expire early
+            expiry_tick = max(math.ceil((self._clock() + delay) / self.tick), self._current_tick + 1)
+            slot = expiry_tick % len(self._slots)
+            self._slots[slot][key] = expiry_tick
+            self._timers[key] = slot
+
+    def cancel(self, key):
+        """Removes the timer of the key. Returns whether there was one."""
+        with self._lock:
+            return self._cancel(key)
+
+    def _cancel(self, key):
+        slot = self._timers.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self):
+        """Moves the wheel to the current time and returns the keys of the timers that expired since the last call."""
+        with self._lock:
+            target = self._tick_at(self._clock())
+            expired = []
+            # every tick that passed maps to one of the last `slots` ticks
+            for tick in range(max(self._current_tick + 1, target - len(self._slots) + 1), target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                for key in [key for key, expiry_tick in slot.items() if expiry_tick <= target]:
+                    del slot[key]
+                    del self._timers[key]
+                    expired.append(key)
+            self._current_tick = max(self._current_tick, target)
+            return expired
@@ -0,0 +1,176 @@
+"""Validation of the json of requests. The schemas in `request_schema.py` are compiled once into functions doing
+exactly the checks their schema describes, instead of interpreting the schema on every message like
+`jsonschema.validate`. Keywords the compiler doesn't know are left to jsonschema."""
+import jsonschema
+from four_in_a_row_online.backend import request_schema
+
+# json types by name, bools are ints in python but neither integers nor numbers in json
+TYPES = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool) or
+    isinstance(value, float) and value.is_integer(),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+KEYWORDS = {"type", "enum", "properties", "required", "additionalProperties", "items", "minItems", "maxItems",
+            "minimum", "maximum", "minLength", "maxLength"}
+# keywords that don't constrain instances
+ANNOTATIONS = {"$schema", "$id", "title", "description", "default", "examples"}
+
+
+def compile_schema(schema):
+    """Returns a function taking an instance and returning the list of its errors, which is empty if the instance
+    matches the schema. Each error is a dict of the `path` to the invalid value, a list of keys and indices, and a
+    `message`."""
+    check = _compile(schema)
+
+    def validate(instance):
+        errors = []
+        check(instance, (), errors)
+        for error in errors:
+            error["path"] = list(error["path"])
+        return errors
+    return validate
+
+
+def _error(path, message):
+    return {"path": path, "message": message}
+
+
+def _equal(a, b):
+    # unlike in python, true is not 1 in json
+    return a == b and isinstance(a, bool) == isinstance(b, bool)
+
+
+def _compile(schema):
+    """Returns a function taking an instance, its path and the list to add its errors to."""
+    checks = []
+
+    if "type" in schema:
+        names = [schema["type"]] if isinstance(schema["type"], str) else list(schema["type"])
+        type_checks = [TYPES[name] for name in names]
+        expected = ", ".join(repr(name) for name in names)
+
+        def check_type(instance, path, errors):
+            if not any(type_check(instance) for type_check in type_checks):
+                errors.append(_error(path, f"{instance!r} is not of type {expected}"))
+        checks.append(check_type)
+
+    if "enum" in schema:
+        enum = list(schema["enum"])
+        # membership in a set is exact for strings
+        strings = set(enum) if all(isinstance(value, str) for value in enum) else None
+
+        def check_enum(instance, path, errors):
+            if strings is not None:
+                if isinstance(instance, str) and instance in strings:
+                    return
+            elif any(_equal(instance, value) for value in enum):
+                return
+            errors.append(_error(path, f"{instance!r} is not one of {enum!r}"))
+        checks.append(check_enum)
+
+    if "properties" in schema or "required" in schema or "additionalProperties" in schema:
+        properties = [(name, _compile(subschema)) for name, subschema in schema.get("properties", {}).items()]
+        known = set(schema.get("properties", {}))
+        required = list(schema.get("required", ()))
+        additional = schema.get("additionalProperties", True)
+        check_additional = _compile(additional) if isinstance(additional, dict) else None
+
+        def check_object(instance, path, errors):
+            if not isinstance(instance, dict):
+                return
+            for name in required:
+                if name not in instance:
+                    errors.append(_error(path, f"{name!r} is a required property"))
+            for name, check in properties:
+                if name in instance:
+                    check(instance[name], path + (name,), errors)
+            if additional is not True:
+                for name in instance.keys() - known:
+                    if check_additional is not None:
+                        check_additional(instance[name], path + (name,), errors)
+                    else:
+                        errors.append(_error(path, f"Additional properties are not allowed ({name!r} was unexpected)"))
+        checks.append(check_object)
+
+    if "items" in schema or "minItems" in schema or "maxItems" in schema:
+        check_item = _compile(schema["items"]) if "items" in schema else None
+        min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+
+        def check_array(instance, path, errors):
+            if not isinstance(instance, list):
+                return
+            if min_items is not None and len(instance) < min_items:
+                errors.append(_error(path, f"{instance!r} should have at least {min_items} items"))
+            if max_items is not None and len(instance) > max_items:
+                errors.append(_error(path, f"{instance!r} should have at most {max_items} items"))
+            if check_item is not None:
+                for index, item in enumerate(instance):
+                    check_item(item, path + (index,), errors)
+        checks.append(check_array)
+
+    if "minimum" in schema or "maximum" in schema:
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+
+        def check_range(instance, path, errors):
+            if not TYPES["number"](instance):
+                return
+            if minimum is not None and instance < minimum:
+                errors.append(_error(path, f"{instance!r} is less than the minimum of {minimum!r}"))
+            if maximum is not None and instance > maximum:
+                errors.append(_error(path, f"{instance!r} is greater than the maximum of {maximum!r}"))
+        checks.append(check_range)
+
+    if "minLength" in schema or "maxLength" in schema:
+        min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+
+        def check_length(instance, path, errors):
+            if not isinstance(instance, str):
+                return
+            if min_length is not None and len(instance) < min_length:
+                errors.append(_error(path, f"{instance!r} is too short"))
+            if max_length is not None and len(instance) > max_length:
+                errors.append(_error(path, f"{instance!r} is too long"))
+        checks.append(check_length)
+
+    unknown = set(schema) - KEYWORDS - ANNOTATIONS
+    if unknown:
+        rest = {keyword: schema[keyword] for keyword in unknown}
+        fallback = jsonschema.validators.validator_for(rest)(rest)
+
+        def check_rest(instance, path, errors):
+            for error in fallback.iter_errors(instance):
+                errors.append(_error(path + tuple(error.absolute_path), error.message))
+        checks.append(check_rest)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(instance, path, errors):
+        for check in checks:
+            check(instance, path, errors)
+    return check_all
+
+
+def error_json(errors):
+    """Returns the json of the error answered to a message that doesn't match its schema."""
+    return {"Error": {
+        "type": "schema_error",
+        "message": "The json data provided does not match the required schema.",
+        "errors": errors,
+    }}
+
+
+# validators of the json of requests, by socketio event or route
+validators = {
+    "join_lobby": compile_schema(request_schema.player_schema),
+    "chat_message": compile_schema(request_schema.chat_message_schema),
+    "vote_rules": compile_schema(request_schema.change_rules_schema),
+    "start_game": compile_schema(request_schema.start_game_schema),
+    "game_action": compile_schema(request_schema.game_action_schema),
+    "create_lobby": compile_schema(request_schema.create_lobby_schema),
+}
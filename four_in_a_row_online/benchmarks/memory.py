@@ -0,0 +1,146 @@
+"""Measures the memory held per game and per lobby with the game data kept in slots and the play field in a flat list,
+and with the layout from before, which kept the data of every object in an instance dictionary and a `Field` object for
+every cell of the play field. A lobby holds the rules and card deck of the next game, its players and its current and
+recently finished games, each with a play field that has been played for a while. Run with
+`python -m four_in_a_row_online.benchmarks.memory`."""
+import argparse
+import gc
+import random
+import tracemalloc
+from four_in_a_row_online.game_logic.data import CardDeck, DataContainer, Player, PlayField, Rules
+from four_in_a_row_online.game_logic.logic import Game
+
+
+class DictContainer:
+    """Data container keeping its data fields in an instance dictionary, like `DataContainer` did before."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class DictField:
+    """Cell of a `GridPlayField`, like `Field` was before."""
+
+    def __init__(self, location):
+        self.occupation = None
+        self.location = location
+
+
+class GridPlayField:
+    """Play field keeping a `Field` object for every cell, like `PlayField` did before."""
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        width, height = self.dimensions
+        self.fields = [[DictField((x, y)) for x in range(width)] for y in range(height)]
+        self.player_colors_pretty_print = {}
+        self._column_heights = [0] * width
+        self._winning_lines = None
+        self._line_tokens = None
+        self._line_counts = None
+        self._line_holders = None
+
+    def legal_columns(self):
+        height = self.dimensions[1]
+        return (x for x, column_height in enumerate(self._column_heights) if column_height < height)
+
+    def drop_token(self, rules, player, column):
+        self.fields[self._column_heights[column]][column].occupation = player
+        self._column_heights[column] += 1
+
+
+def with_dicts(data_container):
+    """Returns a copy of the data container, and of the data containers it holds, keeping their data fields in an
+    instance dictionary."""
+    return DictContainer(**{
+        field: with_dicts(value) if isinstance(value, DataContainer) else value
+        for field, value in data_container._items()
+    })
+
+
+# conversion of the data containers and play field class, by layout
+LAYOUTS = {
+    'before': (with_dicts, GridPlayField),
+    'after': (lambda data_container: data_container, PlayField),
+}
+
+
+def make_players(layout, number_of_players):
+    convert, _ = layout
+    players = []
+    for _ in range(number_of_players):
+        players.append(Player.unique_random(players))
+    return [convert(player) for player in players]
+
+
+def make_game(layout, players, number_of_tokens):
+    convert, play_field_class = layout
+    rules = Rules.default_init()
+    rules.number_of_players = len(players)
+    game = Game(f'game {random.getrandbits(64)}', convert(rules), convert(CardDeck.default_init()), players)
+    play_field = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
+    for turn in range(number_of_tokens):
+        columns = list(play_field.legal_columns())
+        if not columns:
+            break
+        play_field.drop_token(game.rules, players[turn % len(players)], random.choice(columns))
+    game._play_field = play_field
+    return game
+
+
+def make_lobby(layout, number_of_games, number_of_players, number_of_tokens):
+    """Returns the game data held by a lobby, whose games share its players."""
+    convert, _ = layout
+    players = make_players(layout, number_of_players)
+    games = [make_game(layout, players, number_of_tokens) for _ in range(number_of_games)]
+    return convert(Rules.default_init()), convert(CardDeck.default_init()), players, games
+
+
+def bytes_per_object(make, number_of_objects):
+    """Returns the number of bytes allocated per object for the given number of objects kept alive at the same
+    time."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [make() for _ in range(number_of_objects)]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return (after - before) / number_of_objects
+
+
+def bytes_per_game(layout=LAYOUTS['after'], number_of_games=1000, number_of_players=2, number_of_tokens=21):
+    """Returns the number of bytes allocated per game, including its players."""
+    return bytes_per_object(lambda: make_game(layout, make_players(layout, number_of_players), number_of_tokens),
+                            number_of_games)
+
+
+def bytes_per_lobby(layout=LAYOUTS['after'], number_of_lobbies=300, games_per_lobby=3, number_of_players=2,
+                    number_of_tokens=21):
+    return bytes_per_object(lambda: make_lobby(layout, games_per_lobby, number_of_players, number_of_tokens),
+                            number_of_lobbies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lobbies', type=int, default=300, help='number of lobbies kept in memory')
+    parser.add_argument('--games', type=int, default=3, help='number of current and finished games per lobby')
+    parser.add_argument('--players', type=int, default=2, help='number of players per lobby')
+    parser.add_argument('--tokens', type=int, default=21, help='number of tokens placed per game')
+    args = parser.parse_args()
+
+    print(f'{"":<10}{"before":>10}{"after":>10}')
+    results = {}
+    for name, layout in LAYOUTS.items():
+        random.seed(0)
+        results[name] = (
+            bytes_per_game(layout, args.lobbies * args.games, args.players, args.tokens),
+            bytes_per_lobby(layout, args.lobbies, args.games, args.players, args.tokens),
+        )
+    for index, unit in enumerate(['game', 'lobby']):
+        print(f'{"per " + unit:<10}{results["before"][index]:>10.0f}{results["after"][index]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Measures the time per call of the hot paths of the game logic, for several play field sizes and winning row lengths.
+Results can be saved as a baseline, and later runs compared to it to flag regressions. Run with
+`python -m four_in_a_row_online.benchmarks.micro --save baseline.json` and
+`python -m four_in_a_row_online.benchmarks.micro --baseline baseline.json`."""
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from four_in_a_row_online.game_logic.data import CardDeck, Player, PlayField, Rules, TokenStyle
+from four_in_a_row_online.game_logic.logic import Game
+from four_in_a_row_online.tools.tools import flatten
+
+SIZES = [(7, 6), (15, 15), (40, 40)]
+LENGTHS = [3, 4, 6]
+EXISTING_TOKEN_STYLES = [1, 4, 16]
+FLATTEN_LENGTHS = [2, 8, 32]
+
+
+def make_players(number_of_players):
+    players = []
+    for index in range(number_of_players):
+        players.append(Player(f'player {index}', TokenStyle.is_dinguishable_init([p.token_style for p in players])))
+    return players
+
+
+def make_rules(width, height, length):
+    rules = Rules.default_init()
+    rules.play_field_width, rules.play_field_height, rules.winning_row_length = width, height, length
+    rules.enable_gravity = False
+    return rules
+
+
+def fill(play_field, rules, players, skip_top_row=False):
+    """Fills the play field with tokens of four players without any two neighbouring tokens of the same player, so no
+    row is ever completed and all tokens are looked at when checking for rows."""
+    width, height = play_field.dimensions
+    for loc_y in range(height - 1 if skip_top_row else height):
+        for loc_x in range(width):
+            play_field.place_token(rules, players[(loc_x + 2 * loc_y) % 4], loc_x, loc_y)
+
+
+def bench_place_token(width, height, length):
+    rules, players = make_rules(width, height, length), make_players(4)
+
+    def run():
+        fill(PlayField(dimensions=(width, height)), rules, players)
+    return run, width * height
+
+
+def bench_check_for_winning_rows(width, height, length, skip_top_row):
+    rules, players = make_rules(width, height, length), make_players(4)
+    play_field = PlayField(dimensions=(width, height))
+    fill(play_field, rules, players, skip_top_row)
+    return (lambda: play_field._check_for_winning_rows(rules, players[0])), 1
+
+
+def bench_play_field_json(width, height):
+    rules, players = make_rules(width, height, 4), make_players(4)
+    play_field = PlayField(dimensions=(width, height))
+    fill(play_field, rules, players, skip_top_row=True)
+    return play_field.json, 1
+
+
+def bench_game_json(width, height):
+    rules, players = make_rules(width, height, 4), make_players(4)
+    game = Game('benchmark', rules, CardDeck.default_init(), players)
+    game.start_game()
+    fill(game.play_field, rules, players, skip_top_row=True)
+    return game.json, 1
+
+
+def bench_is_dinguishable_init(number_of_existing):
+    existing = [p.token_style for p in make_players(number_of_existing)]
+    return (lambda: TokenStyle.is_dinguishable_init(existing)), 1
+
+
+def bench_flatten(length):
+    arguments = [tuple(range(length))] * 4
+    return (lambda: flatten(*arguments)), 1
+
+
+def benchmarks():
+    """Returns the benchmarks by name, each as a function returning the function to time and the number of calls of
+    the benchmarked function it makes."""
+    cases = {}
+    for width, height in SIZES:
+        size = f'{width}x{height}'
+        for length in LENGTHS:
+            cases[f'place_token[{size},k={length}]'] = lambda w=width, h=height, k=length: bench_place_token(w, h, k)
+            cases[f'check_for_winning_rows_full[{size},k={length}]'] = \
+                lambda w=width, h=height, k=length: bench_check_for_winning_rows(w, h, k, False)
+            cases[f'check_for_winning_rows_near_full[{size},k={length}]'] = \
+                lambda w=width, h=height, k=length: bench_check_for_winning_rows(w, h, k, True)
+        cases[f'play_field_json[{size}]'] = lambda w=width, h=height: bench_play_field_json(w, h)
+        cases[f'game_json[{size}]'] = lambda w=width, h=height: bench_game_json(w, h)
+    cases['rules_random_init'] = lambda: (Rules.random_init, 1)
+    for number in EXISTING_TOKEN_STYLES:
+        cases[f'is_dinguishable_init[existing={number}]'] = lambda n=number: bench_is_dinguishable_init(n)
+    for length in FLATTEN_LENGTHS:
+        cases[f'flatten[length={length}]'] = lambda n=length: bench_flatten(n)
+    return cases
+
+
+def measure(function, calls, repeat=5):
+    """Returns the best time per call of a number of runs, each lasting at least 0.2 seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number / calls
+
+
+def run(selection=None, repeat=5, output=sys.stdout):
+    """Runs the benchmarks whose names contain the selection and returns the seconds per call by name."""
+    random.seed(0)
+    results = {}
+    for name, setup in benchmarks().items():
+        if selection and selection not in name:
+            continue
+        results[name] = measure(*setup(), repeat=repeat)
+        output.write(f'{name:<50} {results[name] * 1e6:12.3f} µs\n')
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Returns the benchmarks that got slower than the baseline by more than the threshold, a fraction of the time
+    of the baseline, along with their old and new times."""
+    return {name: (baseline[name], seconds) for name, seconds in results.items()
+            if name in baseline and seconds > baseline[name] * (1 + threshold)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--select', default=None, help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs per benchmark')
+    parser.add_argument('--save', default=None, help='file to save the results to as a baseline')
+    parser.add_argument('--baseline', default=None, help='baseline file to compare the results to')
+    parser.add_argument('--threshold', type=float, default=.2,
+                        help='slowdown relative to the baseline reported as a regression')
+    args = parser.parse_args()
+
+    results = run(args.select, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      baseline_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        slower = regressions(results, baseline, args.threshold)
+        for name, (before, after) in slower.items():
+            print(f'Regression: {name} took {after * 1e6:.3f} µs instead of {before * 1e6:.3f} µs '
+                  f'({after / before - 1:+.0%})')
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
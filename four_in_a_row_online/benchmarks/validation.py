@@ -0,0 +1,58 @@
+"""Compares the time per message of the compiled validators to validating with `jsonschema.validate`, which
+interprets the schema on every call, and to a jsonschema validator created once, for valid and invalid game actions and
+players. Run with `python -m four_in_a_row_online.benchmarks.validation`."""
+import argparse
+import sys
+import jsonschema
+from four_in_a_row_online.backend import request_schema
+from four_in_a_row_online.backend.validation import validators
+from four_in_a_row_online.benchmarks.micro import measure
+
+MESSAGES = {
+    'game_action': (request_schema.game_action_schema, {
+        'valid': {'action': 'PLACE_TOKEN', 'arguments': [{'x': 3}, {'y': 2}]},
+        'invalid': {'action': 'FLIP_TABLE', 'arguments': [{'x': 3}, 2]},
+    }),
+    'join_lobby': (request_schema.player_schema, {
+        'valid': {'name': 'player', 'token_style': {'color': [255, 128, 0, 255]}},
+        'invalid': {'name': 7, 'token_style': {'color': [255, 128, 0]}},
+    }),
+}
+
+
+def interpreted(schema):
+    def validate(instance):
+        try:
+            jsonschema.validate(instance, schema)
+        except jsonschema.ValidationError:
+            return False
+        return True
+    return validate
+
+
+def run(repeat=5, output=sys.stdout):
+    """Returns the seconds per message of `jsonschema.validate`, a cached jsonschema validator and the compiled
+    validator, by event and message."""
+    results = {}
+    for event, (schema, messages) in MESSAGES.items():
+        cached = jsonschema.validators.validator_for(schema)(schema)
+        for kind, message in messages.items():
+            reference = measure(lambda: interpreted(schema)(message), 1, repeat)
+            reference_cached = measure(lambda: list(cached.iter_errors(message)), 1, repeat)
+            compiled = measure(lambda: validators[event](message), 1, repeat)
+            results[f'{event}[{kind}]'] = reference, reference_cached, compiled
+            output.write(f'{event + "[" + kind + "]":<24} jsonschema {reference * 1e6:10.3f} µs   '
+                         f'cached {reference_cached * 1e6:8.3f} µs   compiled {compiled * 1e6:8.3f} µs   '
+                         f'{reference / compiled:6.1f}x\n')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs per benchmark')
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -65,9 +65,7 @@ def main(stdscr, players):
         if key == '\n':
             try:
                 current_player = players[turn_id % len(players)]
-                play_field.place_token(rules, current_player, loc_x=target[0], loc_y=target[1])
-
-                rows = play_field._check_for_winning_rows(rules, current_player)
+                rows = play_field.place_token(rules, current_player, loc_x=target[0], loc_y=target[1])
                 if rows:
                     stdscr.clear()
                     stdscr.addstr(0, 0, f'Player {current_player.name} Wins!')
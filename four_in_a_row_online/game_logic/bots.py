@@ -0,0 +1,697 @@
+"""Players whose moves are computed instead of being chosen by a human, along with the strategies to compute them."""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+import math
+import multiprocessing
+import os
+import random
+from threading import Lock
+import time
+from four_in_a_row_online.data import cards
+from four_in_a_row_online.game_logic import solver
+from four_in_a_row_online.game_logic.data import CardDeck, Player, PlayField, Rules, SparsePlayField, TokenStyle
+
+
+def build_play_field(rules, dimensions, has_bounds, players, tokens):
+    """Creates a play field to search on, holding the given tokens as tuples of location and player. The players are
+    registered in the order of their names first, so the position hashes don't depend on the turn order, which cards
+    may change."""
+    if has_bounds:
+        # the grid based play field keeps the line counters used to evaluate positions
+        play_field = PlayField(dimensions=dimensions)
+    else:
+        play_field = SparsePlayField(dimensions=dimensions)
+    play_field.register_players(sorted(players, key=lambda p: p.name))
+
+    placement_rules = Rules(**rules.json())
+    placement_rules.enable_gravity = False
+    for (loc_x, loc_y), player in tokens:
+        play_field.place_token(placement_rules, player, loc_x, loc_y)
+    return play_field
+
+
+def copy_play_field(game):
+    """Copies the tokens of the game's play field to a new play field to search on."""
+    source = game.play_field
+    tokens = [(field.location, field.occupation) for row in source.fields for field in row if field.occupation]
+    return build_play_field(game.rules, source.dimensions, not isinstance(source, SparsePlayField), game.participants,
+                            tokens)
+
+
+class GameCopy:
+    """Copy of everything the strategies read of a game, taken at once, so moves can be computed in another thread
+    while the game goes on."""
+    __slots__ = ('rules', 'card_deck', 'participants', 'current_turn', 'play_field')
+
+    def __init__(self, game):
+        self.rules = Rules(**game.rules.json())
+        self.card_deck = CardDeck(**game.card_deck.json())
+        self.participants = list(game.participants)
+        self.current_turn = game.current_turn
+        self.play_field = copy_play_field(game)
+
+
+def legal_moves(play_field, rules):
+    """Returns all locations a token can be placed at."""
+    if rules.enable_gravity:
+        return [(x, play_field.column_height(x)) for x in play_field.legal_columns()]
+    return list(play_field.empty_cells())
+
+
+class Strategy:
+    """Super class of all strategies a bot can use to pick its moves."""
+
+    class NoMoveLeft(RuntimeError):
+        """There is no location left to place a token at."""
+
+    def choose_move(self, game, bot):
+        """Returns the location the bot should place its next token at."""
+        raise NotImplementedError()
+
+
+class AlphaBetaStrategy(Strategy):
+    """Picks moves with an iterative deepening negamax search with alpha-beta pruning. Games of more than two players
+    are searched as a game of the bot against all of its opponents together. Positions are looked up in a bounded
+    transposition table, which also provides the move searched first. Each search ends when the time budget (in
+    seconds) is used up, and the best move of the deepest finished iteration is played."""
+
+    WIN = 10 ** 9
+
+    EXACT, LOWER_BOUND, UPPER_BOUND = range(3)
+
+    class _OutOfTime(Exception):
+        pass
+
+    def __init__(self, time_budget=1., max_depth=None, transposition_table_size=2 ** 18):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.transposition_table_size = transposition_table_size
+        self._transposition_table = OrderedDict()
+        self._table_key = None
+
+    def choose_move(self, game, bot):
+        deadline = time.monotonic() + self.time_budget
+        play_field = copy_play_field(game)
+        moves = legal_moves(play_field, game.rules)
+        if not moves:
+            raise Strategy.NoMoveLeft()
+
+        search = self._start_search(play_field, game.rules, game.participants, bot, deadline)
+        results = self._deepen(search, moves, game.current_turn)
+        return results[-1][1] if results else search.order_moves(moves, None)[0]
+
+    def _start_search(self, play_field, rules, turn_order, bot, deadline):
+        # entries are keyed by the position hash, which only depends on the dimensions, and the index of the player to
+        # move, and scored for the bot, so they are only valid for the same turn order, bot and rules
+        table_key = (bot.name, tuple(p.name for p in turn_order), play_field.dimensions, rules.winning_row_length,
+                     rules.enable_gravity, rules.field_has_bounds)
+        if table_key != self._table_key:
+            self._transposition_table.clear()
+            self._table_key = table_key
+        return _AlphaBetaSearch(self, play_field, rules, turn_order, bot, deadline)
+
+    def _max_depth(self, play_field):
+        """Returns `max_depth`, or else the number of empty cells, the number of moves the game lasts at most."""
+        if self.max_depth:
+            return self.max_depth
+        empty_cells = sum(1 for _ in play_field.empty_cells())
+        # unbounded play fields grow beyond the cells around their tokens
+        return empty_cells + (64 if isinstance(play_field, SparsePlayField) else 0)
+
+    def _deepen(self, search, moves, turn, max_depth=None):
+        """Searches the moves with increasing depth until the time is up or the outcome is decided. Returns the score
+        and the best move of every finished iteration."""
+        results = []
+        max_depth = max_depth or self._max_depth(search.play_field)
+        for depth in range(1, max_depth + 1):
+            try:
+                results.append(search.search_root(moves, depth, turn))
+            except AlphaBetaStrategy._OutOfTime:
+                break
+            if abs(results[-1][0]) > self.WIN // 2:
+                # the outcome is decided
+                break
+        return results
+
+
+class _AlphaBetaSearch:
+    """State of a single search of `AlphaBetaStrategy`."""
+
+    def __init__(self, strategy, play_field, rules, turn_order, bot, deadline):
+        self.strategy = strategy
+        self.table = strategy._transposition_table
+        self.play_field = play_field
+        self.rules = rules
+        self.turn_order = list(turn_order)
+        self.sides = [1 if player == bot else -1 for player in turn_order]
+        self.bot = bot
+        self.deadline = deadline
+        self.nodes = 0
+        self.weights = [4 ** count for count in range(rules.winning_row_length + 1)]
+        self.evaluate_lines = not isinstance(play_field, SparsePlayField)
+
+        width, height = play_field.dimensions
+        self.centre = (width - 1) / 2, (height - 1) / 2
+
+    def order_moves(self, moves, first):
+        ordered = sorted(moves, key=lambda m: abs(m[0] - self.centre[0]) + abs(m[1] - self.centre[1]) / 2)
+        if first in moves:
+            ordered.remove(first)
+            ordered.insert(0, first)
+        return ordered
+
+    def evaluate(self, turn):
+        """Scores the position from the point of view of the side to move, by the number of tokens on the lines that
+        can still be completed."""
+        if not self.evaluate_lines:
+            return 0
+        score = 0
+        for holder, count in self.play_field.open_lines(self.rules):
+            score += self.weights[count] if holder == self.bot else -self.weights[count]
+        return score * self.sides[turn]
+
+    def probe(self, key, ply):
+        """Returns the entry of the position as a tuple of depth, flag, score and best move, or None."""
+        entry = self.table.get(key)
+        if entry:
+            depth, flag, score, move = entry
+            # wins and losses are stored counted from the position, the search counts them from the root
+            if score > AlphaBetaStrategy.WIN // 2:
+                score -= ply
+            elif score < -AlphaBetaStrategy.WIN // 2:
+                score += ply
+            entry = depth, flag, score, move
+        return entry
+
+    def store(self, key, depth, flag, score, move, ply):
+        table = self.table
+        if key not in table and len(table) >= self.strategy.transposition_table_size:
+            # drop the oldest entry
+            table.popitem(last=False)
+        if score > AlphaBetaStrategy.WIN // 2:
+            score += ply
+        elif score < -AlphaBetaStrategy.WIN // 2:
+            score -= ply
+        table[key] = depth, flag, score, move
+
+    def search_root(self, moves, depth, turn):
+        alpha, beta = -AlphaBetaStrategy.WIN - 1, AlphaBetaStrategy.WIN + 1
+        key = self.play_field.position_hash, turn
+        entry = self.probe(key, 0)
+        best_score, best_move = None, None
+        for move in self.order_moves(moves, entry[3] if entry else None):
+            score = self.search_move(move, depth, alpha, beta, turn, 0)
+            if best_score is None or score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+        self.store(key, depth, AlphaBetaStrategy.EXACT, best_score, best_move, 0)
+        return best_score, best_move
+
+    def search_move(self, move, depth, alpha, beta, turn, ply):
+        """Returns the score of the move for the side to move."""
+        next_turn = (turn + 1) % len(self.turn_order)
+        if self.play_field.push_move(self.rules, self.turn_order[turn], *move):
+            score = AlphaBetaStrategy.WIN - ply
+        elif self.sides[next_turn] == self.sides[turn]:
+            # the next player is on the same side, so the score doesn't change its sign
+            score = self.negamax(depth - 1, alpha, beta, next_turn, ply + 1)
+        else:
+            score = -self.negamax(depth - 1, -beta, -alpha, next_turn, ply + 1)
+        self.play_field.pop_move()
+        return score
+
+    def negamax(self, depth, alpha, beta, turn, ply):
+        self.nodes += 1
+        if not self.nodes % 1024 and time.monotonic() > self.deadline:
+            raise AlphaBetaStrategy._OutOfTime()
+
+        key = self.play_field.position_hash, turn
+        entry = self.probe(key, ply)
+        first = None
+        if entry:
+            entry_depth, flag, score, first = entry
+            if entry_depth >= depth:
+                if flag == AlphaBetaStrategy.EXACT:
+                    return score
+                elif flag == AlphaBetaStrategy.LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        if depth == 0:
+            return self.evaluate(turn)
+        moves = legal_moves(self.play_field, self.rules)
+        if not moves:
+            # draw
+            return 0
+
+        original_alpha = alpha
+        best_score, best_move = None, None
+        for move in self.order_moves(moves, first):
+            score = self.search_move(move, depth, alpha, beta, turn, ply)
+            if best_score is None or score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = AlphaBetaStrategy.UPPER_BOUND
+        elif best_score >= beta:
+            flag = AlphaBetaStrategy.LOWER_BOUND
+        else:
+            flag = AlphaBetaStrategy.EXACT
+        self.store(key, depth, flag, best_score, best_move, ply)
+        return best_score
+
+
+_process_pool = None
+_process_pool_lock = Lock()
+
+
+def process_pool():
+    """Returns the pool of worker processes shared by all parallel searches. It is created on first use, with one
+    worker per core, and lives as long as the server."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # the pool is created from the thread of a bot move, forking it could copy locks held by other threads,
+            # like the ones of the log handlers, into the workers
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                                mp_context=multiprocessing.get_context(start_method))
+        return _process_pool
+
+
+# the strategy of a worker process, keeping its transposition table from one search to the next
+_worker_strategy = None
+
+
+def _search_moves(rules, dimensions, has_bounds, tokens, turn_order, bot, turn, moves, max_depth, deadline):
+    """Searches a part of the moves at the root of a `ParallelAlphaBetaStrategy` search in a worker process. Players are
+    passed by name and tokens as tuples of location and name, since they are sent between processes. Returns the score
+    and best move of every finished iteration."""
+    global _worker_strategy
+    if _worker_strategy is None:
+        _worker_strategy = AlphaBetaStrategy()
+
+    players = {name: Player(name, TokenStyle.default_init()) for name in turn_order}
+    rules = Rules(**rules)
+    play_field = build_play_field(rules, dimensions, has_bounds, players.values(),
+                                  [(location, players[name]) for location, name in tokens])
+    search = _worker_strategy._start_search(play_field, rules, [players[name] for name in turn_order],
+                                            players[bot], deadline)
+    return _worker_strategy._deepen(search, moves, turn, max_depth)
+
+
+class ParallelAlphaBetaStrategy(AlphaBetaStrategy):
+    """Splits the moves at the root of the search of `AlphaBetaStrategy` between worker processes of the shared
+    process pool, each searching its moves with iterative deepening until the time budget is used up. The results are
+    merged at the deepest iteration finished by every worker, so the chosen move doesn't depend on which worker
+    finishes first."""
+
+    # seconds to wait for the workers after the time budget is used up, as they check the time every few nodes only
+    GRACE_PERIOD = .05
+
+    def __init__(self, time_budget=1., max_depth=None, transposition_table_size=2 ** 18, workers=None):
+        AlphaBetaStrategy.__init__(self, time_budget, max_depth, transposition_table_size)
+        self.workers = workers or os.cpu_count()
+
+    def choose_move(self, game, bot):
+        deadline = time.monotonic() + self.time_budget
+        play_field = copy_play_field(game)
+        moves = legal_moves(play_field, game.rules)
+        if not moves:
+            raise Strategy.NoMoveLeft()
+
+        # the workers search the moves in the order of a sequential search, dealt round robin, so each of them
+        # starts with one of the most promising moves
+        search = self._start_search(play_field, game.rules, game.participants, bot, deadline)
+        ordered = search.order_moves(moves, None)
+        chunks = [ordered[index::self.workers] for index in range(min(self.workers, len(ordered)))]
+
+        tokens = [(field.location, field.occupation.name) for row in play_field.fields for field in row
+                  if field.occupation]
+        arguments = (game.rules.json(), play_field.dimensions, not isinstance(play_field, SparsePlayField), tokens,
+                     [p.name for p in game.participants], bot.name, game.current_turn)
+        max_depth = self._max_depth(play_field)
+        futures = [process_pool().submit(_search_moves, *arguments, chunk, max_depth, deadline)
+                   for chunk in chunks]
+        wait(futures, timeout=max(deadline - time.monotonic(), 0) + self.GRACE_PERIOD)
+        results = []
+        for future in futures:
+            if not future.cancel() and future.done() and future.exception() is None:
+                results.append(future.result())
+            else:
+                # the worker didn't even start or finish in time
+                results.append([])
+        return self.merge(ordered, results)
+
+    @staticmethod
+    def merge(ordered, results):
+        """Picks the best move of the results of the workers, given as lists of the score and best move of every
+        finished iteration. Ties go to the move searched first by a sequential search."""
+        finished = [iterations for iterations in results if iterations]
+        if not finished:
+            return ordered[0]
+
+        def best_at(depth):
+            # workers stop deepening once the outcome of their moves is decided, their last result holds for any depth
+            best = [iterations[min(depth, len(iterations)) - 1] for iterations in finished]
+            return max(best, key=lambda r: (r[0], -ordered.index(r[1])))
+
+        wins = [iterations[-1] for iterations in finished if iterations[-1][0] > AlphaBetaStrategy.WIN // 2]
+        if wins:
+            # a proven win holds whatever the other workers found, play the fastest one
+            return max(wins, key=lambda r: (r[0], -ordered.index(r[1])))[1]
+        undecided = [len(iterations) for iterations in finished if abs(iterations[-1][0]) <= AlphaBetaStrategy.WIN // 2]
+        depth = min(undecided) if undecided else max(len(iterations) for iterations in finished)
+        score, move = best_at(depth)
+        while score < -AlphaBetaStrategy.WIN // 2 and depth > 1:
+            # every move loses, play the one that looked best before the loss was found
+            depth -= 1
+            score, move = best_at(depth)
+        return move
+
+
+class _NodePool:
+    """Search tree nodes of `MCTSStrategy`, kept in parallel lists of a fixed size, indexed by node."""
+
+    NOT_FINISHED, DRAW = -2, -1
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._allocate()
+
+    def _allocate(self):
+        size = self.size
+        self.parent = [-1] * size
+        self.first_child = [-1] * size
+        self.next_sibling = [-1] * size
+        self.move = [None] * size
+        # index in the turn order of the player who made the move leading to the node and of the player to move next
+        self.mover = [0] * size
+        self.turn = [0] * size
+        self.visits = [0] * size
+        self.score = [0.] * size
+        self.position_hash = [0] * size
+        # NOT_FINISHED, DRAW or the index of the winner in the turn order
+        self.result = [self.NOT_FINISHED] * size
+        self.untried = [None] * size
+
+    def add(self, parent, move, mover, turn, position_hash, result=NOT_FINISHED):
+        """Adds a node to the tree and returns its index, or -1 if the pool is full."""
+        if self.count == self.size:
+            return -1
+        node = self.count
+        self.count += 1
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.next_sibling[node] = -1
+        if parent != -1:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        self.move[node] = move
+        self.mover[node] = mover
+        self.turn[node] = turn
+        self.visits[node] = 0
+        self.score[node] = 0.
+        self.position_hash[node] = position_hash
+        self.result[node] = result
+        self.untried[node] = None
+        return node
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def find(self, root, position_hash, turn, max_depth):
+        """Looks for a node with the given position and player to move, at most `max_depth` moves below the root."""
+        level = [root]
+        for _ in range(max_depth + 1):
+            for node in level:
+                if self.position_hash[node] == position_hash and self.turn[node] == turn:
+                    return node
+            level = [child for node in level for child in self.children(node)]
+        return -1
+
+    def reroot(self, root):
+        """Drops all nodes but the subtree of the given node, which becomes node 0."""
+        old = self.parent, self.first_child, self.next_sibling, self.move, self.mover, self.turn, self.visits, \
+            self.score, self.position_hash, self.result, self.untried
+        old_parent, old_first_child, old_next_sibling = old[:3]
+        nodes = [root]
+        for node in nodes:
+            child = old_first_child[node]
+            while child != -1:
+                nodes.append(child)
+                child = old_next_sibling[child]
+        new_index = {node: index for index, node in enumerate(nodes)}
+        new_index[-1] = -1
+
+        self._allocate()
+        for node, index in new_index.items():
+            if node == -1:
+                continue
+            self.parent[index] = new_index[old_parent[node]] if node != root else -1
+            self.first_child[index] = new_index[old_first_child[node]]
+            self.next_sibling[index] = new_index[old_next_sibling[node]] if node != root else -1
+            for new, values in zip((self.move, self.mover, self.turn, self.visits, self.score, self.position_hash,
+                                    self.result, self.untried), old[3:]):
+                new[index] = values[node]
+        self.count = len(nodes)
+        return 0
+
+
+class _SimulatedTurns:
+    """Turn order of a playout, standing in for the game when cards are played."""
+
+    def __init__(self, participants, current_turn):
+        self.participants = participants
+        self.current_turn = current_turn
+
+    def next_turn(self):
+        self.current_turn = (self.current_turn + 1) % len(self.participants)
+
+
+class MCTSStrategy(Strategy):
+    """Picks moves with a Monte Carlo tree search, which works for any number of players: In the tree every player
+    picks the move with the best results for itself. Each new node is scored by a batch of random playouts. With cards
+    enabled, the players of a playout play the cards of the card deck at random, so the results account for changes of
+    the turn order. The nodes are kept in a pool of fixed size. Once it is full, the tree stops growing and the rest of
+    the time budget (in seconds) is spent on playouts from its leaves. After each search the subtree of the position
+    reached is kept, so the next search continues from there, unless the turn order has changed in between."""
+
+    playable_cards = [cards.ShuffleTurnOrder, cards.ReverseTurnOrder, cards.SkipNextTurn]
+
+    def __init__(self, time_budget=1., max_nodes=2 ** 15, playouts_per_node=4, exploration=1.4, card_probability=.1):
+        self.time_budget = time_budget
+        self.playouts_per_node = playouts_per_node
+        self.exploration = exploration
+        self.card_probability = card_probability
+        self._pool = _NodePool(max_nodes)
+        self._root = -1
+        self._turn_order = None
+
+    def choose_move(self, game, bot):
+        deadline = time.monotonic() + self.time_budget
+        play_field = copy_play_field(game)
+        moves = legal_moves(play_field, game.rules)
+        if not moves:
+            raise Strategy.NoMoveLeft()
+
+        pool = self._pool
+        turn_order = bot.name, tuple(p.name for p in game.participants)
+        root = -1
+        if turn_order == self._turn_order and pool.count:
+            root = pool.find(self._root, play_field.position_hash, game.current_turn, len(game.participants))
+        if root == -1:
+            pool.count = 0
+            root = pool.add(-1, None, -1, game.current_turn, play_field.position_hash)
+        else:
+            root = pool.reroot(root)
+
+        search = _MCTSSearch(self, play_field, game.rules, game.card_deck, game.participants)
+        search.iterate(root)
+        while time.monotonic() < deadline:
+            search.iterate(root)
+
+        children = list(pool.children(root))
+        if not children:
+            # the pool was full before the root could be expanded
+            self._root, self._turn_order = -1, None
+            return moves[0]
+        best = max(children, key=lambda child: pool.visits[child])
+        self._root = best
+        self._turn_order = turn_order
+        return pool.move[best]
+
+
+class _MCTSSearch:
+    """State of a single search of `MCTSStrategy`."""
+
+    def __init__(self, strategy, play_field, rules, card_deck, turn_order):
+        self.strategy = strategy
+        self.pool = strategy._pool
+        self.play_field = play_field
+        self.rules = rules
+        self.turn_order = list(turn_order)
+        self.indices = {player: index for index, player in enumerate(self.turn_order)}
+        self.cards = [
+            card for card in strategy.playable_cards if rules.enable_cards and getattr(card_deck, card.__name__, False)
+        ]
+        width, height = play_field.dimensions
+        self.max_playout_length = 2 * width * height
+
+    def iterate(self, root):
+        """Selects a node, expands it and scores the new node with a batch of playouts."""
+        pool = self.pool
+        node = root
+        pushed = 0
+        while True:
+            if pool.result[node] != _NodePool.NOT_FINISHED:
+                scores, playouts = self.result_scores(pool.result[node]), 1
+                break
+
+            if pool.untried[node] is None:
+                pool.untried[node] = legal_moves(self.play_field, self.rules)
+                random.shuffle(pool.untried[node])
+                if not pool.untried[node] and pool.first_child[node] == -1:
+                    pool.result[node] = _NodePool.DRAW
+                    continue
+
+            turn = pool.turn[node]
+            if pool.untried[node]:
+                if pool.count == pool.size:
+                    # the tree can't grow anymore
+                    scores, playouts = self.playouts(turn)
+                    break
+                move = pool.untried[node].pop()
+                won = self.play_field.push_move(self.rules, self.turn_order[turn], *move)
+                pushed += 1
+                next_turn = (turn + 1) % len(self.turn_order)
+                node = pool.add(node, move, turn, next_turn, self.play_field.position_hash,
+                                turn if won else _NodePool.NOT_FINISHED)
+                if won:
+                    scores, playouts = self.result_scores(turn), 1
+                else:
+                    scores, playouts = self.playouts(next_turn)
+                break
+
+            node = self.select(node)
+            self.play_field.push_move(self.rules, self.turn_order[turn], *pool.move[node])
+            pushed += 1
+
+        for _ in range(pushed):
+            self.play_field.pop_move()
+
+        while node != -1:
+            pool.visits[node] += playouts
+            if pool.mover[node] != -1:
+                pool.score[node] += scores[pool.mover[node]]
+            node = pool.parent[node]
+
+    def select(self, node):
+        """Returns the child with the best upper confidence bound for the player to move."""
+        pool = self.pool
+        log_visits = math.log(pool.visits[node])
+        exploration = self.strategy.exploration
+        best, best_value = -1, None
+        for child in pool.children(node):
+            visits = pool.visits[child]
+            value = pool.score[child] / visits + exploration * math.sqrt(log_visits / visits)
+            if best_value is None or value > best_value:
+                best, best_value = child, value
+        return best
+
+    def result_scores(self, result):
+        if result == _NodePool.DRAW:
+            return [1 / len(self.turn_order)] * len(self.turn_order)
+        scores = [0.] * len(self.turn_order)
+        scores[result] = 1.
+        return scores
+
+    def playouts(self, turn):
+        """Plays a batch of random games from the current position. Returns the sum of the scores of every player and
+        the number of games played."""
+        scores = [0.] * len(self.turn_order)
+        cooldown = self.rules.card_placement_cooldown
+        for _ in range(self.strategy.playouts_per_node):
+            turns = _SimulatedTurns(list(self.turn_order), turn)
+            winner = None
+            pushed = 0
+            last_card = -cooldown - 1
+            while pushed < self.max_playout_length:
+                if self.cards and pushed - last_card > cooldown and random.random() < self.strategy.card_probability:
+                    random.choice(self.cards).play(game=turns)
+                    last_card = pushed
+                moves = legal_moves(self.play_field, self.rules)
+                if not moves:
+                    break
+                player = turns.participants[turns.current_turn]
+                pushed += 1
+                if self.play_field.push_move(self.rules, player, *random.choice(moves)):
+                    winner = player
+                    break
+                turns.next_turn()
+            for _ in range(pushed):
+                self.play_field.pop_move()
+
+            if winner is None:
+                for index in range(len(scores)):
+                    scores[index] += 1 / len(scores)
+            else:
+                scores[self.indices[winner]] += 1
+        return scores, self.strategy.playouts_per_node
+
+
+class SolverStrategy(Strategy):
+    """Plays perfectly whenever the scores of all moves are known, either from the table of solved positions, which
+    holds the openings, or by solving the endgame once no more than `endgame_cells` cells are empty. Other positions,
+    as well as games the solver doesn't support, are left to the fallback strategy."""
+
+    def __init__(self, table=None, endgame_cells=12, fallback=None):
+        self.table = table if table is not None else solver.open_table()
+        self.endgame_cells = endgame_cells
+        self.fallback = fallback if fallback is not None else AlphaBetaStrategy()
+        self._solver = solver.Solver()
+
+    def choose_move(self, game, bot):
+        try:
+            result = solver.best_move(game, self.table, self.endgame_cells, self._solver)
+        except solver.Position.Unsupported:
+            result = None
+        if result is None:
+            return self.fallback.choose_move(game, bot)
+        return result[0]
+
+
+class Bot(Player):
+    """A player whose moves are picked by a strategy. Bots are always ready to play."""
+    __slots__ = ('strategy',)
+
+    def __init__(self, name, token_style, strategy=None, is_ready=True):
+        Player.__init__(self, name, token_style, is_ready)
+        self.strategy = strategy if strategy is not None else AlphaBetaStrategy()
+
+    def choose_move(self, game):
+        return self.strategy.choose_move(game, self)
+
+    def play(self, game):
+        """Let the bot place its next token. Returns the winning row like `Game.place_token`."""
+        loc_x, loc_y = self.choose_move(game)
+        return game.place_token(self, loc_x, loc_y)
+
+
+# strategies by the name used to select them
+strategies = {
+    'alphabeta': AlphaBetaStrategy,
+    'mcts': MCTSStrategy,
+    'parallel': ParallelAlphaBetaStrategy,
+    'strongest': SolverStrategy,
+}
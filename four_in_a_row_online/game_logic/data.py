@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import lru_cache
 import random
 from four_in_a_row_online.data import cards
 from four_in_a_row_online.tools.tools import flatten
@@ -6,13 +7,21 @@ from four_in_a_row_online.tools.tools import flatten
 
 class DataContainer:
     """Super class for all objects that can be initialized randomly or have a default. Basically just a tool to make
-    testing a bit easier, since objects can be randomly generated."""
+    testing a bit easier, since objects can be randomly generated. Subclasses keep their data in slots named after
+    their data fields instead of an instance dictionary, which keeps the many objects held per game small."""
+    __slots__ = ()
+
     data_fields = None
     defaults = None
     randomization = None
 
     def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
+        for field, value in kwargs.items():
+            setattr(self, field, value)
+
+    def _items(self):
+        """Returns all data fields that are set, along with their values."""
+        return [(field, getattr(self, field)) for field in self.data_fields if hasattr(self, field)]
 
     @classmethod
     def random_init(cls):
@@ -31,20 +40,21 @@ class DataContainer:
                 return random_object
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return isinstance(other, DataContainer) and self._items() == other._items()
 
     def __str__(self):
         return f'{self.__class__.__name__}(' + \
-               f'{", ".join([k + "=" + str(v) for k, v in self.__dict__.items()])}' \
+               f'{", ".join([k + "=" + str(v) for k, v in self._items()])}' \
                + ')'
 
     def json(self):
-        return {x: self.__dict__.get(x) for x in self.data_fields}
+        return {x: getattr(self, x, None) for x in self.data_fields}
 
 
 @dataclass
 class CardDeckData:
     """Containing defaults and randomization for initialization of Card Decks."""
+    __slots__ = ()
 
     data_fields = [
         x.__name__ for x in [
@@ -71,6 +81,7 @@ class CardDeck(CardDeckData, DataContainer):
     that alters the state of the game. Cards also have a cool down, so cards cannot be applied
     directly after one another. More detailed characteristics of cards and their role in the
     game mechanics is yet to be explored."""
+    __slots__ = tuple(CardDeckData.data_fields)
 
     def __init__(self, **kwargs):
         DataContainer.__init__(self, **kwargs)
@@ -81,11 +92,17 @@ class CardDeck(CardDeckData, DataContainer):
     @staticmethod
     def place_card(card: cards.Card, *args, **kwargs):
         card.play(*args, **kwargs)
+        game = kwargs.get('game', None)
+        if game is not None:
+            # cards may change the game in ways the game doesn't notice
+            game.touch()
 
 
 @dataclass
 class RulesData:
     """Class providing information for random rules initialization and default rules."""
+    __slots__ = ()
+
     # TODO allow spectators
     data_fields = [x.strip() for x in '''shuffle_turn_order_on_start
         enable_chat
@@ -125,6 +142,7 @@ class Rules(RulesData, DataContainer):
     or affect some meta data for the game. An instance of the latter case is the rul `game_is_public`,
     which is used to define whether or not the game will be accessible to players via a list of all
     available games, or if they can just be joined directly."""
+    __slots__ = tuple(RulesData.data_fields)
 
     def __init__(self, **kwargs):
         DataContainer.__init__(self, **kwargs)
@@ -146,6 +164,8 @@ class Rules(RulesData, DataContainer):
 @dataclass
 class TokenStyleData:
     """Holds data for randomization and default initialization of token styles."""
+    __slots__ = ()
+
     data_fields = [x.strip() for x in '''color'''.splitlines()]
     # img_src
 
@@ -165,6 +185,7 @@ class TokenStyle(TokenStyleData, DataContainer):
     """Represent the visual apperance of a player's play token. The TokenStyle will only contain a color, represented
     as a tuple of RGBα values. To assure visibility, the α value must be at least 124. To allow a player to use their
     chosen TokenStyle, the color has to be distinguishable from all the other player's token's colors."""
+    __slots__ = ('color',)
 
     class TooTransparent(ValueError):
         """The color's alpha value is too low."""
@@ -196,12 +217,13 @@ class TokenStyle(TokenStyleData, DataContainer):
 
     @classmethod
     def is_dinguishable_init(cls, existing):
-        """Instantiates the class TokenStyle randomly until an instance is distinguishable from a list of other
-        TokenStyles in which case that instance is then returned."""
-        while True:
-            token_style = cls.random_init()
-            if all([TokenStyle.distinguishable(token_style, x) for x in existing]):
-                return token_style
+        """Returns a TokenStyle that is distinguishable from a list of other TokenStyles, picked from a random position
+        of the candidates of the `Palette`. Raises `Palette.Exhausted` if there is none."""
+        return Palette(existing).allocate(random.randrange(len(Palette.candidates())))
+
+    @classmethod
+    def unique_random(cls, existing):
+        return cls.is_dinguishable_init(existing)
 
     def __eq__(self, other):
         """Override the euqality operator to improve readability. Checks for excact matches shall always make use of
@@ -211,6 +233,8 @@ class TokenStyle(TokenStyleData, DataContainer):
 
 class PlayerData:
     """Offering default and randomization values and functions for player class initialization."""
+    __slots__ = ()
+
     data_fields = [x.strip() for x in '''name
     token_style
     is_ready'''.splitlines()]
@@ -229,6 +253,7 @@ class PlayerData:
 
 class Player(PlayerData, DataContainer):
     """Represents a player."""
+    __slots__ = ('name', 'token_style', 'is_ready')
 
     data_fields = PlayerData.data_fields
     defaults = PlayerData.defaults
@@ -249,30 +274,269 @@ class Player(PlayerData, DataContainer):
 
     @classmethod
     def unique_random(cls, existing):
-        while True:
-            random_object = cls.random_init()
-            # check that no object is equal to the random object
-            if all([(not x == random_object) and (not x.token_style == random_object.token_style) for x in existing]):
-                return random_object
+        random_object = cls.random_init()
+        random_object.token_style = TokenStyle.is_dinguishable_init([x.token_style for x in existing])
+        names = {x.name for x in existing}
+        number = random.randrange(100, 999)
+        for offset in range(len(names) + 1):
+            # the first free name from the random one on
+            random_object.name = f'player no {number + offset}'
+            if random_object.name not in names:
+                break
+        return random_object
+
+
+class Palette:
+    """Index of the colors of token styles in use, to find distinguishable colors without comparing a color to every
+    other one. Colors are kept in a grid over the RGBα space, and only the grid cells close enough to a color to hold
+    an indistinguishable one are searched. New colors are picked from a fixed set of candidates. Once the first few
+    candidates tried are taken, each candidate counts the colors in use it can't be distinguished from, so finding
+    one, or finding out that there is none left, takes a single pass over the candidates."""
+
+    # width of the grid cells in each channel
+    CELL_SIZE = 32
+    # the maximum distance of indistinguishable colors, see `TokenStyle.distinguishable`
+    DISTANCE = 4 * 30
+    # number of candidates checked against the colors in use before counting the colors close to every candidate
+    ATTEMPTS = 8
+
+    class Exhausted(RuntimeError):
+        """There is no candidate color left that is distinguishable from the colors in use."""
+
+    def __init__(self, token_styles=()):
+        self._cells = {}
+        # colors without an α value are compared to every color, as only the channels both colors have are compared
+        self._others = []
+        # by candidate, the number of colors in use it can't be distinguished from, counted once needed
+        self._blocked = None
+        for token_style in token_styles:
+            self.add(token_style)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def candidates():
+        """Returns the colors to pick from, in a fixed order that spreads consecutive colors over the whole space."""
+        colors = [(r, g, b, a) for r in range(0, 256, 40) for g in range(0, 256, 40) for b in range(0, 256, 40)
+                  for a in (255, 190, 125)]
+        random.Random(0).shuffle(colors)
+        return tuple(colors)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _candidate_cells():
+        cells = {}
+        for index, color in enumerate(Palette.candidates()):
+            cells.setdefault(Palette._cell(color), []).append(index)
+        return cells
+
+    @staticmethod
+    def _closest(offset):
+        """Returns the smallest difference of the values of a channel in grid cells the given number of cells apart."""
+        return max(0, (abs(offset) - 1) * Palette.CELL_SIZE + 1)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _offsets():
+        """Returns the offsets of the grid cells that may hold colors indistinguishable from a color in the cell at the
+        origin."""
+        steps = range(-(Palette.DISTANCE // Palette.CELL_SIZE + 2), Palette.DISTANCE // Palette.CELL_SIZE + 3)
+        closest = Palette._closest
+        return tuple((r, g, b, a) for r in steps for g in steps for b in steps for a in steps
+                     if closest(r) + closest(g) + closest(b) + closest(a) <= Palette.DISTANCE)
+
+    @staticmethod
+    def _cell(color):
+        return tuple(value // Palette.CELL_SIZE for value in color)
+
+    def _close_candidates(self, token_style):
+        """Returns the indices of the candidates that are indistinguishable from the token style."""
+        candidates = self.candidates()
+        if len(token_style.color) != 4:
+            indices = range(len(candidates))
+        else:
+            r, g, b, a = self._cell(token_style.color)
+            cells = self._candidate_cells()
+            indices = [index for dr, dg, db, da in self._offsets()
+                       for index in cells.get((r + dr, g + dg, b + db, a + da), ())]
+        color = token_style.color
+        return [index for index in indices
+                if sum(abs(x - y) for x, y in zip(color, candidates[index])) <= self.DISTANCE]
+
+    def add(self, token_style):
+        if len(token_style.color) != 4:
+            self._others.append(token_style)
+        else:
+            self._cells.setdefault(self._cell(token_style.color), []).append(token_style)
+        if self._blocked is not None:
+            for index in self._close_candidates(token_style):
+                self._blocked[index] += 1
+
+    def remove(self, token_style):
+        """Removes a token style that has been added before."""
+        if len(token_style.color) != 4:
+            self._others.remove(next(x for x in self._others if x.color == token_style.color))
+        else:
+            cell = self._cell(token_style.color)
+            styles = self._cells[cell]
+            styles.remove(next(x for x in styles if x.color == token_style.color))
+            if not styles:
+                del self._cells[cell]
+        if self._blocked is not None:
+            for index in self._close_candidates(token_style):
+                self._blocked[index] -= 1
+
+    def __len__(self):
+        return sum(len(styles) for styles in self._cells.values()) + len(self._others)
+
+    def is_distinguishable(self, token_style):
+        """Whether the token style is distinguishable from all token styles in the palette."""
+        if any(not TokenStyle.distinguishable(token_style, x) for x in self._others):
+            return False
+        if len(token_style.color) != 4:
+            return all(TokenStyle.distinguishable(token_style, x) for styles in self._cells.values() for x in styles)
+
+        cell, cells = self._cell(token_style.color), self._cells
+        if len(cells) < len(self._offsets()):
+            # fewer cells are in use than could be close, so the cells in use are checked for being close instead
+            closest = self._closest
+            nearby = (styles for other, styles in cells.items()
+                      if sum(closest(o - c) for o, c in zip(other, cell)) <= self.DISTANCE)
+        else:
+            nearby = filter(None, (cells.get(tuple(c + o for c, o in zip(cell, offset))) for offset in self._offsets()))
+        return all(TokenStyle.distinguishable(token_style, x) for styles in nearby for x in styles)
+
+    def allocate(self, start=0):
+        """Returns a token style of the first candidate from the given position on that is distinguishable from the
+        token styles in the palette, and adds it. Raises `Palette.Exhausted` if there is none."""
+        candidates = self.candidates()
+        if self._blocked is None:
+            for index in range(self.ATTEMPTS):
+                token_style = TokenStyle(candidates[(start + index) % len(candidates)])
+                if self.is_distinguishable(token_style):
+                    self.add(token_style)
+                    return token_style
+            self._blocked = [0] * len(candidates)
+            for token_style in self._others + [x for styles in self._cells.values() for x in styles]:
+                for index in self._close_candidates(token_style):
+                    self._blocked[index] += 1
+
+        for index in range(len(candidates)):
+            index = (start + index) % len(candidates)
+            if not self._blocked[index]:
+                token_style = TokenStyle(candidates[index])
+                self.add(token_style)
+                return token_style
+        raise Palette.Exhausted()
+
+
+class WinningLines:
+    """Table of all lines a player can win with on a play field of the given size. Every line is a tuple of the
+    locations it consists of, starting at its lowest cell. Lines are ordered the same way `PlayField` reports winning
+    rows, so among several lines the one with the lowest index is the one to report. Since the table only depends on
+    the play field's dimensions and the winning row length, it is built once per process and shared by all play
+    fields using `WinningLines.of`."""
+
+    def __init__(self, width, height, length):
+        self.width = width
+        self.height = height
+        self.length = length
+        self.lines = []
+        self.lines_by_cell = [[] for _ in range(width * height)]
+
+        directions = [(-1, 1), (0, 1), (1, 1), (1, 0)]
+        for y in range(height):
+            for x in range(width):
+                for dx, dy in directions:
+                    end_x, end_y = x + (length - 1) * dx, y + (length - 1) * dy
+                    if 0 <= end_x < width and 0 <= end_y < height:
+                        line = tuple((x + i * dx, y + i * dy) for i in range(length))
+                        for cell_x, cell_y in line:
+                            self.lines_by_cell[cell_y * width + cell_x].append(len(self.lines))
+                        self.lines.append(line)
+        self.lines_by_cell = [tuple(lines) for lines in self.lines_by_cell]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(width, height, length):
+        return WinningLines(width, height, length)
+
+
+class UnboundedWinningLines:
+    """Lines a player can win with on a play field without bounds. There are infinitely many of them, so instead of a
+    table, the lines through a cell are made up when asked for. Every line is a tuple of the locations it consists of,
+    starting at its lowest cell, which also identifies the line."""
+
+    def __init__(self, length):
+        self.length = length
+
+    def lines_through(self, x, y):
+        return tuple(
+            tuple((x + (i - offset) * dx, y + (i - offset) * dy) for i in range(self.length))
+            for dx, dy in [(-1, 1), (0, 1), (1, 1), (1, 0)] for offset in range(self.length)
+        )
+
+
+def _mix64(value):
+    """Scrambles the bits of an integer into a 64 bit value (the finalizer of SplitMix64)."""
+    value = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(width, height, number_of_players):
+    """Returns a random 64 bit key for every player and cell of a play field of the given size, used to hash positions.
+    The keys are generated from a fixed seed, so the hash of a position is the same in every process, and the keys
+    of a player don't depend on the number of players, so a table can be swapped for one of more players."""
+    keys = []
+    for player in range(number_of_players):
+        generator = random.Random(f'{width}x{height}:{player}')
+        keys.append(tuple(generator.getrandbits(64) for _ in range(width * height)))
+    return tuple(keys)
 
 
 @dataclass
 class PlayField:
-    """Data class to represent a play field of variable size."""
+    """Data class to represent a play field of variable size. The occupation of the cells is kept in a flat list, row
+    after row, `Field` objects are only created when the play field is looked at."""
 
     class IllegalTokenLocation(ValueError):
         """Exception to signify that the token can't be placed at the selected location."""
         pass
 
     dimensions: (int, int)
-    fields: []
     player_colors_pretty_print: dict
 
+    # move stack of `push_move` and `pop_move`, allocated on the first move pushed
+    _move_count = 0
+    _moves_x = None
+    _moves_y = None
+
     def __init__(self, dimensions):
         self.dimensions = dimensions
         width, height = self.dimensions
-        self.fields = [[Field((x, y)) for x in range(width)] for y in range(height)]
+        self._cells = [None] * (width * height)
         self.player_colors_pretty_print = {}
+        # players in the order they placed their first token and the zobrist hash of the current position
+        self._player_indices = {}
+        self._zobrist_keys = ()
+        self._position_hash = 0
+        # for each column the row above its topmost token, which is where the next token lands when gravity is enabled
+        self._column_heights = [0] * width
+
+        # for each line of the winning line table the number of tokens on it, in total and per player, and the player
+        # holding all of them, which is None for empty lines and False for dead lines holding tokens of several players
+        self._winning_lines = None
+        self._line_tokens = None
+        self._line_counts = None
+        self._line_holders = None
+
+    def __eq__(self, other):
+        """Play fields are equal if they have the same dimensions and tokens, regardless of how they store them."""
+        if not isinstance(other, PlayField):
+            return NotImplemented
+        return self.dimensions == other.dimensions and set(self._placed_tokens()) == set(other._placed_tokens())
 
     def _check_for_winning_rows(self, rules, player):
         """Check, if there are any rows on the field long enough for the specified player to win the game."""
@@ -314,8 +578,8 @@ class PlayField:
                         directions.remove(current_direction)
                         break
                     if (
-                            rules.field_has_bounds and (0 <= next_location[0] < rules.play_field_width)
-                            and (0 <= next_location[1] < rules.play_field_height)
+                            (0 <= next_location[0] < self.dimensions[0])
+                            and (0 <= next_location[1] < self.dimensions[1])
                     ):
                         if self.get_field(next_location[0], next_location[1]).occupation == player:
                             next_directions = origins.get(next_location, [])
@@ -330,37 +594,276 @@ class PlayField:
                     else:
                         br = True
 
-    def get_field(self, x, y):
-        return self.fields[y][x]
-
-    def place_token(self, rules, player, loc_x, loc_y):
-        if player not in self.player_colors_pretty_print:
+    def _register_player(self, player):
+        """Assigns the player an index and a symbol for pretty printing, when it places its first token."""
+        if player not in self._player_indices:
             self.player_colors_pretty_print[player] = [
                 'x', 'o', '*', '#'
-            ][len(self.player_colors_pretty_print)]
+            ][len(self._player_indices) % 4]
+            self._player_indices[player] = len(self._player_indices)
+            self._load_zobrist_keys()
+
+    def register_players(self, players):
+        """Assigns indices to the players in the given order, unless they placed tokens already. Players with the same
+        index get the same keys for the position hash, so registering players in a fixed order makes the hashes of
+        different play fields comparable."""
+        for player in players:
+            self._register_player(player)
+
+    def _load_zobrist_keys(self):
+        width, height = self.dimensions
+        self._zobrist_keys = zobrist_keys(width, height, len(self._player_indices))
 
-        def pt():
-            self.fields[loc_y][loc_x].occupation = player
+    def _token_key(self, player, x, y):
+        return self._zobrist_keys[self._player_indices[player]][y * self.dimensions[0] + x]
+
+    @property
+    def position_hash(self):
+        """64 bit zobrist hash of the tokens on the play field, updated with every token placed or removed. Players are
+        told apart by the order in which they placed their first token."""
+        return self._position_hash
+
+    def _is_held_by(self, player, x, y):
+        width, height = self.dimensions
+        return 0 <= x < width and 0 <= y < height and self._cells[y * width + x] == player
+
+    def _winning_row_through(self, rules, player, loc_x, loc_y):
+        """Check, if the token at the given location is part of a row long enough for the specified player to win the
+        game. Only the four lines through that location are followed, so this costs O(winning_row_length) instead of
+        a scan of the whole play field. The row is reported the same way as by `_check_for_winning_rows`, except that
+        it always contains the given location."""
+        length = rules.winning_row_length
+        candidates = []
+        for direction_index, (dx, dy) in enumerate([(-1, 1), (0, 1), (1, 1), (1, 0)]):
+            # go back to the start of the row (but no further than a winning row's length), then count the row's
+            # length up to the winning row length
+            start_x, start_y, steps = loc_x, loc_y, 1
+            while steps < length and self._is_held_by(player, start_x - dx, start_y - dy):
+                start_x, start_y, steps = start_x - dx, start_y - dy, steps + 1
+            row_length = 1
+            while row_length < length and self._is_held_by(player, start_x + row_length * dx, start_y + row_length * dy):
+                row_length += 1
+            if row_length >= length:
+                candidates.append((start_y, start_x, direction_index, (dx, dy)))
+
+        if candidates:
+            start_y, start_x, _, (dx, dy) = min(candidates)
+            return [(start_x + i * dx, start_y + i * dy) for i in range(length)]
+
+    def _is_occupied(self, x, y):
+        return self._cells[y * self.dimensions[0] + x] is not None
+
+    def _raise_column(self, x, y):
+        if y >= self._column_heights[x]:
+            self._column_heights[x] = y + 1
+
+    def _lower_column(self, x):
+        while self._column_heights[x] and not self._is_occupied(x, self._column_heights[x] - 1):
+            self._column_heights[x] -= 1
+
+    def column_height(self, column):
+        """Returns the row a token dropped into the column lands in."""
+        if not 0 <= column < self.dimensions[0]:
+            raise PlayField.IllegalTokenLocation()
+        return self._column_heights[column]
+
+    def legal_columns(self):
+        """Yields all columns that still have space for another token."""
+        height = self.dimensions[1]
+        return (x for x, column_height in enumerate(self._column_heights) if column_height < height)
+
+    def empty_cells(self):
+        """Yields the locations of all cells without a token."""
+        width, height = self.dimensions
+        return ((x, y) for y in range(height) for x in range(width) if not self._is_occupied(x, y))
+
+    def drop_token(self, rules, player, column):
+        """Drop a token of the specified player into a column. Returns the winning row, if the token completes one,
+        otherwise None."""
+        return self.place_token(rules, player, column, self.column_height(column))
+
+    def _track_lines(self, rules):
+        """Makes sure the line counters are kept for the winning row length of the rules, building them from the tokens
+        on the play field if the winning row length changed."""
+        width, height = self.dimensions
+        if self._winning_lines is not None and self._winning_lines.length == rules.winning_row_length:
+            return self._winning_lines
+
+        self._winning_lines = WinningLines.of(width, height, rules.winning_row_length)
+        self._line_tokens = [0] * len(self._winning_lines.lines)
+        self._line_counts = {}
+        self._line_holders = [None] * len(self._winning_lines.lines)
+        for player, x, y in self._placed_tokens():
+            self._count_token(player, x, y)
+        return self._winning_lines
+
+    def _placed_tokens(self):
+        """Yields the player and the location of every token on the play field."""
+        width = self.dimensions[0]
+        return ((occupation, index % width, index // width) for index, occupation in enumerate(self._cells)
+                if occupation is not None)
+
+    def _count_token(self, player, x, y):
+        """Adds the token to the counters of all lines through its location. Returns the index of the first line the
+        token completes or None."""
+        counts = self._line_counts.get(player)
+        if counts is None:
+            counts = self._line_counts[player] = [0] * len(self._winning_lines.lines)
+        length = self._winning_lines.length
+        completed = None
+        for line in self._winning_lines.lines_by_cell[y * self.dimensions[0] + x]:
+            self._line_tokens[line] += 1
+            counts[line] += 1
+            if self._line_holders[line] is None:
+                self._line_holders[line] = player
+            elif self._line_holders[line] != player:
+                self._line_holders[line] = False
+            if counts[line] == length and (completed is None or line < completed):
+                completed = line
+        return completed
+
+    def _uncount_token(self, player, x, y):
+        counts = self._line_counts[player]
+        for line in self._winning_lines.lines_by_cell[y * self.dimensions[0] + x]:
+            self._line_tokens[line] -= 1
+            counts[line] -= 1
+            if not self._line_tokens[line]:
+                self._line_holders[line] = None
+            elif self._line_holders[line] is False:
+                self._line_holders[line] = next(
+                    (p for p, c in self._line_counts.items() if c[line] == self._line_tokens[line]), False
+                )
+
+    def _count_placed_token(self, rules, player, x, y):
+        """Adds a placed token to the line counters, if they are kept, for play fields that don't need the counters to
+        find winning rows. Counters kept for another winning row length are dropped."""
+        if self._winning_lines is not None:
+            if self._winning_lines.length == rules.winning_row_length:
+                self._count_token(player, x, y)
+            else:
+                self._winning_lines = None
+
+    def winning_lines(self, rules):
+        """Returns the table of lines to win with under the specified rules."""
+        return self._track_lines(rules)
+
+    def line_count(self, rules, player, line):
+        """Returns the number of the player's tokens on a line of the winning line table."""
+        self._track_lines(rules)
+        counts = self._line_counts.get(player)
+        return counts[line] if counts else 0
+
+    def is_dead_line(self, rules, line):
+        """Checks, if a line of the winning line table can't be completed anymore, because it holds tokens of several
+        players."""
+        self._track_lines(rules)
+        return self._line_holders[line] is False
+
+    def is_winning_move(self, rules, player, loc_x, loc_y):
+        """Checks, if a token of the player at the given (empty) location would complete a line."""
+        lines = self._track_lines(rules)
+        counts = self._line_counts.get(player)
+        if not counts:
+            return lines.length == 1
+        return any(
+            counts[line] == lines.length - 1 and self._line_tokens[line] == counts[line]
+            for line in lines.lines_by_cell[loc_y * self.dimensions[0] + loc_x]
+        )
+
+    def open_lines(self, rules):
+        """Yields the player and the number of tokens for every line that holds tokens of only one player."""
+        self._track_lines(rules)
+        for line, holder in enumerate(self._line_holders):
+            if holder:
+                yield holder, self._line_counts[holder][line]
+
+    def threats(self, rules, player):
+        """Yields the locations at which the player would complete a line with the next token."""
+        lines = self._track_lines(rules)
+        counts = self._line_counts.get(player, ())
+        for line, count in enumerate(counts):
+            if count == lines.length - 1 and self._line_tokens[line] == count:
+                yield next(location for location in lines.lines[line] if not self._is_occupied(*location))
+
+    def get_field(self, x, y):
+        field = Field((x, y))
+        field.occupation = self._cells[y * self.dimensions[0] + x]
+        return field
+
+    @property
+    def fields(self):
+        width, height = self.dimensions
+        return [[self.get_field(x, y) for x in range(width)] for y in range(height)]
+
+    def _put_token(self, rules, player, loc_x, loc_y):
+        lines = self._track_lines(rules)
+        self._cells[loc_y * self.dimensions[0] + loc_x] = player
+        self._position_hash ^= self._token_key(player, loc_x, loc_y)
+        self._raise_column(loc_x, loc_y)
+        completed = self._count_token(player, loc_x, loc_y)
+        if completed is not None:
+            return list(lines.lines[completed])
+
+    def place_token(self, rules, player, loc_x, loc_y):
+        """Place a token of the specified player at the given location. Returns the winning row, if the token completes
+        one, otherwise None."""
+        self._register_player(player)
 
         x, y = self.dimensions
         if 0 <= loc_x < x and 0 <= loc_y < y:
             if rules.enable_gravity:
-                if ((loc_y == 0 or self.fields[loc_y - 1][loc_x].occupation is not None) and
-                        self.fields[loc_y][loc_x].occupation is None):
-                    pt()
+                if ((loc_y == 0 or self._is_occupied(loc_x, loc_y - 1)) and
+                        not self._is_occupied(loc_x, loc_y)):
+                    return self._put_token(rules, player, loc_x, loc_y)
                 else:
                     # print(loc_x, loc_y, self.fields[loc_y - 1][loc_x].occupation, self.fields[loc_y][loc_x])
                     raise PlayField.IllegalTokenLocation()
             else:
-                if self.fields[loc_y][loc_x].occupation is None:
-                    pt()
+                if not self._is_occupied(loc_x, loc_y):
+                    return self._put_token(rules, player, loc_x, loc_y)
                 else:
                     raise PlayField.IllegalTokenLocation()
         else:
             raise PlayField.IllegalTokenLocation()
 
     def remove_token(self, x, y):
-        self.fields[y][x].occupation = None
+        player = self._cells[y * self.dimensions[0] + x]
+        self._cells[y * self.dimensions[0] + x] = None
+        self._lower_column(x)
+        if player is not None:
+            self._position_hash ^= self._token_key(player, x, y)
+            if self._winning_lines is not None:
+                self._uncount_token(player, x, y)
+
+    @property
+    def move_count(self):
+        """Number of moves on the move stack."""
+        return self._move_count
+
+    def push_move(self, rules, player, loc_x, loc_y):
+        """Place a token like `place_token` does and put the move on the move stack, so it can be taken back with
+        `pop_move`. The stack is allocated once with room for a token on every cell, so pushing and popping moves
+        doesn't allocate anything, which makes it suitable for searching through positions without copying the play
+        field."""
+        winning_row = self.place_token(rules, player, loc_x, loc_y)
+        if self._moves_x is None:
+            width, height = self.dimensions
+            self._moves_x, self._moves_y = [0] * (width * height), [0] * (width * height)
+        elif self._move_count == len(self._moves_x):
+            # only play fields without bounds can hold more tokens than they have cells
+            self._moves_x.extend(self._moves_x)
+            self._moves_y.extend(self._moves_y)
+        self._moves_x[self._move_count] = loc_x
+        self._moves_y[self._move_count] = loc_y
+        self._move_count += 1
+        return winning_row
+
+    def pop_move(self):
+        """Take back the last move on the move stack, restoring the play field as it was before the move."""
+        if not self._move_count:
+            raise IndexError("There are no moves to take back.")
+        self._move_count -= 1
+        self.remove_token(self._moves_x[self._move_count], self._moves_y[self._move_count])
 
     def pretty_print(self, curses=False):
         res = ['']
@@ -391,6 +894,8 @@ class PlayField:
 class Field:
     """Data class to represent a single cell on a play field. The field can be occupied or empty.
     The absolute location of the field in the play field is also saved."""
+    __slots__ = ('occupation', 'location')
+
     occupation: Player
     location: (int, int)
 
@@ -400,6 +905,348 @@ class Field:
 
     def json(self):
         return {
-            "occupation": self.occupation,
+            # players are listed with the game, the field names its player
+            "occupation": self.occupation.name if self.occupation else None,
             "location": self.location
         }
+
+
+class BitBoardPlayField(PlayField):
+    """Play field that stores one integer bitmask per player plus an occupancy mask instead of a grid of `Field`
+    objects. Cells are laid out column by column, each column taking `height + 1` bits. The additional (always empty)
+    bit on top of every column keeps rows from wrapping into the next column, so placement, legality checks and win
+    detection come down to shifts and ANDs. The public interface is the same as the one of `PlayField`."""
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        width, height = self.dimensions
+        self.player_colors_pretty_print = {}
+        self._player_indices = {}
+        self._zobrist_keys = ()
+        self._position_hash = 0
+        self._stride = height + 1
+        self._occupied = 0
+        self._masks = {}
+        self._column_heights = [0] * width
+        # line counters like the ones of `PlayField`, kept once they are asked for
+        self._winning_lines = None
+        self._line_tokens = None
+        self._line_counts = None
+        self._line_holders = None
+
+        # direction on the play field (x, y) mapped to the bit shift of a step in that direction
+        self._shifts = {
+            (-1, 1): self._stride - 1,
+            (0, 1): 1,
+            (1, 1): self._stride + 1,
+            (1, 0): self._stride,
+        }
+
+    def _bit(self, x, y):
+        return 1 << (x * self._stride + y)
+
+    def _location(self, bit_index):
+        return divmod(bit_index, self._stride)
+
+    def _row_starts(self, mask, shift, length):
+        """Returns a mask of all bits that start a row of `length` set bits in `mask`, stepping `shift` bits at a
+        time. The row length is doubled on every iteration, so this takes O(log(length)) operations."""
+        current = 1
+        while current * 2 <= length:
+            mask &= mask >> (current * shift)
+            current *= 2
+        if current < length:
+            mask &= mask >> ((length - current) * shift)
+        return mask
+
+    def _check_for_winning_rows(self, rules, player):
+        """Check, if there are any rows on the field long enough for the specified player to win the game. Rows are
+        reported in the same order as the ones of `PlayField`: Starting at the lowest cell of the row."""
+        mask = self._masks.get(player, 0)
+        if not mask:
+            return None
+
+        length = rules.winning_row_length
+        candidates = []
+        for direction_index, (direction, shift) in enumerate(self._shifts.items()):
+            starts = self._row_starts(mask, shift, length)
+            while starts:
+                lowest = starts & -starts
+                x, y = self._location(lowest.bit_length() - 1)
+                if direction == (-1, 1):
+                    # the mask holds the upper left end of the row, but the row starts at its lower right end
+                    x, y = x + length - 1, y - length + 1
+                candidates.append((y, x, direction_index, direction))
+                starts ^= lowest
+
+        if candidates:
+            y, x, _, direction = min(candidates)
+            return [(x + i * direction[0], y + i * direction[1]) for i in range(length)]
+
+    def _is_held_by(self, player, x, y):
+        width, height = self.dimensions
+        return 0 <= x < width and 0 <= y < height and bool(self._masks.get(player, 0) & self._bit(x, y))
+
+    def _is_occupied(self, x, y):
+        return bool(self._occupied & self._bit(x, y))
+
+    def _placed_tokens(self):
+        for player, mask in self._masks.items():
+            while mask:
+                lowest = mask & -mask
+                x, y = self._location(lowest.bit_length() - 1)
+                yield player, x, y
+                mask ^= lowest
+
+    def get_field(self, x, y):
+        field = Field((x, y))
+        bit = self._bit(x, y)
+        if self._occupied & bit:
+            field.occupation = next(player for player, mask in self._masks.items() if mask & bit)
+        return field
+
+    @property
+    def fields(self):
+        width, height = self.dimensions
+        return [[self.get_field(x, y) for x in range(width)] for y in range(height)]
+
+    def place_token(self, rules, player, loc_x, loc_y):
+        self._register_player(player)
+
+        x, y = self.dimensions
+        if not (0 <= loc_x < x and 0 <= loc_y < y):
+            raise PlayField.IllegalTokenLocation()
+
+        bit = self._bit(loc_x, loc_y)
+        if self._occupied & bit:
+            raise PlayField.IllegalTokenLocation()
+        if rules.enable_gravity and loc_y != 0 and not self._occupied & (bit >> 1):
+            raise PlayField.IllegalTokenLocation()
+
+        self._occupied |= bit
+        self._masks[player] = self._masks.get(player, 0) | bit
+        self._position_hash ^= self._token_key(player, loc_x, loc_y)
+        self._raise_column(loc_x, loc_y)
+        self._count_placed_token(rules, player, loc_x, loc_y)
+        return self._winning_row_through(rules, player, loc_x, loc_y)
+
+    def remove_token(self, x, y):
+        bit = self._bit(x, y)
+        if self._occupied & bit:
+            self._occupied ^= bit
+            for player, mask in self._masks.items():
+                if mask & bit:
+                    self._masks[player] = mask ^ bit
+                    self._position_hash ^= self._token_key(player, x, y)
+                    if self._winning_lines is not None:
+                        self._uncount_token(player, x, y)
+                    break
+            self._lower_column(x)
+
+
+class SparsePlayField(PlayField):
+    """Play field without bounds, used if the rules don't limit the play field. Tokens are kept in a dictionary keyed by
+    their location, so memory and the cost of a move scale with the number of tokens instead of the area of the play
+    field. Locations may be arbitrary, only with gravity enabled tokens have to rest on the ground at row 0 or on top of
+    another token. The dimensions only describe the area shown, as long as no tokens are placed outside of it."""
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.player_colors_pretty_print = {}
+        self._player_indices = {}
+        self._position_hash = 0
+        self._tokens = {}
+        self._column_heights = {}
+        # line counters by line instead of by index into a table, only lines holding tokens are kept
+        self._winning_lines = None
+        self._line_tokens = None
+        self._line_counts = None
+        self._line_holders = None
+
+    def _load_zobrist_keys(self):
+        pass
+
+    def _token_key(self, player, x, y):
+        """Without bounds there is no table of keys, instead they are derived from the location and the player."""
+        return _mix64(_mix64(self._player_indices[player]) ^ ((x & 0xFFFFFFFF) << 32 | (y & 0xFFFFFFFF)))
+
+    def _is_held_by(self, player, x, y):
+        return self._tokens.get((x, y)) == player
+
+    def _is_occupied(self, x, y):
+        return (x, y) in self._tokens
+
+    def _placed_tokens(self):
+        return ((player, x, y) for (x, y), player in self._tokens.items())
+
+    def _track_lines(self, rules):
+        if self._winning_lines is not None and self._winning_lines.length == rules.winning_row_length:
+            return self._winning_lines
+
+        self._winning_lines = UnboundedWinningLines(rules.winning_row_length)
+        self._line_tokens = {}
+        self._line_counts = {}
+        self._line_holders = {}
+        for player, x, y in self._placed_tokens():
+            self._count_token(player, x, y)
+        return self._winning_lines
+
+    def _count_token(self, player, x, y):
+        counts = self._line_counts.setdefault(player, {})
+        for line in self._winning_lines.lines_through(x, y):
+            self._line_tokens[line] = self._line_tokens.get(line, 0) + 1
+            counts[line] = counts.get(line, 0) + 1
+            holder = self._line_holders.get(line)
+            if holder is None:
+                self._line_holders[line] = player
+            elif holder != player:
+                self._line_holders[line] = False
+
+    def _uncount_token(self, player, x, y):
+        counts = self._line_counts[player]
+        for line in self._winning_lines.lines_through(x, y):
+            self._line_tokens[line] -= 1
+            counts[line] -= 1
+            if not counts[line]:
+                del counts[line]
+            if not self._line_tokens[line]:
+                del self._line_tokens[line]
+                del self._line_holders[line]
+            elif self._line_holders[line] is False:
+                self._line_holders[line] = next(
+                    (p for p, c in self._line_counts.items() if c.get(line) == self._line_tokens[line]), False
+                )
+
+    def winning_lines(self, rules):
+        """Returns the lines to win with under the specified rules. Lines are identified by their locations instead of
+        an index."""
+        return self._track_lines(rules)
+
+    def line_count(self, rules, player, line):
+        self._track_lines(rules)
+        return self._line_counts.get(player, {}).get(line, 0)
+
+    def is_dead_line(self, rules, line):
+        self._track_lines(rules)
+        return self._line_holders.get(line) is False
+
+    def is_winning_move(self, rules, player, loc_x, loc_y):
+        lines = self._track_lines(rules)
+        counts = self._line_counts.get(player, {})
+        return any(
+            counts.get(line, 0) == lines.length - 1 and self._line_tokens.get(line, 0) == counts.get(line, 0)
+            for line in lines.lines_through(loc_x, loc_y)
+        )
+
+    def open_lines(self, rules):
+        """Yields the player and the number of tokens for every line that holds tokens of only one player. Lines
+        without tokens are left out, as there are infinitely many of them."""
+        self._track_lines(rules)
+        for line, holder in self._line_holders.items():
+            if holder:
+                yield holder, self._line_counts[holder][line]
+
+    def threats(self, rules, player):
+        """Yields the locations at which the player would complete a line with the next token. Lines without tokens
+        are left out, so with a winning row length of 1 there are none."""
+        lines = self._track_lines(rules)
+        for line, count in self._line_counts.get(player, {}).items():
+            if count == lines.length - 1 and self._line_tokens[line] == count:
+                yield next(location for location in line if not self._is_occupied(*location))
+
+    def _raise_column(self, x, y):
+        if y >= self._column_heights.get(x, 0):
+            self._column_heights[x] = y + 1
+
+    def _lower_column(self, x):
+        column_height = self._column_heights.get(x, 0)
+        while column_height > 0 and not self._is_occupied(x, column_height - 1):
+            column_height -= 1
+        if column_height > 0:
+            self._column_heights[x] = column_height
+        else:
+            self._column_heights.pop(x, None)
+
+    def _check_for_winning_rows(self, rules, player):
+        """Check, if there are any rows on the field long enough for the specified player to win the game. Only rows
+        starting at one of the player's tokens are followed, so this scales with the number of tokens."""
+        length = rules.winning_row_length
+        candidates = []
+        for (x, y), occupation in self._tokens.items():
+            if occupation != player:
+                continue
+            for direction_index, (dx, dy) in enumerate([(-1, 1), (0, 1), (1, 1), (1, 0)]):
+                if self._is_held_by(player, x - dx, y - dy):
+                    # not the start of a row
+                    continue
+                row_length = 1
+                while row_length < length and self._is_held_by(player, x + row_length * dx, y + row_length * dy):
+                    row_length += 1
+                if row_length >= length:
+                    candidates.append((y, x, direction_index, (dx, dy)))
+
+        if candidates:
+            y, x, _, (dx, dy) = min(candidates)
+            return [(x + i * dx, y + i * dy) for i in range(length)]
+
+    def bounds(self):
+        """Returns the lowest and highest location of the area holding the tokens and the initial dimensions."""
+        width, height = self.dimensions
+        xs = [x for x, _ in self._tokens] + [0, width - 1]
+        ys = [y for _, y in self._tokens] + [0, height - 1]
+        return (min(xs), min(ys)), (max(xs), max(ys))
+
+    def column_height(self, column):
+        return self._column_heights.get(column, 0)
+
+    def legal_columns(self):
+        """Yields the columns next to the tokens on the play field. All other columns are legal too, but tokens placed
+        there can't be part of a row with any of the existing tokens."""
+        (min_x, _), (max_x, _) = self.bounds()
+        return iter(range(min_x - 1, max_x + 2))
+
+    def empty_cells(self):
+        """Yields the empty cells within and right around the area holding the tokens. All other cells are empty too,
+        but tokens placed there can't be part of a row with any of the existing tokens."""
+        (min_x, min_y), (max_x, max_y) = self.bounds()
+        return ((x, y) for y in range(min_y - 1, max_y + 2) for x in range(min_x - 1, max_x + 2)
+                if (x, y) not in self._tokens)
+
+    def get_field(self, x, y):
+        field = Field((x, y))
+        field.occupation = self._tokens.get((x, y))
+        return field
+
+    @property
+    def fields(self):
+        (min_x, min_y), (max_x, max_y) = self.bounds()
+        return [[self.get_field(x, y) for x in range(min_x, max_x + 1)] for y in range(min_y, max_y + 1)]
+
+    def place_token(self, rules, player, loc_x, loc_y):
+        self._register_player(player)
+
+        if (loc_x, loc_y) in self._tokens:
+            raise PlayField.IllegalTokenLocation()
+        if rules.enable_gravity and not (loc_y == 0 or loc_y > 0 and self._is_occupied(loc_x, loc_y - 1)):
+            raise PlayField.IllegalTokenLocation()
+
+        self._tokens[(loc_x, loc_y)] = player
+        self._position_hash ^= self._token_key(player, loc_x, loc_y)
+        self._raise_column(loc_x, loc_y)
+        self._count_placed_token(rules, player, loc_x, loc_y)
+        return self._winning_row_through(rules, player, loc_x, loc_y)
+
+    def remove_token(self, x, y):
+        player = self._tokens.pop((x, y), None)
+        if player is not None:
+            self._position_hash ^= self._token_key(player, x, y)
+            self._lower_column(x)
+            if self._winning_lines is not None:
+                self._uncount_token(player, x, y)
+
+    def json(self):
+        return {
+            "dimensions": self.dimensions,
+            "bounds": self.bounds(),
+            "fields": [self.get_field(x, y).json() for x, y in self._tokens]
+        }
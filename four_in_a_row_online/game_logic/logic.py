@@ -1,10 +1,18 @@
 from enum import Enum
-from four_in_a_row_online.game_logic.data import PlayField, TokenStyle
+from four_in_a_row_online.game_logic.data import CardDeck, PlayField, Rules, SparsePlayField, TokenStyle
+from four_in_a_row_online.loggers.loggers import games_logger
 from slugify import slugify
 import datetime
+import hashlib
+import json
 
 
 class Game:
+    # implementation used for the play field, e.g. `BitBoardPlayField` for bot and replay workloads
+    play_field_class = PlayField
+    # implementation used for the play field, if the rules don't limit its size
+    unbounded_play_field_class = SparsePlayField
+
     def json(self):
         return {self.slug: {
             "name": self.name,
@@ -19,7 +27,42 @@ class Game:
             "creation_time": self.creation_time
         }}
 
+    def state(self):
+        """Returns everything about the game as plain data, with the players given by name, see `from_state`."""
+        return {
+            "name": self.name,
+            "rules": self.rules.json(),
+            "card_deck": self.card_deck.json(),
+            "participants": [x.name for x in self.participants],
+            "initial_players": [x.name for x in self.initial_players] if self.initial_players is not None else None,
+            "game_state": self._game_state.value,
+            "current_turn": self._current_turn,
+            "winner": self.winner.name if self.winner else None,
+            "tokens": [[*field.location, field.occupation.name]
+                       for row in self._play_field.fields for field in row if field.occupation],
+            "creation_time": self.creation_time.timestamp(),
+        }
+
+    @staticmethod
+    def from_state(state, players):
+        """Creates a game from the `state` of a game, given all of its players by name."""
+        game = Game(state["name"], Rules(**state["rules"]), CardDeck(**state["card_deck"]),
+                    [players[name] for name in state["participants"]])
+        # tokens are put back where they are, wherever they would fall
+        placement_rules = Rules(**state["rules"])
+        placement_rules.enable_gravity = False
+        for loc_x, loc_y, name in state["tokens"]:
+            game._play_field.place_token(placement_rules, players[name], loc_x, loc_y)
+        if state["initial_players"] is not None:
+            game.initial_players = [players[name] for name in state["initial_players"]]
+        game._game_state = Game.State(state["game_state"])
+        game._current_turn = state["current_turn"]
+        game.winner = players[state["winner"]] if state["winner"] is not None else None
+        game.creation_time = datetime.datetime.fromtimestamp(state["creation_time"])
+        return game
+
     class State(Enum):
+        lobby = "LOBBY"
         started = "STARTED"
         finished = "FINISHED"
         quit = "QUIT"
@@ -46,14 +89,19 @@ class Game:
         """This Error is raised, if some player tries to join a game who's lobby has no more space."""
 
     def __init__(self, name, rules, card_deck, players):
+        # incremented on every change of the game, see `snapshot`
+        self._version = 0
+        self._snapshot = None
         self.name = name
         self.rules = rules
         self.participants = players
-        self._play_field = PlayField(dimensions=(self.rules.play_field_width, self.rules.play_field_height))
+        play_field_class = self.play_field_class if self.rules.field_has_bounds else self.unbounded_play_field_class
+        self._play_field = play_field_class(dimensions=(self.rules.play_field_width, self.rules.play_field_height))
         self._game_state = Game.State.lobby
         self._current_turn = None
         self.card_deck = card_deck
         self.initial_players = None
+        self.winner = None
         self._slug = slugify(f"game_{self.name}")
         self.creation_time = datetime.datetime.now()
 
@@ -68,26 +116,85 @@ class Game:
     def slug(self):
         return self._slug
 
+    @property
+    def participants(self):
+        return self._participants
+
+    @participants.setter
+    def participants(self, participants):
+        self._participants = participants
+        self._version += 1
+
+    @property
+    def version(self):
+        return self._version
+
+    def touch(self):
+        """Marks the game as changed. Changes made through the methods of the game are tracked, other ones, like
+        shuffling the participants in place, have to be reported."""
+        self._version += 1
+
+    def snapshot(self):
+        """Returns the json of the game encoded as bytes along with an ETag of it. The snapshot is kept until the
+        version of the game changes, so unchanged games aren't encoded again."""
+        if self._snapshot is None or self._snapshot[0] != self._version:
+            encoded = json.dumps(self.json(), default=str).encode()
+            self._snapshot = self._version, hashlib.sha1(encoded).hexdigest(), encoded
+        return self._snapshot[1:]
+
     @property
     def current_turn(self):
         return self._current_turn
 
+    @property
+    def play_field(self):
+        return self._play_field
+
+    @property
+    def game_state(self):
+        return self._game_state
+
+    def start_game(self):
+        """Start the game with the current participants. Whether the game may be started is decided by the lobby."""
+        self._game_state = Game.State.started
+        self._current_turn = 0
+        self.initial_players = self.participants[:]
+        self._version += 1
+
     def place_token(self, player, loc_x, loc_y):
+        """Let the player place a token. Returns the winning row, if the token completes one, otherwise None."""
         # print(self._play_field.can_place_token(self.rules, player, loc_x, loc_y))
         if self._game_state == Game.State.started and player == self.participants[self._current_turn]:
             try:
-                self._play_field.place_token(self.rules, player, loc_x, loc_y)
+                winning_row = self._play_field.place_token(self.rules, player, loc_x, loc_y)
             except PlayField.IllegalTokenLocation:
                 raise Game.IllegalAction()
         else:
             raise Game.IllegalAction()
 
+        games_logger.debug(f'Player {player.name} placed token on playfield at {(loc_x, loc_y)}.')
+        self._version += 1
+
+        if winning_row:
+            self.winner = player
+            if self.rules.finish_game_on_win:
+                self.finish_game()
+                return winning_row
+
         self.next_turn()
+        return winning_row
 
-        print(f'Player {player.name} placed token on playfield at {(loc_x, loc_y)}.')
+    def drop_token(self, player, column):
+        """Let the player drop a token into a column, which is where it lands in games with gravity."""
+        try:
+            loc_y = self._play_field.column_height(column)
+        except PlayField.IllegalTokenLocation:
+            raise Game.IllegalAction()
+        return self.place_token(player, column, loc_y)
 
     def next_turn(self):
         self._current_turn = (self._current_turn + 1) % len(self.participants)
+        self._version += 1
 
     def render_play_field(self):
         p = self._play_field
@@ -98,7 +205,8 @@ class Game:
             print()
 
     def finish_game(self):
-        pass
+        self._game_state = Game.State.finished
+        self._version += 1
 
     def quit_game(self):
         pass
@@ -0,0 +1,359 @@
+"""Exact game theoretic values of positions of two player games with gravity on a bounded play field, the default
+7x6 four in a row in particular. Positions are bit boards packed into a single integer key, and solved values are kept
+in a table of sorted records on disk that is memory mapped instead of loaded, so lookups cost a binary search over
+pages shared by every process using the table. Generate a table with
+`python -m four_in_a_row_online.game_logic.solver TABLE_PATH --plies N`."""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import mmap
+import os
+import pathlib
+import struct
+from threading import Lock
+
+# the table used by bots and hints unless another one is given
+DEFAULT_TABLE_PATH = pathlib.Path.home() / pathlib.Path('.config/fiaro/positions.bin')
+
+
+@lru_cache(maxsize=None)
+def _masks(width, height):
+    """Returns the bit mask of the bottom cells, the bit mask of the cells of each column and the bit of the bottom
+    cell of each column."""
+    stride = height + 1
+    column_masks = tuple(((1 << height) - 1) << (x * stride) for x in range(width))
+    bottom_bits = tuple(1 << (x * stride) for x in range(width))
+    return sum(bottom_bits), column_masks, bottom_bits
+
+
+class Position:
+    """A position of a two player game with gravity. The tokens of the player to move and the occupied cells are bit
+    boards of one bit per cell, column by column, with one free bit on top of each column. Positions are immutable,
+    `play` returns the position after a move."""
+    __slots__ = ('width', 'height', 'length', 'current', 'mask', 'moves')
+
+    class Unsupported(ValueError):
+        """The game can't be represented as a position, because of its rules or number of players."""
+
+    def __init__(self, width=7, height=6, length=4, current=0, mask=0, moves=0):
+        if width * (height + 1) > 64:
+            raise Position.Unsupported()
+        self.width = width
+        self.height = height
+        self.length = length
+        self.current = current
+        self.mask = mask
+        self.moves = moves
+
+    @staticmethod
+    def from_game(game):
+        """Returns the position of a game, from the view of the player whose turn it is."""
+        rules = game.rules
+        if len(game.participants) != 2 or not rules.enable_gravity or not rules.field_has_bounds:
+            raise Position.Unsupported()
+        width, height = game.play_field.dimensions
+        position = Position(width, height, rules.winning_row_length)
+        mover = game.participants[game.current_turn]
+        stride = height + 1
+        for row in game.play_field.fields:
+            for field in row:
+                if field.occupation is not None:
+                    loc_x, loc_y = field.location
+                    bit = 1 << (loc_x * stride + loc_y)
+                    position.mask |= bit
+                    position.moves += 1
+                    if field.occupation == mover:
+                        position.current |= bit
+        return position
+
+    @staticmethod
+    def from_columns(columns, width=7, height=6, length=4):
+        """Returns the position reached by dropping tokens into the given columns, starting with an empty play
+        field."""
+        position = Position(width, height, length)
+        for column in columns:
+            position = position.play(column)
+        return position
+
+    def can_play(self, column):
+        return not self.mask & (1 << (column * (self.height + 1) + self.height - 1))
+
+    def play(self, column):
+        _, _, bottom_bits = _masks(self.width, self.height)
+        return Position(self.width, self.height, self.length, self.current ^ self.mask,
+                        self.mask | (self.mask + bottom_bits[column]), self.moves + 1)
+
+    def is_winning_move(self, column):
+        _, column_masks, bottom_bits = _masks(self.width, self.height)
+        tokens = self.current | ((self.mask + bottom_bits[column]) & column_masks[column])
+        return has_row(tokens, self.height + 1, self.length)
+
+    def row(self, column):
+        """Returns the row the next token dropped into the column lands in."""
+        return bin(self.mask & _masks(self.width, self.height)[1][column]).count('1')
+
+    def key(self):
+        """Returns the key of the position. A position and its mirror image share a key."""
+        key = self.current + self.mask
+        return min(key, mirror(key, self.width, self.height))
+
+
+def has_row(tokens, stride, length):
+    """Whether a bit board holds a row of the given length."""
+    for shift in 1, stride - 1, stride, stride + 1:
+        row = tokens
+        for step in range(1, length):
+            row &= tokens >> (step * shift)
+        if row:
+            return True
+    return False
+
+
+def mirror(bits, width, height):
+    """Returns the bit board with the order of the columns reversed."""
+    stride = height + 1
+    column_mask = (1 << stride) - 1
+    mirrored = 0
+    for x in range(width):
+        mirrored |= ((bits >> (x * stride)) & column_mask) << ((width - 1 - x) * stride)
+    return mirrored
+
+
+class Solver:
+    """Negamax search with alpha-beta pruning over null windows, finding the exact score of a position: positive if
+    the player to move wins, the earlier the higher, negative if they lose and 0 for a draw. A win with the token
+    placed as the nth move of the game scores (cells + 1 - n) // 2. Upper bounds of scores are kept in a transposition
+    table, which is cleared once it holds `table_size` entries."""
+
+    def __init__(self, table_size=2 ** 22):
+        self.table_size = table_size
+        self._table = {}
+        self._dimensions = None
+        self.nodes = 0
+
+    def solve(self, position):
+        width, height = position.width, position.height
+        cells = width * height
+        _, column_masks, bottom_bits = _masks(width, height)
+        # columns from the centre outwards, as central tokens are part of the most rows
+        order = sorted(range(width), key=lambda x: abs(2 * x - width + 1))
+        stride, length = height + 1, position.length
+        top_bits = tuple(1 << (x * stride + height - 1) for x in range(width))
+        if (width, height, length) != self._dimensions:
+            # keys are only unique for the same dimensions
+            self._table.clear()
+            self._dimensions = width, height, length
+        table = self._table
+
+        def negamax(current, mask, moves, alpha, beta):
+            self.nodes += 1
+            if moves == cells:
+                return 0
+            for x in order:
+                if not mask & top_bits[x] and has_row(current | ((mask + bottom_bits[x]) & column_masks[x]), stride,
+                                                      length):
+                    return (cells + 1 - moves) // 2
+
+            upper = (cells - 1 - moves) // 2
+            key = current + mask
+            if key in table:
+                upper = min(upper, table[key])
+            if beta > upper:
+                beta = upper
+                if alpha >= beta:
+                    return beta
+
+            for x in order:
+                if not mask & top_bits[x]:
+                    score = -negamax(current ^ mask, mask | (mask + bottom_bits[x]), moves + 1, -beta, -alpha)
+                    if score >= beta:
+                        return score
+                    if score > alpha:
+                        alpha = score
+
+            if len(table) >= self.table_size:
+                table.clear()
+            table[key] = alpha
+            return alpha
+
+        lower, upper = -((cells - position.moves) // 2), (cells + 1 - position.moves) // 2
+        while lower < upper:
+            # search the half closer to zero first, as most positions are close to a draw
+            middle = lower + (upper - lower) // 2
+            if middle <= 0 and int(lower / 2) < middle:
+                middle = int(lower / 2)
+            elif middle >= 0 and int(upper / 2) > middle:
+                middle = int(upper / 2)
+            score = negamax(position.current, position.mask, position.moves, middle, middle + 1)
+            if score <= middle:
+                upper = score
+            else:
+                lower = score
+        return lower
+
+    def analyse(self, position, table=None, endgame_cells=12):
+        """Returns the score of every move of the position by column, from the view of the player to move. The
+        positions after the moves are looked up in the table of solved positions, or solved if there are no more than
+        `endgame_cells` empty cells left. Returns None if any position is neither found nor solved."""
+        cells = position.width * position.height
+        scores = {}
+        for column in range(position.width):
+            if not position.can_play(column):
+                continue
+            if position.is_winning_move(column):
+                scores[column] = (cells + 1 - position.moves) // 2
+                continue
+            child = position.play(column)
+            score = table.get(child.key()) if table is not None and table.matches(child) else None
+            if score is None:
+                if cells - child.moves > endgame_cells:
+                    return None
+                score = self.solve(child)
+            scores[column] = -score
+        return scores
+
+
+class PositionTable:
+    """Solved positions, stored as records of a key and a score sorted by key behind a header with the dimensions and
+    the winning row length of the positions. The file is memory mapped read only, so it is never loaded as a whole and
+    its pages are shared between processes."""
+
+    MAGIC = b'FIAR'
+    VERSION = 1
+    HEADER = struct.Struct('<4s4BQ')
+    RECORD = struct.Struct('<Qb')
+
+    class InvalidFile(ValueError):
+        """The file is not a position table."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # the file is empty
+                raise PositionTable.InvalidFile()
+        try:
+            magic, version, self.width, self.height, self.length, self.count = self.HEADER.unpack_from(self._map)
+        except struct.error:
+            raise PositionTable.InvalidFile()
+        if magic != self.MAGIC or version != self.VERSION or \
+                len(self._map) != self.HEADER.size + self.count * self.RECORD.size:
+            raise PositionTable.InvalidFile()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def matches(self, position):
+        return (position.width, position.height, position.length) == (self.width, self.height, self.length)
+
+    def get(self, key):
+        """Returns the score of the position with the given key, or None if it isn't in the table."""
+        record, header_size, data = self.RECORD, self.HEADER.size, self._map
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, score = record.unpack_from(data, header_size + middle * record.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return score
+        return None
+
+    @staticmethod
+    def write(path, width, height, length, scores):
+        """Writes a table of the scores given by position key. The file is replaced at once, so processes that have
+        the old table mapped keep reading it."""
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(PositionTable.HEADER.pack(PositionTable.MAGIC, PositionTable.VERSION, width, height, length,
+                                                 len(scores)))
+            for key in sorted(scores):
+                file.write(PositionTable.RECORD.pack(key, scores[key]))
+        os.replace(temporary_path, path)
+
+
+# tables opened so far by path, a missing table is looked for again on the next call, as it may be generated meanwhile
+_open_tables = {}
+_open_tables_lock = Lock()
+
+
+def open_table(path=DEFAULT_TABLE_PATH):
+    """Returns the table at the given path, mapped once per process, or None if there is no table. Raises
+    `PositionTable.InvalidFile` if the file isn't a position table."""
+    with _open_tables_lock:
+        if path not in _open_tables:
+            if not os.path.exists(path):
+                return None
+            _open_tables[path] = PositionTable(path)
+        return _open_tables[path]
+
+
+def best_move(game, table=None, endgame_cells=12, solver=None):
+    """Returns the location of the best move of the player whose turn it is along with its score, or None if the score
+    of any move isn't known. Of moves with the same score, the most central one is picked."""
+    return best_move_in(Position.from_game(game), table, endgame_cells, solver)
+
+
+def best_move_in(position, table=None, endgame_cells=12, solver=None):
+    """Returns the best move of the position like `best_move`, so the position can be taken while the game is locked
+    and solved after."""
+    scores = (solver or Solver()).analyse(position, table, endgame_cells)
+    if not scores:
+        return None
+    column = max(scores, key=lambda x: (scores[x], -abs(2 * x - position.width + 1)))
+    return (column, position.row(column)), scores[column]
+
+
+def positions_up_to(plies, width=7, height=6, length=4):
+    """Returns the positions reached after up to the given number of moves in which no one has won yet, one of each
+    position and its mirror image."""
+    positions = {}
+    frontier = [Position(width, height, length)]
+    for ply in range(plies + 1):
+        following = []
+        for position in frontier:
+            key = position.key()
+            if key in positions:
+                continue
+            positions[key] = position
+            if ply < plies:
+                following += [position.play(x) for x in range(width)
+                              if position.can_play(x) and not position.is_winning_move(x)]
+        frontier = following
+    return list(positions.values())
+
+
+def _solve_position(position):
+    return position.key(), Solver().solve(position)
+
+
+def generate_table(path, plies, width=7, height=6, length=4, workers=None):
+    """Solves all positions up to the given number of moves with one process per core and writes them to a table."""
+    positions = positions_up_to(plies, width, height, length)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        scores = dict(executor.map(_solve_position, positions, chunksize=1))
+    PositionTable.write(path, width, height, length, scores)
+    return len(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help='file to write the table to')
+    parser.add_argument('--plies', type=int, default=4, help='number of moves up to which positions are solved')
+    parser.add_argument('--width', type=int, default=7)
+    parser.add_argument('--height', type=int, default=6)
+    parser.add_argument('--length', type=int, default=4, help='winning row length')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+    count = generate_table(args.path, args.plies, args.width, args.height, args.length, args.workers)
+    print(f'Solved {count} positions.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,40 @@
-from unittest import TestCase, main
+from unittest import TestCase, main, skipIf
+import asyncio
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import jsonschema
 from four_in_a_row_online.game_logic.data import *
 from four_in_a_row_online.game_logic.logic import *
+from four_in_a_row_online.game_logic.bots import *
+from four_in_a_row_online.game_logic import solver
+from four_in_a_row_online.backend.bot_moves import BotMoveExecutor
+from four_in_a_row_online.backend.cluster import ClusterNode, HashRing, LoopbackBus
+from four_in_a_row_online.backend.lobby_index import LobbyIndex
+from four_in_a_row_online.backend.lobby_registry import LobbyRegistry
+from four_in_a_row_online.backend.outbox import Outbox
+from four_in_a_row_online.backend.room_senders import QueuedSender
+from four_in_a_row_online.backend.timer_wheel import TimerWheel
+from four_in_a_row_online.backend import request_schema, validation
+from four_in_a_row_online.tools import self_play
 from four_in_a_row_online.data import cards
 
+# the servers need Flask and the socketio packages of their async modes
+try:
+    from four_in_a_row_online.backend.server import RequestHandler
+except ImportError:
+    RequestHandler = None
+try:
+    from four_in_a_row_online.backend.async_server import AsyncServer
+except ImportError:
+    AsyncServer = None
+
 
 class TestData(TestCase):
     def test_token_style(self):
@@ -40,8 +72,43 @@ class TestData(TestCase):
             self.assertNotEqual(ts, TokenStyle.unique_random(random_token_styles))
             self.assertEqual(ts, ts)
 
+    def test_palette(self):
+        palette = Palette()
+        token_styles = []
+        with self.assertRaises(Palette.Exhausted):
+            while True:
+                token_styles.append(palette.allocate(random.randrange(len(Palette.candidates()))))
+        self.assertEqual(len(token_styles), len(palette))
+        self.assertGreater(len(token_styles), 16)
+        for a in token_styles:
+            for b in token_styles:
+                self.assertTrue(a is b or TokenStyle.distinguishable(a, b))
+
+        # the same candidates are picked in the same order
+        a, b = Palette(), Palette()
+        self.assertEqual([a.allocate(i).color for i in range(20)], [b.allocate(i).color for i in range(20)])
+        self.assertEqual(Palette().allocate(5).color, Palette.candidates()[5])
+
+        # the index agrees with comparing colors one by one
+        palette = Palette([TokenStyle.random_init() for _ in range(40)] + [TokenStyle((10, 20, 30))])
+        styles = [x for styles in palette._cells.values() for x in styles] + palette._others
+        for _ in range(200):
+            token_style = TokenStyle.random_init()
+            self.assertEqual(all(TokenStyle.distinguishable(token_style, x) for x in styles),
+                             palette.is_distinguishable(token_style))
+
+        # removed colors can be picked again
+        palette = Palette()
+        token_style = palette.allocate()
+        self.assertFalse(palette.is_distinguishable(token_style))
+        palette.remove(token_style)
+        self.assertTrue(palette.is_distinguishable(token_style))
+        self.assertEqual(token_style.color, palette.allocate().color)
+        self.assertEqual(1, len(palette))
+
     def test_rules(self):
-        self.assertEqual(len(Rules.default_init().__dict__), len(RulesData.data_fields))
+        self.assertEqual(len(Rules.default_init()._items()), len(RulesData.data_fields))
+        self.assertFalse(hasattr(Rules.default_init(), '__dict__'))
         self.assertEqual(len(RulesData.defaults), len(RulesData.randomization))
         rules = [Rules.random_init() for _ in range(8)]
 
@@ -53,7 +120,8 @@ class TestData(TestCase):
             self.assertEqual(r.variable_player_count, r.number_of_players is None)
 
     def test_card_deck(self):
-        self.assertEqual(len(CardDeck.default_init().__dict__), len(CardDeckData.data_fields))
+        self.assertEqual(len(CardDeck.default_init()._items()), len(CardDeckData.data_fields))
+        self.assertFalse(hasattr(CardDeck.default_init(), '__dict__'))
         self.assertEqual(len(CardDeckData.defaults), len(CardDeckData.randomization))
         card_decks = [CardDeck.random_init() for _ in range(8)]
 
@@ -64,7 +132,7 @@ class TestData(TestCase):
 
         cd = card_decks[0]
         for card in cards.SkipNextTurn, cards.ReverseTurnOrder, cards.ShuffleTurnOrder:
-            self.assertIsNotNone(cd.__dict__.get(card.__name__, None))
+            self.assertIsNotNone(getattr(cd, card.__name__, None))
 
     def test_cards(self):
         host = Player.default_init()
@@ -84,7 +152,8 @@ class TestData(TestCase):
         cards.ShuffleTurnOrder.play(game=game)
 
     def test_player(self):
-        self.assertEqual(len(Player.default_init().__dict__), len(PlayerData.data_fields))
+        self.assertEqual(len(Player.default_init()._items()), len(PlayerData.data_fields))
+        self.assertFalse(hasattr(Player.default_init(), '__dict__'))
         self.assertEqual(len(PlayerData.defaults), len(PlayerData.randomization))
         players = [Player.random_init() for _ in range(16)]
 
@@ -94,9 +163,34 @@ class TestData(TestCase):
             self.assertEqual(p, p)
 
     def test_play_field(self):
+        self.check_play_field(PlayField)
+
+    def test_bit_board_play_field(self):
+        self.check_play_field(BitBoardPlayField)
+
+        # compare the winning rows of both implementations on randomly filled play fields
+        for _ in range(200):
+            rules = Rules.random_init()
+            rules.enable_gravity = False
+            rules.field_has_bounds = True
+            players = [Player.random_init() for _ in range(3)]
+            play_field = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+            bit_board = BitBoardPlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+            for x in range(rules.play_field_width):
+                for y in range(rules.play_field_height):
+                    if random.random() < .8:
+                        player = random.choice(players)
+                        play_field.place_token(rules, player, loc_x=x, loc_y=y)
+                        bit_board.place_token(rules, player, loc_x=x, loc_y=y)
+            self.assertEqual(play_field.json(), bit_board.json())
+            for player in players:
+                self.assertEqual(play_field._check_for_winning_rows(rules, player),
+                                 bit_board._check_for_winning_rows(rules, player))
+
+    def check_play_field(self, play_field_class):
         rules = Rules.default_init()
 
-        four_x_four = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        four_x_four = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
         p1, p2 = Player.random_init(), Player.random_init()
         print(f'Player 1: {p1}\t Player 2:{p2}')
 
@@ -148,14 +242,15 @@ class TestData(TestCase):
         print(f'Winning rows for above field: {winning_rows}')
 
         # test bottom to top
-        four_x_four.place_token(rules, player=p2, loc_y=4, loc_x=0)
+        self.assertEqual([(0, 1), (0, 2), (0, 3), (0, 4)],
+                         four_x_four.place_token(rules, player=p2, loc_y=4, loc_x=0))
         print(four_x_four.pretty_print())
         winning_rows = four_x_four._check_for_winning_rows(rules, p2)
         print(f'Winning rows for above field: {winning_rows}')
         self.assertEqual([(0, 1), (0, 2), (0, 3), (0, 4)], winning_rows)
 
         # test diagonal bottom right to top left
-        four_x_four = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        four_x_four = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
         four_x_four.place_token(rules, p2, loc_x=1, loc_y=4)
         four_x_four.place_token(rules, p2, loc_x=2, loc_y=3)
         four_x_four.place_token(rules, p2, loc_x=3, loc_y=2)
@@ -167,7 +262,7 @@ class TestData(TestCase):
         self.assertEqual([(4, 1), (3, 2), (2, 3), (1, 4)], winning_rows)
 
         # test left to right
-        four_x_four = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        four_x_four = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
         y = rules.play_field_height - 1
         four_x_four.place_token(rules, p2, loc_x=6, loc_y=y)
         four_x_four.place_token(rules, p2, loc_x=3, loc_y=y)
@@ -180,7 +275,7 @@ class TestData(TestCase):
         self.assertEqual([(3, y), (4, y), (5, y), (6, y)], winning_rows)
 
         # test diagonal bottom left to top right
-        four_x_four = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        four_x_four = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
         four_x_four.place_token(rules, p2, loc_x=0, loc_y=2)
         four_x_four.place_token(rules, p2, loc_x=1, loc_y=3)
         four_x_four.place_token(rules, p2, loc_x=2, loc_y=4)
@@ -193,7 +288,7 @@ class TestData(TestCase):
 
         # test full field
 
-        four_x_four = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        four_x_four = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
         field = ''' o#ooo#o
                     #o#o#o#
                     o#o#o#o
@@ -215,6 +310,253 @@ class TestData(TestCase):
         print(f'Winning rows for above field for player o: {winning_rows}')
         self.assertEqual([(4, 2), (3, 3), (2, 4), (1, 5)], winning_rows)
 
+    def test_winning_row_of_last_token(self):
+        # the row returned for the last token has to match the one found by scanning the whole play field
+        for play_field_class in PlayField, BitBoardPlayField:
+            for _ in range(100):
+                rules = Rules.random_init()
+                rules.field_has_bounds = True
+                rules.enable_gravity = False
+                players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(3)]
+                play_field = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
+                cells = [(x, y) for x in range(rules.play_field_width) for y in range(rules.play_field_height)]
+                random.shuffle(cells)
+                for turn, (x, y) in enumerate(cells):
+                    player = players[turn % len(players)]
+                    winning_row = play_field.place_token(rules, player, loc_x=x, loc_y=y)
+                    self.assertEqual(play_field._check_for_winning_rows(rules, player), winning_row)
+                    if winning_row:
+                        self.assertIn((x, y), winning_row)
+                        break
+
+    def test_drop_token(self):
+        rules = Rules.default_init()
+        width, height = rules.play_field_width, rules.play_field_height
+        p1, p2 = Player(name='player 1', token_style=TokenStyle.default_init()), Player.random_init()
+        for play_field_class in PlayField, BitBoardPlayField:
+            play_field = play_field_class(dimensions=(width, height))
+            self.assertEqual(list(range(width)), list(play_field.legal_columns()))
+
+            for y in range(height):
+                self.assertEqual(y, play_field.column_height(2))
+                play_field.drop_token(rules, p1 if y % 2 else p2, 2)
+                self.assertIs(play_field.get_field(2, y).occupation, p1 if y % 2 else p2)
+            self.assertNotIn(2, list(play_field.legal_columns()))
+            with self.assertRaises(PlayField.IllegalTokenLocation):
+                play_field.drop_token(rules, p1, 2)
+            with self.assertRaises(PlayField.IllegalTokenLocation):
+                play_field.drop_token(rules, p1, width)
+
+            play_field.remove_token(2, height - 1)
+            self.assertEqual(height - 1, play_field.column_height(2))
+            self.assertIn(2, list(play_field.legal_columns()))
+
+            for _ in range(rules.winning_row_length - 1):
+                self.assertIsNone(play_field.drop_token(rules, p1, 0))
+            self.assertEqual([(0, y) for y in range(rules.winning_row_length)], play_field.drop_token(rules, p1, 0))
+
+    def test_sparse_play_field(self):
+        rules = Rules.default_init()
+        rules.field_has_bounds = False
+        p1, p2 = Player(name='player 1', token_style=TokenStyle.default_init()), Player.random_init()
+        play_field = SparsePlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+
+        # tokens with gravity have to rest on the ground or on top of other tokens, but columns are unbounded
+        with self.assertRaises(PlayField.IllegalTokenLocation):
+            play_field.place_token(rules, p1, loc_x=-3, loc_y=1)
+        for x in range(-10 ** 6, -10 ** 6 + rules.winning_row_length - 1):
+            self.assertIsNone(play_field.drop_token(rules, p1, x))
+        self.assertEqual([(x, 0) for x in range(-10 ** 6, -10 ** 6 + rules.winning_row_length)],
+                         play_field.drop_token(rules, p1, -10 ** 6 + rules.winning_row_length - 1))
+        with self.assertRaises(PlayField.IllegalTokenLocation):
+            play_field.place_token(rules, p2, loc_x=-10 ** 6, loc_y=0)
+        self.assertEqual(rules.winning_row_length, len(play_field.json()["fields"]))
+
+        # without gravity rows may be anywhere, even far apart from each other
+        rules.enable_gravity = False
+        play_field = SparsePlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+        for i in range(rules.winning_row_length - 1):
+            self.assertIsNone(play_field.place_token(rules, p2, loc_x=10 ** 9 - i, loc_y=-10 ** 9 + i))
+            self.assertIsNone(play_field.place_token(rules, p1, loc_x=i, loc_y=i))
+        play_field.remove_token(0, 0)
+        self.assertIsNone(play_field.place_token(rules, p2, loc_x=0, loc_y=0))
+        winning_row = play_field.place_token(rules, p2, loc_x=10 ** 9 - rules.winning_row_length + 1,
+                                             loc_y=-10 ** 9 + rules.winning_row_length - 1)
+        self.assertEqual(winning_row, play_field._check_for_winning_rows(rules, p2))
+        self.assertEqual((10 ** 9, -10 ** 9), winning_row[0])
+        self.assertIsNone(play_field._check_for_winning_rows(rules, p1))
+
+    def test_winning_lines(self):
+        rules = Rules.default_init()
+        self.assertIs(WinningLines.of(7, 6, 4), WinningLines.of(7, 6, 4))
+        # 24 horizontal, 21 vertical and 2 * 12 diagonal lines
+        self.assertEqual(69, len(WinningLines.of(7, 6, 4).lines))
+        self.assertEqual(0, len(WinningLines.of(3, 3, 4).lines))
+
+        rules.enable_gravity = False
+        players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(3)]
+        for _ in range(20):
+            rules.play_field_width, rules.play_field_height = random.randrange(2, 10), random.randrange(2, 10)
+            rules.winning_row_length = random.randrange(2, 6)
+            play_field = PlayField(dimensions=(rules.play_field_width, rules.play_field_height))
+            lines = play_field.winning_lines(rules)
+            for _ in range(60):
+                x, y = random.randrange(rules.play_field_width), random.randrange(rules.play_field_height)
+                if play_field.get_field(x, y).occupation is None:
+                    play_field.place_token(rules, random.choice(players), loc_x=x, loc_y=y)
+                else:
+                    play_field.remove_token(x, y)
+
+                # compare the counters against the tokens on the lines
+                for line_index, line in enumerate(lines.lines):
+                    occupations = [play_field.get_field(*location).occupation for location in line]
+                    for player in players:
+                        self.assertEqual(occupations.count(player), play_field.line_count(rules, player, line_index))
+                    self.assertEqual(len(set(occupations) - {None}) > 1, play_field.is_dead_line(rules, line_index))
+                for player in players:
+                    threats = set(play_field.threats(rules, player))
+                    for location in threats:
+                        self.assertTrue(play_field.is_winning_move(rules, player, *location))
+                        play_field.place_token(rules, player, *location)
+                        self.assertIsNotNone(play_field._check_for_winning_rows(rules, player))
+                        play_field.remove_token(*location)
+
+    def test_play_field_equality(self):
+        rules = Rules.default_init()
+        players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(2)]
+        play_fields = [PlayField((7, 6)), BitBoardPlayField((7, 6)), SparsePlayField((7, 6))]
+        for play_field in play_fields:
+            play_field.drop_token(rules, players[0], 3)
+            play_field.drop_token(rules, players[1], 3)
+            self.assertEqual(play_fields[0], play_field)
+
+        other = PlayField((7, 6))
+        other.drop_token(rules, players[1], 3)
+        other.drop_token(rules, players[0], 3)
+        self.assertNotEqual(play_fields[0], other)
+        other.remove_token(3, 1)
+        other.remove_token(3, 0)
+        self.assertEqual(PlayField((7, 6)), other)
+        self.assertNotEqual(PlayField((6, 7)), other)
+
+    def test_line_counters(self):
+        rules = Rules.default_init()
+        rules.enable_gravity = False
+        players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(3)]
+        for _ in range(20):
+            rules.play_field_width, rules.play_field_height = random.randrange(2, 10), random.randrange(2, 10)
+            rules.winning_row_length = random.randrange(2, 6)
+            dimensions = (rules.play_field_width, rules.play_field_height)
+            play_fields = [PlayField(dimensions), BitBoardPlayField(dimensions), SparsePlayField(dimensions)]
+            for index in range(60):
+                x, y = random.randrange(rules.play_field_width), random.randrange(rules.play_field_height)
+                for play_field in play_fields:
+                    if play_field.get_field(x, y).occupation is None:
+                        play_field.place_token(rules, random.Random(index).choice(players), loc_x=x, loc_y=y)
+                    else:
+                        play_field.remove_token(x, y)
+                if index % 10 == 9:
+                    # start counting with tokens on the play field
+                    rules.winning_row_length = random.randrange(2, 6)
+
+                reference, bit_board, sparse = play_fields
+                for play_field in bit_board, sparse:
+                    for player in players:
+                        # play fields without bounds have lines leaving the area of the others
+                        threats = {(x, y) for x, y in play_field.threats(rules, player)
+                                   if 0 <= x < rules.play_field_width and 0 <= y < rules.play_field_height}
+                        self.assertEqual(set(reference.threats(rules, player)), threats)
+                        for x, y in reference.empty_cells():
+                            self.assertEqual(reference.is_winning_move(rules, player, x, y),
+                                             play_field.is_winning_move(rules, player, x, y))
+                self.assertEqual(sorted((p.name, count) for p, count in reference.open_lines(rules)),
+                                 sorted((p.name, count) for p, count in bit_board.open_lines(rules)))
+
+        # lines of play fields without bounds are identified by their locations
+        play_field = SparsePlayField((1, 1))
+        rules.winning_row_length = 3
+        play_field.place_token(rules, players[0], loc_x=-5, loc_y=7)
+        play_field.place_token(rules, players[0], loc_x=-4, loc_y=7)
+        play_field.place_token(rules, players[1], loc_x=-5, loc_y=8)
+        self.assertEqual({(-6, 7), (-3, 7)}, set(play_field.threats(rules, players[0])))
+        line = ((-5, 7), (-5, 8), (-5, 9))
+        self.assertIn(line, play_field.winning_lines(rules).lines_through(-5, 9))
+        self.assertEqual(1, play_field.line_count(rules, players[1], line))
+        self.assertTrue(play_field.is_dead_line(rules, line))
+        play_field.remove_token(-5, 8)
+        self.assertFalse(play_field.is_dead_line(rules, line))
+        self.assertEqual(0, play_field.line_count(rules, players[1], line))
+
+    def test_move_stack(self):
+        def state(play_field):
+            if isinstance(play_field, SparsePlayField):
+                return (sorted(map(str, play_field.json()["fields"])), dict(play_field._column_heights),
+                        play_field.position_hash)
+            lines = play_field._line_counts if getattr(play_field, '_winning_lines', None) is not None else {}
+            return (play_field.json(), list(play_field._column_heights), play_field.position_hash,
+                    {player: list(counts) for player, counts in lines.items() if any(counts)})
+
+        rules = Rules.default_init()
+        players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(3)]
+        for play_field_class in PlayField, BitBoardPlayField, SparsePlayField:
+            for enable_gravity in True, False:
+                rules.enable_gravity = enable_gravity
+                play_field = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
+                states = [state(play_field)]
+                for turn in range(200):
+                    if play_field.move_count and random.random() < .4:
+                        play_field.pop_move()
+                        states.pop()
+                        self.assertEqual(states[-1], state(play_field))
+                        continue
+                    if enable_gravity:
+                        column = random.choice(list(play_field.legal_columns()) or [None])
+                        if column is None:
+                            continue
+                        location = column, play_field.column_height(column)
+                    else:
+                        location = random.randrange(rules.play_field_width), random.randrange(rules.play_field_height)
+                    try:
+                        winning_row = play_field.push_move(rules, players[turn % len(players)], *location)
+                    except PlayField.IllegalTokenLocation:
+                        continue
+                    if winning_row:
+                        self.assertIn(location, winning_row)
+                    states.append(state(play_field))
+                    self.assertEqual(len(states) - 1, play_field.move_count)
+
+                while play_field.move_count:
+                    play_field.pop_move()
+                    states.pop()
+                    self.assertEqual(states[-1], state(play_field))
+                with self.assertRaises(IndexError):
+                    play_field.pop_move()
+
+    def test_position_hash(self):
+        rules = Rules.default_init()
+        rules.enable_gravity = False
+        players = [Player(name=f'player {i}', token_style=TokenStyle.random_init()) for i in range(3)]
+        cells = [(x, y) for x in range(rules.play_field_width) for y in range(rules.play_field_height)]
+        hashes = {}
+        for _ in range(50):
+            tokens = [(random.choice(players), cell) for cell in random.sample(cells, random.randrange(len(cells)))]
+            for play_field_class in PlayField, BitBoardPlayField, SparsePlayField:
+                play_field = play_field_class(dimensions=(rules.play_field_width, rules.play_field_height))
+                # register the players in the same order, then place the tokens in any order
+                for index, player in enumerate(players):
+                    play_field.place_token(rules, player, loc_x=index, loc_y=rules.play_field_height - 1)
+                for index in range(len(players)):
+                    play_field.remove_token(index, rules.play_field_height - 1)
+                self.assertEqual(0, play_field.position_hash)
+                for player, (x, y) in random.sample(tokens, len(tokens)):
+                    play_field.place_token(rules, player, loc_x=x, loc_y=y)
+
+                position = play_field_class is SparsePlayField, str(sorted((players.index(p), c) for p, c in tokens))
+                self.assertEqual(hashes.setdefault(position, play_field.position_hash), play_field.position_hash)
+        self.assertEqual(len(hashes), len({(sparse, value) for (sparse, _), value in hashes.items()}))
+        self.assertIs(zobrist_keys(7, 6, 2), zobrist_keys(7, 6, 2))
+        self.assertEqual(zobrist_keys(7, 6, 2), zobrist_keys(7, 6, 3)[:2])
+
     def test_field(self):
         """Is there even anything to test here? Probably not…"""
         pass
@@ -223,14 +565,13 @@ class TestData(TestCase):
 class TestGameLogic(TestCase):
     def test_basic_game_creation(self):
         card_deck = CardDeck(
-            card_shuffle_turn_order=True,
-            card_reverse_turn_order=True,
-            card_skip_next_turn=True,
-            card_placing_cooldown=True,
+            ShuffleTurnOrder=True,
+            ReverseTurnOrder=True,
+            SkipNextTurn=True,
         )
 
         rules = Rules.default_init()
-        rules.__dict__.update({
+        for field, value in {
             "shuffle_turn_order_on_start": True,
             "enable_chat": True,
             "finish_game_on_disconnect": True,
@@ -246,7 +587,8 @@ class TestGameLogic(TestCase):
             "play_field_width": 3,
             "play_field_height": 2,
             "enable_gravity": True
-        })
+        }.items():
+            setattr(rules, field, value)
 
         player_host = Player(name='im the host',
                              token_style=TokenStyle(color=(253, 3, 5), ))  # img_src=None))
@@ -268,6 +610,1083 @@ class TestGameLogic(TestCase):
         # with self.assertRaises(Game.LobbyFull):
         #    game.player_join(Player.unique_random(game.participants))
 
+    def test_snapshot(self):
+        players = [Player('a', TokenStyle.default_init()), Player('b', TokenStyle((0, 255, 0, 255)))]
+        game = Game('snapshot game', Rules.default_init(), CardDeck.default_init(), players)
+        etag, encoded = game.snapshot()
+        self.assertEqual(game.json()[game.slug]['name'], json.loads(encoded)[game.slug]['name'])
+        # the snapshot is kept as long as the game doesn't change
+        self.assertIs(encoded, game.snapshot()[1])
+
+        for change in [game.start_game, lambda: game.drop_token(players[0], 3), game.next_turn,
+                       lambda: CardDeck.place_card(cards.ShuffleTurnOrder, game=game),
+                       lambda: cards.ReverseTurnOrder.play(game=game), game.touch, game.finish_game]:
+            version, previous = game.version, encoded
+            change()
+            self.assertGreater(game.version, version)
+            etag, encoded = game.snapshot()
+            self.assertIsNot(previous, encoded)
+        # the ETag only depends on the json
+        self.assertEqual(etag, game.snapshot()[0])
+        game.touch()
+        self.assertEqual(etag, game.snapshot()[0])
+        self.assertEqual(json.loads(encoded)[game.slug]['game_state'], str(Game.State.finished))
+
+    def test_state(self):
+        for has_bounds in True, False:
+            rules = Rules.default_init()
+            rules.field_has_bounds = has_bounds
+            players = [Player('a', TokenStyle.default_init()), Player('b', TokenStyle((0, 255, 0, 255)))]
+            game = Game('state game', rules, CardDeck.default_init(), players)
+            game.start_game()
+            for column in 3, 3, 4, -2 if not has_bounds else 0:
+                game.drop_token(game.participants[game.current_turn], column)
+
+            # the state is plain data and makes the same game again
+            state = json.loads(json.dumps(game.state()))
+            copy = Game.from_state(state, {player.name: player for player in players})
+            self.assertEqual(game.state(), copy.state())
+            self.assertIs(players[game.current_turn], copy.participants[copy.current_turn])
+            copy.drop_token(players[0], 3)
+            self.assertIs(players[0], copy.play_field.get_field(3, 2).occupation)
+
+
+
+class TestBots(TestCase):
+    @staticmethod
+    def make_game(rules, players):
+        game = Game('bot game', rules, CardDeck.default_init(), players)
+        game.start_game()
+        return game
+
+    def test_alpha_beta_takes_and_blocks_wins(self):
+        rules = Rules.default_init()
+        bot = Bot('bot', TokenStyle.default_init(), AlphaBetaStrategy(time_budget=.5))
+        human = Player('human', TokenStyle((0, 255, 0, 255)))
+
+        # the bot completes its own row instead of blocking the human's row
+        game = self.make_game(rules, [bot, human])
+        for column in 0, 6, 0, 6, 0, 6:
+            game.drop_token(game.participants[game.current_turn], column)
+        self.assertEqual((0, 3), bot.choose_move(game))
+        self.assertTrue(bot.play(game))
+        self.assertIs(Game.State.finished, game.game_state)
+
+        # the bot blocks the human's row
+        game = self.make_game(rules, [human, bot])
+        for column in 3, 0, 4, 0:
+            game.drop_token(game.participants[game.current_turn], column)
+        game.drop_token(human, 5)
+        self.assertIn(bot.choose_move(game), [(2, 0), (6, 0)])
+
+    def test_alpha_beta_depth(self):
+        # with gravity only a few moves are legal, but the game may last as many moves as there are empty cells
+        rules = Rules.default_init()
+        bots = [Bot(f'bot {i}', TokenStyle.random_init()) for i in range(2)]
+        game = self.make_game(rules, bots)
+        for column in 3, 3:
+            game.drop_token(game.participants[game.current_turn], column)
+        play_field = copy_play_field(game)
+        self.assertEqual(7 * 6 - 2, AlphaBetaStrategy()._max_depth(play_field))
+        self.assertEqual(3, AlphaBetaStrategy(max_depth=3)._max_depth(play_field))
+
+    def test_alpha_beta_table(self):
+        # the transposition table is kept between searches of the same game, but not for other rules
+        strategy = AlphaBetaStrategy(time_budget=.05)
+        bots = [Bot(f'bot {i}', TokenStyle.random_init(), strategy) for i in range(2)]
+        rules = Rules.default_init()
+        game = self.make_game(rules, bots)
+        play_field = copy_play_field(game)
+        for change in ('winning_row_length', 3), ('enable_gravity', False), ('field_has_bounds', False):
+            search = strategy._start_search(play_field, rules, bots, bots[0], time.monotonic() + .05)
+            strategy._deepen(search, legal_moves(play_field, rules), 0)
+            self.assertTrue(strategy._transposition_table)
+            strategy._start_search(play_field, rules, bots, bots[0], time.monotonic() + .05)
+            self.assertTrue(strategy._transposition_table)
+
+            other_rules = Rules(**rules.json())
+            setattr(other_rules, *change)
+            strategy._start_search(play_field, other_rules, bots, bots[0], time.monotonic() + .05)
+            self.assertFalse(strategy._transposition_table)
+
+        # the oldest entry is dropped once the table is full
+        strategy = AlphaBetaStrategy(transposition_table_size=2)
+        search = strategy._start_search(play_field, rules, bots, bots[0], time.monotonic() + .05)
+        for key in 'abc':
+            search.store(key, 1, AlphaBetaStrategy.EXACT, 0, (0, 0), 0)
+        self.assertEqual(['b', 'c'], list(strategy._transposition_table))
+
+        # wins and losses are stored counted from their position, so they hold when it's reached at another ply
+        win = AlphaBetaStrategy.WIN
+        search.store('b', 4, AlphaBetaStrategy.EXACT, win - 5, (0, 0), 3)
+        search.store('c', 4, AlphaBetaStrategy.EXACT, 5 - win, (0, 0), 3)
+        self.assertEqual((4, AlphaBetaStrategy.EXACT, win - 3, (0, 0)), search.probe('b', 1))
+        self.assertEqual((4, AlphaBetaStrategy.EXACT, 3 - win, (0, 0)), search.probe('c', 1))
+        self.assertIsNone(search.probe('a', 1))
+
+    def test_alpha_beta_games(self):
+        for _ in range(4):
+            rules = Rules.random_init()
+            rules.play_field_width, rules.play_field_height = random.randrange(2, 8), random.randrange(2, 8)
+            rules.winning_row_length = random.randrange(2, 5)
+            rules.finish_game_on_win = True
+            bots = [Bot(f'bot {i}', TokenStyle.random_init(), AlphaBetaStrategy(time_budget=.05)) for i in range(3)]
+            game = self.make_game(rules, bots)
+            for _ in range(rules.play_field_width * rules.play_field_height):
+                start = time.monotonic()
+                bots[game.current_turn].play(game)
+                # the time budget is checked every few nodes only
+                self.assertLess(time.monotonic() - start, .5)
+                if game.game_state == Game.State.finished:
+                    self.assertIn(game.winner, bots)
+                    break
+            if game.game_state != Game.State.finished and rules.field_has_bounds:
+                with self.assertRaises(Strategy.NoMoveLeft):
+                    bots[game.current_turn].choose_move(game)
+
+    def test_parallel_alpha_beta(self):
+        rules = Rules.default_init()
+        bot = Bot('bot', TokenStyle.default_init(), ParallelAlphaBetaStrategy(time_budget=.5, workers=2))
+        human = Player('human', TokenStyle((0, 255, 0, 255)))
+
+        game = self.make_game(rules, [bot, human])
+        for column in 0, 6, 0, 6, 0, 6:
+            game.drop_token(game.participants[game.current_turn], column)
+        self.assertEqual((0, 3), bot.choose_move(game))
+
+        game = self.make_game(rules, [human, bot])
+        for column in 3, 0, 4, 0, 5:
+            game.drop_token(game.participants[game.current_turn], column)
+        start = time.monotonic()
+        self.assertIn(bot.choose_move(game), [(2, 0), (6, 0)])
+        self.assertLess(time.monotonic() - start, 1.)
+        # the workers are reused for every search
+        self.assertIs(process_pool(), process_pool())
+
+        # the deepest iteration finished by every worker decides, ties go to the move ordered first
+        ordered = [(3, 0), (2, 0), (4, 0)]
+        self.assertEqual((2, 0), ParallelAlphaBetaStrategy.merge(ordered, [[(1, (3, 0)), (5, (3, 0))],
+                                                                          [(2, (2, 0))], []]))
+        self.assertEqual((3, 0), ParallelAlphaBetaStrategy.merge(ordered, [[(2, (3, 0))], [(2, (2, 0))]]))
+        self.assertEqual((4, 0), ParallelAlphaBetaStrategy.merge(ordered, [[(1, (3, 0))], [(0, (2, 0))],
+                                                                          [(AlphaBetaStrategy.WIN, (4, 0))]]))
+        self.assertEqual((3, 0), ParallelAlphaBetaStrategy.merge(ordered, [[], []]))
+        # a win proven by a worker beats a better score of a worker that hasn't searched as deep
+        win = AlphaBetaStrategy.WIN
+        self.assertEqual((0, 0), ParallelAlphaBetaStrategy.merge(
+            [(0, 0), (1, 0)], [[(0, (0, 0)), (-5, (0, 0)), (-5, (0, 0)), (win - 4, (0, 0))],
+                               [(10, (1, 0)), (20, (1, 0))]]))
+
+    def test_mcts(self):
+        rules = Rules.default_init()
+        rules.number_of_players = 3
+        bots = [Bot(f'bot {i}', TokenStyle.random_init(), MCTSStrategy(time_budget=.2, max_nodes=500)) for i in range(3)]
+
+        # the bot completes its row
+        game = self.make_game(rules, bots)
+        for column in 0, 6, 5, 0, 6, 5, 0, 6, 4:
+            game.drop_token(game.participants[game.current_turn], column)
+        self.assertEqual((0, 3), bots[0].choose_move(game))
+        self.assertLessEqual(bots[0].strategy._pool.count, 500)
+
+        # the subtree of the position reached is found again for the next search
+        game = self.make_game(rules, bots)
+        strategy = bots[0].strategy
+        strategy.time_budget = 1
+        bots[0].play(game)
+        # let the others play the moves the bot looked at most
+        pool, node = strategy._pool, strategy._root
+        for bot in bots[1:]:
+            node = max(pool.children(node), key=lambda child: pool.visits[child])
+            game.place_token(bot, *pool.move[node])
+        node = strategy._pool.find(strategy._root, copy_play_field(game).position_hash, game.current_turn, 3)
+        self.assertNotEqual(-1, node)
+        visits = strategy._pool.visits[node]
+        bots[0].choose_move(game)
+        self.assertGreater(strategy._pool.visits[0], visits)
+
+        # games of several players with cards changing the turn order
+        for number_of_players in 3, 4:
+            rules = Rules.default_init()
+            rules.enable_cards = True
+            rules.card_placement_cooldown = 1
+            rules.number_of_players = number_of_players
+            bots = [Bot(f'bot {i}', TokenStyle.random_init(), MCTSStrategy(time_budget=.02, max_nodes=200))
+                    for i in range(number_of_players)]
+            game = self.make_game(rules, bots)
+            while game.game_state == Game.State.started and list(game.play_field.legal_columns()):
+                if random.random() < .2:
+                    random.choice([cards.ShuffleTurnOrder, cards.ReverseTurnOrder, cards.SkipNextTurn]).play(game=game)
+                game.participants[game.current_turn].play(game)
+                for bot in bots:
+                    self.assertLessEqual(bot.strategy._pool.count, 200)
+
+        # with a pool too small to expand the root, the bot plays a legal move
+        rules = Rules.default_init()
+        bots = [Bot(f'bot {i}', TokenStyle.random_init(), MCTSStrategy(time_budget=.01, max_nodes=1)) for i in range(2)]
+        game = self.make_game(rules, bots)
+        self.assertIn(bots[0].choose_move(game), legal_moves(game.play_field, rules))
+
+    def test_self_play(self):
+        rules = Rules.default_init()
+        rules.enable_cards = True
+        rules.card_placement_cooldown = 0
+        result = self_play.play_game(0, rules.json(), CardDeck.default_init().json(), ['alphabeta', 'mcts'],
+                                     time_budget=.01, card_probability=1., seed=1)
+        # a card is played before every move
+        self.assertEqual(result['moves'], sum(result['card_plays'].values()))
+        self.assertIn(result['winner_strategy'], ['alphabeta', 'mcts', None])
+
+        output = io.StringIO()
+        self.assertGreater(self_play.run(3, Rules.default_init(), CardDeck.default_init(), ['alphabeta'],
+                                         time_budget=.01, seed=2, workers=2, output=output), 0)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([0, 1, 2], sorted(r['game'] for r in results))
+        for result in results:
+            self.assertEqual({}, result['card_plays'])
+            self.assertLessEqual(result['moves'], 42)
+
+        self.assertEqual(5, self_play.changed(Rules.default_init(), {'winning_row_length': 5}).winning_row_length)
+        with self.assertRaises(ValueError):
+            self_play.changed(Rules.default_init(), {'winning_row': 5})
+
+
+class TestSolver(TestCase):
+    @staticmethod
+    def minimax(position):
+        """Scores a position by searching the whole game tree."""
+        cells = position.width * position.height
+        if position.moves == cells:
+            return 0
+        columns = [x for x in range(position.width) if position.can_play(x)]
+        if any(position.is_winning_move(x) for x in columns):
+            return (cells + 1 - position.moves) // 2
+        return max(-TestSolver.minimax(position.play(x)) for x in columns)
+
+    @staticmethod
+    def random_position(width, height, length, moves):
+        position = solver.Position(width, height, length)
+        for _ in range(moves):
+            columns = [x for x in range(width) if position.can_play(x) and not position.is_winning_move(x)]
+            if not columns:
+                break
+            position = position.play(random.choice(columns))
+        return position
+
+    def test_solve(self):
+        search = solver.Solver()
+        for width, height in (3, 3), (4, 3), (3, 4):
+            for _ in range(10):
+                position = self.random_position(width, height, 3, random.randrange(width * height // 2))
+                self.assertEqual(self.minimax(position), search.solve(position))
+
+        # the first player wins with the last token on a 4x4 field when rows of three win
+        self.assertEqual(4, search.solve(solver.Position(4, 4, 3)))
+        # the mirror image has the same key
+        position = solver.Position.from_columns([0, 1, 1], 4, 4, 3)
+        self.assertEqual(position.key(), solver.Position.from_columns([3, 2, 2], 4, 4, 3).key())
+        self.assertEqual(2, position.row(1))
+
+    def test_position_table(self):
+        positions = solver.positions_up_to(3, 4, 4, 3)
+        self.assertEqual(len(positions), len({p.key() for p in positions}))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'positions.bin')
+            self.assertEqual(len(positions), solver.generate_table(path, 3, 4, 4, 3, workers=2))
+            table = solver.PositionTable(path)
+            self.assertEqual(len(positions), len(table))
+            self.assertTrue(table.matches(positions[0]))
+            self.assertFalse(table.matches(solver.Position()))
+            search = solver.Solver()
+            for position in positions:
+                self.assertEqual(search.solve(position), table.get(position.key()))
+            self.assertIsNone(table.get(self.random_position(4, 4, 3, 8).key()))
+
+            # the bot plays from the table only
+            rules = Rules.default_init()
+            rules.play_field_width = rules.play_field_height = 4
+            rules.winning_row_length = 3
+            players = [Player('first', TokenStyle.default_init()), Player('second', TokenStyle((0, 255, 0, 255)))]
+            game = Game('solved game', rules, CardDeck.default_init(), players)
+            game.start_game()
+            game.drop_token(players[0], 0)
+            game.drop_token(players[1], 1)
+            location, score = solver.best_move(game, table, endgame_cells=0)
+            self.assertEqual(search.solve(solver.Position.from_columns([0, 1], 4, 4, 3)), score)
+            self.assertEqual(-table.get(solver.Position.from_columns([0, 1, location[0]], 4, 4, 3).key()), score)
+            self.assertEqual(location, SolverStrategy(table, endgame_cells=0).choose_move(game, players[0]))
+            # the position after the next move is not in the table
+            game.drop_token(players[0], 0)
+            self.assertIsNone(solver.best_move(game, table, endgame_cells=0))
+            table.close()
+
+            with open(path, 'wb') as file:
+                file.write(b'not a table')
+            with self.assertRaises(solver.PositionTable.InvalidFile):
+                solver.PositionTable(path)
+            open(path, 'wb').close()
+            with self.assertRaises(solver.PositionTable.InvalidFile):
+                solver.PositionTable(path)
+
+            # a missing table is looked for again, a table that was found is kept
+            path = os.path.join(directory, 'later.bin')
+            self.assertIsNone(solver.open_table(path))
+            solver.generate_table(path, 1, 4, 4, 3, workers=1)
+            table = solver.open_table(path)
+            self.assertIsNotNone(table)
+            self.assertIs(table, solver.open_table(path))
+
+    def test_solver_strategy(self):
+        rules = Rules.default_init()
+        players = [Player('human', TokenStyle((0, 255, 0, 255)))]
+        bot = Bot('bot', TokenStyle.default_init(), SolverStrategy(endgame_cells=12))
+        game = TestBots.make_game(rules, players + [bot])
+        # the opening is left to the fallback strategy without a table
+        bot.strategy.table = None
+        bot.strategy.fallback = AlphaBetaStrategy(time_budget=.05)
+        self.assertIsNone(solver.best_move(game, None))
+        self.assertIn(bot.choose_move(game), legal_moves(game.play_field, rules))
+
+        # the endgame is solved, only one of the moves left wins
+        for column in [4, 2, 6, 1, 5, 3, 0, 2, 3, 2, 2, 5, 4, 3, 6, 2, 6, 6, 2, 0, 6, 0, 0, 6, 3, 3, 5, 0, 3, 5, 0]:
+            game.drop_token(game.participants[game.current_turn], column)
+        self.assertIsNone(game.winner)
+        self.assertEqual({1: 2, 4: 0, 5: 4}, solver.Solver().analyse(solver.Position.from_game(game)))
+        self.assertEqual(4, solver.Solver().solve(solver.Position.from_game(game)))
+        self.assertEqual(((5, 4), 4), solver.best_move(game))
+        self.assertEqual((5, 4), bot.choose_move(game))
+
+
+
+class TestBotMoveExecutor(TestCase):
+    class WaitingStrategy(Strategy):
+        """Plays the first legal column once it is released."""
+
+        def __init__(self):
+            self.release = threading.Event()
+            self.games = []
+
+        def choose_move(self, game, bot):
+            self.games.append(game)
+            self.release.wait(5)
+            return legal_moves(game.play_field, game.rules)[0]
+
+    def test_executor(self):
+        rules = Rules.default_init()
+        strategy = self.WaitingStrategy()
+        bots = [Bot(f'bot {i}', TokenStyle.random_init(), strategy) for i in range(2)]
+        games = [TestBots.make_game(rules, bots) for _ in range(3)]
+        moves = []
+        executor = BotMoveExecutor(max_workers=1, max_queued=2)
+        on_move = lambda game, bot, location: moves.append((game, location))
+
+        executor.submit('lobby-a', games[0], bots[0], on_move)
+        executor.submit('lobby-b', games[1], bots[0], on_move)
+        self.assertEqual(2, executor.queue_depth)
+        with self.assertRaises(BotMoveExecutor.Saturated):
+            executor.submit('lobby-c', games[2], bots[0], on_move)
+        self.assertEqual(1, executor.rejected)
+
+        # the moves of a lobby are dropped when it is cancelled, the game of the other lobby changes meanwhile
+        self.assertEqual(1, executor.cancel('lobby-b'))
+        games[0].drop_token(bots[0], 3)
+        strategy.release.set()
+        # the callbacks run after the results are set
+        while executor.queue_depth:
+            time.sleep(.01)
+        self.assertEqual([], moves)
+
+        # moves are posted, the fallback strategy computes moves when the executor is saturated
+        executor.fallback = AlphaBetaStrategy(max_depth=1)
+        executor.max_queued = 0
+        self.assertIsNone(executor.submit('lobby-c', games[2], bots[0], on_move))
+        executor.max_queued = 1
+        executor.submit('lobby-b', games[1], bots[0], on_move).result()
+        executor.shutdown()
+        self.assertEqual([(games[2], (3, 0)), (games[1], (0, 0))], moves)
+
+    def test_stale_moves(self):
+        rules = Rules.default_init()
+        strategy = self.WaitingStrategy()
+        bots = [Bot(f'bot {i}', TokenStyle.random_init(), strategy) for i in range(2)]
+        game = TestBots.make_game(rules, bots)
+        moves = []
+        executor = BotMoveExecutor(max_workers=1)
+        future = executor.submit('lobby-a', game, bots[0], lambda game, bot, location: moves.append(location))
+
+        # it is the turn of the same bot again, but the board changed while its move was computed
+        game.drop_token(bots[0], 3)
+        game.drop_token(bots[1], 3)
+        self.assertIs(bots[0], game.participants[game.current_turn])
+        strategy.release.set()
+        future.result()
+        while executor.queue_depth:
+            time.sleep(.01)
+        executor.shutdown()
+        self.assertEqual([], moves)
+        # the bot searched a copy of the game as it was when the move was submitted
+        self.assertIsNot(game, strategy.games[0])
+        self.assertEqual(0, strategy.games[0].play_field.column_height(3))
+
+
+
+class TestLobbyIndex(TestCase):
+    @staticmethod
+    def make_lobby(index, width, cards_enabled, players):
+        rules = Rules.default_init()
+        rules.play_field_width, rules.enable_cards = width, cards_enabled
+        return SimpleNamespace(
+            lobby_slug=f'lobby-{index}', list_publicly=index % 5 != 0, next_rules=rules, max_number_of_players=4,
+            players_by_session={i: None for i in range(players)},
+            creation_time=datetime.datetime.fromtimestamp(1000 + index // 2))
+
+    def test_lobby_index(self):
+        index = LobbyIndex()
+        lobbies = [self.make_lobby(i, random.choice([7, 9]), random.random() < .5, random.randrange(5))
+                   for i in range(300)]
+        for lobby in lobbies:
+            index.update(lobby)
+        public = [lobby for lobby in lobbies if lobby.list_publicly]
+        self.assertEqual(len(public), len(index))
+
+        def listing(**filters):
+            result, cursor = [], None
+            while True:
+                page, cursor = index.page(limit=7, cursor=cursor, **filters)
+                self.assertLessEqual(len(page), 7)
+                result += page
+                if cursor is None:
+                    return [lobby.lobby_slug for lobby in result]
+
+        def expected(matches):
+            newest_first = sorted(public, key=lambda l: (-l.creation_time.timestamp(), l.lobby_slug))
+            return [lobby.lobby_slug for lobby in newest_first if matches(lobby)]
+
+        self.assertEqual(expected(lambda l: True), listing())
+        self.assertEqual(expected(lambda l: l.next_rules.play_field_width == 9 and l.next_rules.enable_cards),
+                         listing(width=9, cards_enabled=True))
+        self.assertEqual(expected(lambda l: len(l.players_by_session) <= 2), listing(min_free_seats=2))
+        self.assertEqual(expected(lambda l: 1030 < l.creation_time.timestamp() < 1100),
+                         listing(created_after=1030, created_before=1100))
+
+        # lobbies move between buckets when they change, and are dropped when removed or made private
+        lobby = public[0]
+        lobby.players_by_session = {i: None for i in range(4)}
+        index.update(lobby)
+        self.assertNotIn(lobby.lobby_slug, listing(min_free_seats=1))
+        index.remove(public[1].lobby_slug)
+        public[2].list_publicly = False
+        index.update(public[2])
+        self.assertEqual(len(public) - 2, len(listing()))
+
+        with self.assertRaises(LobbyIndex.InvalidCursor):
+            index.page(cursor='not a cursor')
+
+
+class TestLobbyRegistry(TestCase):
+    def test_lobby_registry(self):
+        registry = LobbyRegistry(shards=4)
+        lobbies = [SimpleNamespace(lobby_slug=f'lobby-{i}') for i in range(400)]
+
+        def add(part):
+            for lobby in lobbies[part::4]:
+                registry.add(lobby)
+        threads = [threading.Thread(target=add, args=(part,)) for part in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(lobbies), len(registry))
+        self.assertIs(lobbies[7], registry.get('lobby-7'))
+        self.assertIsNone(registry.get('lobby-unknown'))
+        self.assertIsNone(registry.get(None))
+        with self.assertRaises(LobbyRegistry.SlugTaken):
+            registry.add(SimpleNamespace(lobby_slug='lobby-7'))
+
+        # lobbies can be removed while iterating
+        for lobby_slug, lobby in registry.items():
+            self.assertEqual(lobby_slug, lobby.lobby_slug)
+            if int(lobby_slug.split('-')[1]) % 2:
+                self.assertIs(lobby, registry.pop(lobby_slug))
+        self.assertEqual(sorted(lobby.lobby_slug for lobby in lobbies[::2]), sorted(registry))
+        self.assertNotIn('lobby-7', registry)
+        self.assertIsNone(registry.pop('lobby-7'))
+
+        # only the lobby registered with the slug is removed
+        self.assertFalse(registry.remove(lobbies[7]))
+        self.assertFalse(registry.remove(SimpleNamespace(lobby_slug='lobby-8')))
+        self.assertIs(lobbies[8], registry.get('lobby-8'))
+        self.assertTrue(registry.remove(lobbies[8]))
+        self.assertNotIn('lobby-8', registry)
+
+
+class TestCluster(TestCase):
+    def test_hash_ring(self):
+        ring = HashRing(['a', 'b', 'c'])
+        keys = [f'lobby-{i}' for i in range(3000)]
+        owners = {key: ring.owner(key) for key in keys}
+        for node in 'abc':
+            self.assertGreater(list(owners.values()).count(node), 500)
+
+        # only the keys of a new node move, and they move back when it leaves
+        ring.add('d')
+        moved = [key for key in keys if ring.owner(key) != owners[key]]
+        self.assertTrue(all(ring.owner(key) == 'd' for key in moved))
+        self.assertLess(len(moved), len(keys) / 2)
+        ring.remove('d')
+        self.assertEqual(owners, {key: ring.owner(key) for key in keys})
+        self.assertIsNone(HashRing().owner('lobby-0'))
+
+    def test_cluster(self):
+        # messages are passed as json, like buses spanning several processes do
+        bus = LoopbackBus(post=lambda function, message: function(json.loads(json.dumps(message))))
+        broadcasts = []
+        adopted = {}
+
+        def make_node(node_id):
+            node = ClusterNode(node_id, bus, operations={'name': lambda lobby, suffix: lobby.name + suffix},
+                               on_adopt=lambda lobby: adopted.__setitem__(lobby.lobby_slug, node_id),
+                               on_broadcast=lambda room, event, message: broadcasts.append((node_id, room, event)),
+                               dump_lobby=vars, load_lobby=lambda state: SimpleNamespace(**state))
+            node.start()
+            return node
+        nodes = {node_id: make_node(node_id) for node_id in 'abc'}
+        for node in nodes.values():
+            self.assertEqual({'a', 'b', 'c'}, node.ring.nodes)
+
+        slugs = [f'lobby-{i}' for i in range(60)]
+        for slug in slugs:
+            nodes['a'].add(SimpleNamespace(lobby_slug=slug, name=slug.upper()))
+
+        def check_ownership():
+            for slug in slugs:
+                owner = nodes['a'].owner(slug)
+                self.assertIn(slug, nodes[owner].lobbies)
+                self.assertEqual(owner, adopted[slug])
+                self.assertEqual(1, sum(slug in node.lobbies for node in nodes.values()))
+            self.assertEqual(len(slugs), sum(len(node.lobbies) for node in nodes.values()))
+        check_ownership()
+        self.assertEqual({'a', 'b', 'c'}, set(adopted.values()))
+
+        # calls are forwarded to the owner
+        for node in nodes.values():
+            self.assertEqual('LOBBY-3!', node.call('lobby-3', 'name', '!'))
+        with self.assertRaises(LobbyRegistry.NotFound):
+            nodes['b'].call('lobby-unknown', 'name', '!')
+        with self.assertRaises(LobbyRegistry.SlugTaken):
+            for node in nodes.values():
+                node.add(SimpleNamespace(lobby_slug='lobby-3', name=''))
+
+        # lobbies move when nodes join and leave
+        nodes['d'] = make_node('d')
+        self.assertIn('d', nodes['a'].ring)
+        check_ownership()
+        self.assertIn('d', adopted.values())
+        nodes.pop('b').stop()
+        self.assertNotIn('b', nodes['c'].ring)
+        check_ownership()
+        self.assertEqual('LOBBY-42?', nodes['d'].call('lobby-42', 'name', '?'))
+
+        nodes['a'].broadcast('lobby-1', 'game_state', {})
+        self.assertEqual({'a', 'c', 'd'}, {node_id for node_id, room, _ in broadcasts if room == 'lobby-1'})
+
+
+class TestValidation(TestCase):
+    def test_compiled_validators(self):
+        instances = [
+            None, True, 1, 1.5, 'PLACE_TOKEN', [], {},
+            {'action': 'PLACE_TOKEN', 'arguments': [{'x': 1}]},
+            {'action': 'FLIP_TABLE'}, {'action': 1}, {'arguments': [{}, 2]}, {'arguments': {}},
+            {'name': 'player', 'token_style': {'color': [1, 2, 3, 255]}},
+            {'name': 'player', 'token_style': {'color': [1, 2, 3, 255.0]}},
+            {'name': 'player', 'token_style': {'color': [1, 2, True, 255]}},
+            {'name': 'player', 'token_style': {'color': [1, 2, 3]}},
+            {'name': 'player', 'token_style': {}}, {'name': 'player'},
+            {'rules': {'play_field_width': 7, 'enable_cards': False}}, {'rules': {'enable_cards': 0}},
+            {'lobby_name': 'lobby', 'max_number_of_players': 4, 'list_publicly': 'yes'},
+            {'message': 'hello'}, {'message': ['hello']},
+        ]
+        schemas = {
+            'game_action': request_schema.game_action_schema,
+            'join_lobby': request_schema.player_schema,
+            'vote_rules': request_schema.change_rules_schema,
+            'create_lobby': request_schema.create_lobby_schema,
+            'chat_message': request_schema.chat_message_schema,
+        }
+        for event, schema in schemas.items():
+            for instance in instances:
+                expected = sorted((list(e.absolute_path), e.message)
+                                  for e in jsonschema.Draft7Validator(schema).iter_errors(instance))
+                errors = validation.validators[event](instance)
+                self.assertEqual([path for path, _ in expected], sorted(error['path'] for error in errors),
+                                 (event, instance))
+
+        errors = validation.validators['join_lobby']({'name': 'player', 'token_style': {'color': [1, 2, 'x']}})
+        self.assertEqual([['token_style', 'color'], ['token_style', 'color', 2]],
+                         sorted(error['path'] for error in errors))
+        self.assertEqual('schema_error', validation.error_json(errors)['Error']['type'])
+
+        # keywords the compiler doesn't know are checked by jsonschema
+        validate = validation.compile_schema({'type': 'object', 'properties': {'x': {'multipleOf': 2}}})
+        self.assertEqual([], validate({'x': 4}))
+        self.assertEqual([['x']], [error['path'] for error in validate({'x': 3})])
+
+
+class TestOutbox(TestCase):
+    def test_outbox(self):
+        frames = []
+        outbox = Outbox(lambda room, frame: frames.append((room, frame)), tick=.01,
+                        snapshots=('game_state', 'lobby_state'))
+        self.assertEqual(0, outbox.flush())
+
+        # a burst of changes ends up in one frame per room, with the latest snapshots only
+        for turn in range(5):
+            outbox.put('lobby-a', 'game_state', {'turn': turn})
+            if turn == 2:
+                outbox.put('lobby-a', 'chat_message', {'message': 'hi'})
+        outbox.put('lobby-a', 'lobby_state', {'players': 1})
+        outbox.put('lobby-b', 'lobby_state', {'players': 2})
+        outbox.put('lobby-a', 'lobby_state', {'players': 3})
+        self.assertEqual(2, len(outbox))
+        self.assertEqual(2, outbox.flush())
+        self.assertEqual([
+            ('lobby-a', [['chat_message', {'message': 'hi'}], ['game_state', {'turn': 4}],
+                         ['lobby_state', {'players': 3}]]),
+            ('lobby-b', [['lobby_state', {'players': 2}]]),
+        ], frames)
+        self.assertEqual((9, 5, 2), (outbox.messages, outbox.superseded, outbox.frames))
+
+        outbox.put('lobby-a', 'chat_message', {'message': 'bye'})
+        outbox.discard('lobby-a')
+        self.assertEqual(0, outbox.flush())
+
+        thread = threading.Thread(target=outbox.run)
+        thread.start()
+        outbox.put('lobby-c', 'game_state', {})
+        for _ in range(100):
+            if frames[-1][0] == 'lobby-c':
+                break
+            time.sleep(.01)
+        outbox.stop()
+        thread.join()
+        self.assertEqual(('lobby-c', [['game_state', {}]]), frames[-1])
+
+    def test_queued_sender(self):
+        # rooms are closed in order with the messages, after the last frames sent to them
+        calls = []
+        socketio = SimpleNamespace(
+            emit=lambda event, message, room, namespace: calls.append(('emit', room, event)),
+            close_room=lambda room, namespace: calls.append(('close_room', room)))
+        sender = QueuedSender(socketio, '/lobby')
+        sender.emit('lobby-a', 'frame', [])
+        sender.close_room('lobby-a')
+        sender.emit('lobby-b', 'frame', [])
+        self.assertEqual([], calls)
+        sender.flush()
+        self.assertEqual([('emit', 'lobby-a', 'frame'), ('close_room', 'lobby-a'), ('emit', 'lobby-b', 'frame')],
+                         calls)
+
+
+class TestTimerWheel(TestCase):
+    def test_timer_wheel(self):
+        now = [100.]
+        wheel = TimerWheel(tick=1., slots=8, clock=lambda: now[0])
+
+        wheel.schedule('a', 2.5)
+        wheel.schedule('b', 10)
+        wheel.schedule('c', 3)
+        # timers are replaced when scheduled again, and cancelled ones never expire
+        wheel.schedule('c', 20)
+        self.assertTrue(wheel.cancel('c'))
+        self.assertFalse(wheel.cancel('c'))
+        self.assertEqual(2, len(wheel))
+
+        now[0] = 102.9
+        self.assertEqual([], wheel.advance())
+        now[0] = 103
+        self.assertEqual(['a'], wheel.advance())
+        # 'b' shares a slot with ticks before it expires
+        now[0] = 109.5
+        self.assertEqual([], wheel.advance())
+        self.assertIn('b', wheel)
+        now[0] = 110
+        self.assertEqual(['b'], wheel.advance())
+
+        # timers are found after jumps of more than a revolution of the wheel
+        for delay in range(1, 40, 3):
+            wheel.schedule(delay, delay)
+        now[0] = 125
+        self.assertEqual(list(range(1, 16, 3)), sorted(wheel.advance()))
+        now[0] = 200
+        self.assertEqual(list(range(16, 40, 3)), sorted(wheel.advance()))
+        self.assertEqual(0, len(wheel))
+
+
+@skipIf(RequestHandler is None, "The server can't be imported.")
+class TestServer(TestCase):
+    """Sends requests to the Flask app and connects to the lobby namespace with the test clients of Flask and
+    Flask-SocketIO."""
+
+    NAMESPACE = '/lobby'
+
+    def setUp(self):
+        self.client = RequestHandler.app.test_client()
+
+    def create_lobby(self):
+        response = self.client.post('/lobbies', json={
+            "lobby_name": f"flask {random.getrandbits(64)}",
+            "allow_rule_voting": True,
+            "list_publicly": True,
+            "max_number_of_players": 4,
+        })
+        self.assertEqual(200, response.status_code)
+        return response.get_json()["lobby_slug"]
+
+    def connect(self):
+        """Returns a socketio test client with a session of its own."""
+        connection = RequestHandler.socketio.test_client(RequestHandler.app, namespace=self.NAMESPACE,
+                                                         flask_test_client=RequestHandler.app.test_client())
+        self.assertTrue(connection.is_connected(self.NAMESPACE))
+        return connection
+
+    def call(self, connection, event, message):
+        """Sends the message and returns the acknowledgement, which is an empty list if the handler returned None."""
+        return connection.emit(event, message, namespace=self.NAMESPACE, callback=True)
+
+    def join(self, connection, lobby_slug, name, color):
+        self.assertEqual([], self.call(connection, 'join_lobby', {
+            "lobby_slug": lobby_slug, "name": name, "token_style": {"color": color}}))
+
+    def received(self, connection):
+        """Sends the queued messages and returns the events the connection received since the last call, with the
+        frames of the outbox unpacked."""
+        RequestHandler.outbox.flush()
+        RequestHandler.sender.flush()
+        events = []
+        for packet in connection.get_received(self.NAMESPACE):
+            if packet['name'] == 'frame':
+                events.extend((event, message) for event, message in packet['args'][0])
+            else:
+                events.append((packet['name'], packet['args'][0]))
+        return events
+
+    def test_listing(self):
+        self.create_lobby()
+        response = self.client.get('/games')
+        self.assertEqual(200, response.status_code)
+        self.assertIn("lobbies", response.get_json())
+        etag = response.headers['ETag']
+        response = self.client.get('/games', headers={'If-None-Match': etag})
+        self.assertEqual((304, b''), (response.status_code, response.data))
+        # the same page is answered with the same ETag until the listing changes
+        self.assertEqual(etag, self.client.get('/games').headers['ETag'])
+        self.create_lobby()
+        response = self.client.get('/games', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+        self.assertEqual(400, self.client.get('/games?limit=0').status_code)
+
+    def test_game(self):
+        self.assertEqual(404, self.client.get('/games/lobby-there-is-no-such-lobby').status_code)
+        lobby_slug = self.create_lobby()
+        response = self.client.get(f'/games/{lobby_slug}')
+        self.assertEqual(200, response.status_code)
+        self.assertIsNone(response.get_json()["game"])
+        etag = response.headers['ETag']
+        response = self.client.get(f'/games/{lobby_slug}', headers={'If-None-Match': etag})
+        self.assertEqual((304, b''), (response.status_code, response.data))
+
+        # players joining and the start of a game change the snapshot
+        first, second = self.connect(), self.connect()
+        self.join(first, lobby_slug, "first", [255, 0, 0, 255])
+        self.join(second, lobby_slug, "second", [0, 0, 255, 255])
+        response = self.client.get(f'/games/{lobby_slug}', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.get_json()["number_of_players"])
+        etag = response.headers['ETag']
+        self.assertEqual([], self.call(first, 'start_game', {"lobby_slug": lobby_slug}))
+        response = self.client.get(f'/games/{lobby_slug}', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        # the json of a game is keyed by its slug
+        game, = response.get_json()["game"].values()
+        self.assertEqual(["first", "second"], sorted(player["name"] for player in game["participants"]))
+        # the game is encoded once for the snapshots of both the game and the lobby
+        lobby = RequestHandler.lobbies.get(lobby_slug)
+        self.assertIn(lobby.current_game.snapshot()[1], response.data)
+        etag = response.headers['ETag']
+        response = self.client.get(f'/games/{lobby_slug}', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        for connection in first, second:
+            connection.disconnect(namespace=self.NAMESPACE)
+
+    def test_lobby_namespace(self):
+        namespaces = set(RequestHandler.socketio.server.handlers)
+        lobby_slugs = [self.create_lobby() for _ in range(3)]
+        # lobbies share the namespace
+        self.assertEqual(namespaces, set(RequestHandler.socketio.server.handlers))
+        self.assertIn(self.NAMESPACE, namespaces)
+
+        # messages are dispatched to the lobby given by their slug
+        connections = [self.connect() for _ in lobby_slugs]
+        for index, (connection, lobby_slug) in enumerate(zip(connections, lobby_slugs)):
+            self.join(connection, lobby_slug, f"player {index}", [255, 0, 0, 255])
+            self.received(connection)
+        self.assertEqual([], self.call(connections[0], 'chat_message', {"lobby_slug": lobby_slugs[0], "message": "hi"}))
+        self.assertEqual([("chat_message", {"player": "player 0", "message": "hi"})], self.received(connections[0]))
+        for connection in connections[1:]:
+            self.assertEqual([], self.received(connection))
+        # only to the lobby of the connection's player
+        self.call(connections[0], 'chat_message', {"lobby_slug": lobby_slugs[1], "message": "hi"})
+        self.assertEqual([], self.received(connections[1]))
+
+        for message in {"lobby_slug": "lobby-there-is-no-such-lobby", "message": "hi"}, {"message": "hi"}:
+            self.assertEqual("lobby_not_found",
+                             json.loads(self.call(connections[0], 'chat_message', message))["Error"]["type"])
+
+        # a connection is in one lobby at a time
+        self.join(connections[0], lobby_slugs[1], "player 0", [0, 0, 255, 255])
+        self.call(connections[1], 'chat_message', {"lobby_slug": lobby_slugs[1], "message": "welcome"})
+        self.assertIn(("chat_message", {"player": "player 1", "message": "welcome"}), self.received(connections[0]))
+        response = self.client.get(f'/games/{lobby_slugs[0]}')
+        self.assertEqual(0, response.get_json()["number_of_players"])
+        for connection in connections:
+            connection.disconnect(namespace=self.NAMESPACE)
+        self.assertEqual(0, self.client.get(f'/games/{lobby_slugs[1]}').get_json()["number_of_players"])
+
+    def test_room_cleanup(self):
+        lobby_slug = self.create_lobby()
+        connection = self.connect()
+        self.join(connection, lobby_slug, "player", [255, 0, 0, 255])
+        rooms = RequestHandler.socketio.server.manager.rooms[self.NAMESPACE]
+        self.assertIn(lobby_slug, rooms)
+        self.assertIn(lobby_slug, RequestHandler.lobby_by_connection.values())
+
+        RequestHandler.remove_lobby(lobby_slug)
+        # the room is closed with the next messages sent
+        RequestHandler.sender.flush()
+        self.assertNotIn(lobby_slug, rooms)
+        self.assertNotIn(lobby_slug, RequestHandler.lobby_by_connection.values())
+        self.assertEqual(404, self.client.get(f'/games/{lobby_slug}').status_code)
+        self.assertEqual("lobby_not_found", json.loads(self.call(
+            connection, 'chat_message', {"lobby_slug": lobby_slug, "message": "hi"}))["Error"]["type"])
+        # the connection can join another lobby
+        self.join(connection, self.create_lobby(), "player", [255, 0, 0, 255])
+        connection.disconnect(namespace=self.NAMESPACE)
+
+
+@skipIf(AsyncServer is None, "The asyncio mode can't be imported.")
+class TestAsyncServer(TestCase):
+    """Sends requests to the ASGI app of the asyncio mode, and connects to it with the long polling transport of
+    socketio."""
+
+    NAMESPACE = '/lobby'
+
+    def setUp(self):
+        self.sender = RequestHandler.sender
+
+    def tearDown(self):
+        RequestHandler.use_sender(self.sender)
+
+    def run_server(self, test):
+        """Runs the coroutine function `test`, which is given the app of a started server."""
+        async def run():
+            server = AsyncServer()
+            await server.start()
+            try:
+                await asyncio.wait_for(test(server.app), 20)
+            finally:
+                await server.stop()
+        asyncio.run(run())
+
+    @staticmethod
+    async def request(app, method, path, headers=(), body=b''):
+        """Returns the status, the headers and the body of the response."""
+        path, _, query_string = path.partition('?')
+        headers = list(headers) + [('Content-Length', str(len(body)))]
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+                 'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(), 'root_path': '',
+                 'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+                 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80)}
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {'body': b''}
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # the client never disconnects
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.decode(): value.decode() for name, value in message['headers']}
+            else:
+                response['body'] += message.get('body', b'')
+
+        await app(scope, receive, send)
+        return response['status'], response['headers'], response['body']
+
+    async def create_lobby(self, app):
+        status, _, body = await self.request(app, 'POST', '/lobbies', body=json.dumps({
+            "lobby_name": f"async {random.getrandbits(64)}",
+            "allow_rule_voting": True,
+            "list_publicly": True,
+            "max_number_of_players": 4,
+        }).encode())
+        self.assertEqual(200, status)
+        return json.loads(body)["lobby_slug"]
+
+    class Connection:
+        """Connection to the lobby namespace over long polling, keeping the events it receives."""
+
+        def __init__(self, test, app):
+            self.test = test
+            self.app = app
+            self.sid = None
+            self.events = []
+            self.acks = {}
+            self.ack_id = 0
+
+        async def connect(self):
+            _, _, body = await self.test.request(self.app, 'GET', '/socket.io/?EIO=4&transport=polling')
+            # the open packet
+            self.sid = json.loads(body[1:])["sid"]
+            await self.post(f'40{TestAsyncServer.NAMESPACE},')
+            while not await self.poll():
+                pass
+
+        async def post(self, packet):
+            status, _, _ = await self.test.request(
+                self.app, 'POST', f'/socket.io/?EIO=4&transport=polling&sid={self.sid}', body=packet.encode())
+            self.test.assertEqual(200, status)
+
+        async def poll(self):
+            """Receives the next packets, returns whether the namespace is connected."""
+            _, _, body = await self.test.request(self.app, 'GET', f'/socket.io/?EIO=4&transport=polling&sid={self.sid}')
+            connected = False
+            prefix = f'{TestAsyncServer.NAMESPACE},'
+            for packet in body.decode().split('\x1e'):
+                if packet == '2':
+                    await self.post('3')
+                elif packet.startswith('40' + prefix):
+                    connected = True
+                elif packet.startswith('42' + prefix):
+                    self.events.append(json.loads(packet[2 + len(prefix):]))
+                elif packet.startswith('43' + prefix):
+                    data = packet[2 + len(prefix):]
+                    ack_id = data[:data.index('[')]
+                    self.acks[int(ack_id)] = json.loads(data[len(ack_id):])
+            return connected
+
+        async def call(self, event, message):
+            """Sends the message and returns the arguments of its acknowledgement, which are empty if the handler
+            returned None."""
+            self.ack_id += 1
+            await self.post(f'42{TestAsyncServer.NAMESPACE},{self.ack_id}' + json.dumps([event, message]))
+            while self.ack_id not in self.acks:
+                await self.poll()
+            return self.acks.pop(self.ack_id)
+
+        async def receive(self, event):
+            """Returns the message of the next event with the given name, looking into the frames of the outbox."""
+            while True:
+                while self.events:
+                    name, message = self.events.pop(0)
+                    messages = message if name == 'frame' else [[name, message]]
+                    for name, message in messages:
+                        if name == event:
+                            return message
+                await self.poll()
+
+    def test_listing(self):
+        async def test(app):
+            await self.create_lobby(app)
+            status, headers, body = await self.request(app, 'GET', '/games')
+            self.assertEqual(200, status)
+            self.assertEqual('application/json', headers['content-type'])
+            self.assertIn("lobbies", json.loads(body))
+            status, _, body = await self.request(app, 'GET', '/games', [('If-None-Match', headers['etag'])])
+            self.assertEqual((304, b''), (status, body))
+            # another lobby changes the listing
+            await self.create_lobby(app)
+            status, _, _ = await self.request(app, 'GET', '/games', [('If-None-Match', headers['etag'])])
+            self.assertEqual(200, status)
+
+            status, _, _ = await self.request(app, 'GET', '/games?limit=0')
+            self.assertEqual(400, status)
+            status, _, _ = await self.request(app, 'GET', '/games?cards=maybe')
+            self.assertEqual(400, status)
+            status, _, _ = await self.request(app, 'POST', '/lobbies', body=b'{"lobby_name": 7}')
+            self.assertEqual(400, status)
+            status, _, _ = await self.request(app, 'GET', '/nothing/here')
+            self.assertEqual(404, status)
+        self.run_server(test)
+
+    def test_game(self):
+        async def test(app):
+            status, _, _ = await self.request(app, 'GET', '/games/lobby-there-is-no-such-lobby')
+            self.assertEqual(404, status)
+            status, _, _ = await self.request(app, 'GET', '/lobbies/lobby-there-is-no-such-lobby/hint')
+            self.assertEqual(404, status)
+
+            lobby_slug = await self.create_lobby(app)
+            status, headers, body = await self.request(app, 'GET', f'/games/{lobby_slug}')
+            self.assertEqual(200, status)
+            self.assertEqual(lobby_slug, json.loads(body)["lobby_slug"])
+            self.assertIsNone(json.loads(body)["game"])
+            status, _, body = await self.request(app, 'GET', f'/games/{lobby_slug}', [('If-None-Match', headers['etag'])])
+            self.assertEqual((304, b''), (status, body))
+
+            # a player joining changes the lobby
+            connection = self.Connection(self, app)
+            await connection.connect()
+            await connection.call('join_lobby', {"lobby_slug": lobby_slug, "name": "player",
+                                                 "token_style": {"color": [255, 0, 0, 255]}})
+            status, _, body = await self.request(app, 'GET', f'/games/{lobby_slug}', [('If-None-Match', headers['etag'])])
+            self.assertEqual(200, status)
+            self.assertEqual(1, json.loads(body)["number_of_players"])
+        self.run_server(test)
+
+    def test_events(self):
+        async def test(app):
+            lobby_slug = await self.create_lobby(app)
+            first, second = self.Connection(self, app), self.Connection(self, app)
+            await first.connect()
+            await second.connect()
+
+            self.assertEqual("lobby_not_found", json.loads((await first.call('join_lobby', {
+                "lobby_slug": "lobby-there-is-no-such-lobby", "name": "first",
+                "token_style": {"color": [255, 0, 0, 255]}}))[0])["Error"]["type"])
+            self.assertEqual("color_too_transparent", json.loads((await first.call('join_lobby', {
+                "lobby_slug": lobby_slug, "name": "first", "token_style": {"color": [255, 0, 0, 0]}}))[0])["Error"]["type"])
+            self.assertEqual("schema_error", json.loads((await first.call('join_lobby', {
+                "lobby_slug": lobby_slug, "name": 1}))[0])["Error"]["type"])
+
+            self.assertEqual([], await first.call('join_lobby', {
+                "lobby_slug": lobby_slug, "name": "first", "token_style": {"color": [255, 0, 0, 255]}}))
+            self.assertEqual(["first"], [player["name"] for player in (await first.receive("lobby_state"))["players"]])
+            self.assertEqual([], await second.call('join_lobby', {
+                "lobby_slug": lobby_slug, "name": "second", "token_style": {"color": [0, 0, 255, 255]}}))
+            self.assertEqual(["first", "second"],
+                             [player["name"] for player in (await first.receive("lobby_state"))["players"]])
+
+            # messages go to all connections in the room of the lobby
+            self.assertEqual([], await second.call('chat_message', {"lobby_slug": lobby_slug, "message": "hi"}))
+            for connection in first, second:
+                self.assertEqual({"player": "second", "message": "hi"}, await connection.receive("chat_message"))
+
+            # once the connection left, it doesn't get the messages of the lobby anymore
+            await second.call('leave_lobby', {"lobby_slug": lobby_slug})
+            self.assertEqual(["first"], [player["name"] for player in (await first.receive("lobby_state"))["players"]])
+            await first.call('chat_message', {"lobby_slug": lobby_slug, "message": "still there?"})
+            self.assertEqual("still there?", (await first.receive("chat_message"))["message"])
+            await second.call('chat_message', {"lobby_slug": lobby_slug, "message": "left"})
+            self.assertEqual([], [message for name, message in second.events if name != 'frame'])
+            self.assertFalse(any(name == "chat_message" for event, frame in second.events if event == 'frame'
+                                 for name, _ in frame))
+        self.run_server(test)
+
 
 if __name__ == '__main__':
     main()
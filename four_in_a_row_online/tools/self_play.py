@@ -0,0 +1,136 @@
+"""Plays games between bots without the server, one worker process per core, and prints the result of every game as a
+line of JSON as soon as it is finished, followed by the throughput on stderr. Run with
+`python -m four_in_a_row_online.tools.self_play --games 100 --strategies alphabeta mcts`."""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import random
+import sys
+import time
+from loguru import logger
+from four_in_a_row_online.data import cards
+from four_in_a_row_online.game_logic import bots, logic
+from four_in_a_row_online.game_logic.data import CardDeck, Rules, TokenStyle
+from four_in_a_row_online.game_logic.logic import Game
+
+
+def make_bots(strategy_names, number_of_players, time_budget=None):
+    """Creates a bot per player, taking turns with the strategies in the given order."""
+    players = []
+    for index in range(number_of_players):
+        name = strategy_names[index % len(strategy_names)]
+        strategy = bots.strategies[name]()
+        if time_budget is not None and hasattr(strategy, 'time_budget'):
+            strategy.time_budget = time_budget
+        token_style = TokenStyle.is_dinguishable_init([p.token_style for p in players])
+        players.append(bots.Bot(f'{name} {index}', token_style, strategy))
+    return players
+
+
+def play_game(index, rules, card_deck, strategy_names, time_budget=None, card_probability=.1, max_moves=None,
+              seed=None):
+    """Plays a game until someone wins or there is no move left. Rules and card deck are passed as their json, so
+    games can be sent to worker processes. Returns the result of the game."""
+    random.seed(seed)
+    rules, card_deck = Rules(**rules), CardDeck(**card_deck)
+    players = make_bots(strategy_names, rules.number_of_players or 2, time_budget)
+    game = Game(f'self play {index}', rules, card_deck, players)
+    playable_cards = [getattr(cards, name) for name, enabled in card_deck.json().items() if enabled] \
+        if rules.enable_cards else []
+    if max_moves is None:
+        max_moves = rules.play_field_width * rules.play_field_height if rules.field_has_bounds else 1000
+
+    start = time.perf_counter()
+    game.start_game()
+    moves = 0
+    card_plays = {}
+    last_card = -rules.card_placement_cooldown - 1
+    while game.game_state == Game.State.started and game.winner is None and moves < max_moves:
+        if playable_cards and moves - last_card > rules.card_placement_cooldown and \
+                random.random() < card_probability:
+            card = random.choice(playable_cards)
+            card.play(game=game)
+            card_plays[card.__name__] = card_plays.get(card.__name__, 0) + 1
+            last_card = moves
+        bot = game.participants[game.current_turn]
+        try:
+            bot.play(game)
+        except bots.Strategy.NoMoveLeft:
+            break
+        moves += 1
+    game.finish_game()
+
+    winner = game.winner
+    return {
+        'game': index,
+        'seed': seed,
+        'winner': winner.name if winner else None,
+        'winner_strategy': strategy_names[game.initial_players.index(winner) % len(strategy_names)]
+        if winner else None,
+        'moves': moves,
+        'duration': time.perf_counter() - start,
+        'card_plays': card_plays,
+    }
+
+
+def quiet_games():
+    """Initializer of the worker processes. The games logger logs every move, which would slow down the games, and
+    loguru has no level per logger, so the logging of the game logic is turned off instead."""
+    logger.disable(logic.__name__)
+
+
+def changed(data_container, changes):
+    """Returns a copy of the rules or card deck with the given data fields changed. Raises ValueError if any of them
+    doesn't exist."""
+    data = data_container.json()
+    unknown = sorted(set(changes) - set(data))
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}, the fields are {', '.join(data)}.")
+    return type(data_container)(**{**data, **changes})
+
+
+def run(number_of_games, rules, card_deck, strategy_names, time_budget=None, card_probability=.1, max_moves=None,
+        seed=None, workers=None, output=sys.stdout):
+    """Plays the games in worker processes and writes their results to the output in the order they finish. Returns
+    the number of games played per second."""
+    start = time.perf_counter()
+    seeds = random.Random(seed)
+    with ProcessPoolExecutor(max_workers=workers, initializer=quiet_games) as executor:
+        futures = [executor.submit(play_game, index, rules.json(), card_deck.json(), strategy_names, time_budget,
+                                   card_probability, max_moves, seeds.getrandbits(64))
+                   for index in range(number_of_games)]
+        for future in as_completed(futures):
+            output.write(json.dumps(future.result()) + '\n')
+            output.flush()
+    return number_of_games / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=10, help='number of games to play')
+    parser.add_argument('--strategies', nargs='+', default=['alphabeta'], choices=sorted(bots.strategies),
+                        help='strategies of the bots, in turn order')
+    parser.add_argument('--rules', type=json.loads, default={},
+                        help='json of the rules that differ from the default rules')
+    parser.add_argument('--card-deck', type=json.loads, default={},
+                        help='json of the cards that differ from the default card deck')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds per move of each bot')
+    parser.add_argument('--card-probability', type=float, default=.1,
+                        help='probability of a card being played before a move, if cards are enabled')
+    parser.add_argument('--max-moves', type=int, default=None, help='number of moves after which games are a draw')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+
+    try:
+        rules = changed(Rules.default_init(), args.rules)
+        card_deck = changed(CardDeck.default_init(), args.card_deck)
+    except ValueError as e:
+        parser.error(str(e))
+    games_per_second = run(args.games, rules, card_deck, args.strategies, args.time_budget, args.card_probability,
+                           args.max_moves, args.seed, args.workers)
+    print(f'{games_per_second:.2f} games per second', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()